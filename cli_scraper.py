@@ -18,6 +18,8 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - [Worker %(worker)s
 # Re-use FileLock from history_manager for data.json safety
 from modules.history_manager import FileLock
 
+HISTORY_BATCH_SIZE = 20
+
 DATA_JSON_PATH = Path(__file__).resolve().parent / 'src' / 'data' / 'data.json'
 
 def normalize_ah(value):
@@ -96,6 +98,20 @@ def run_scraper(worker_index, total_workers, ah_filter=None, job_file=None):
         
     print(f"Worker {worker_index}: Processing {len(my_matches)} matches...")
     
+    # History updates are batched: one transaction per HISTORY_BATCH_SIZE matches
+    done_entries = []
+    def flush_history():
+        try:
+            history_manager.move_many_to_cached(done_entries)
+            done_entries.clear()
+        except Exception as e:
+            print(f"Worker {worker_index}: Error updating history: {e}")
+
+    def mark_done(match):
+        done_entries.append((match['season'], match['league_id'], match['id']))
+        if len(done_entries) >= HISTORY_BATCH_SIZE:
+            flush_history()
+    
     processed_count = 0
     for match in my_matches:
         match_id = match['id']
@@ -107,14 +123,14 @@ def run_scraper(worker_index, total_workers, ah_filter=None, job_file=None):
             
             if "error" in match_data:
                 print(f"Worker {worker_index}: Error scraping {match_id}: {match_data['error']}")
-                history_manager.move_to_cached(match['season'], match['league_id'], match_id)
+                mark_done(match)
                 continue
             
             # Save
             save_match_safe(match_data)
             
             # Update History
-            history_manager.move_to_cached(match['season'], match['league_id'], match_id)
+            mark_done(match)
             
             processed_count += 1
             if processed_count % 5 == 0:
@@ -122,10 +138,9 @@ def run_scraper(worker_index, total_workers, ah_filter=None, job_file=None):
             
         except Exception as e:
             print(f"Worker {worker_index}: Critical error on {match_id}: {e}")
-            try:
-                history_manager.move_to_cached(match['season'], match['league_id'], match_id)
-            except:
-                pass
+            mark_done(match)
+
+    flush_history()
 
     print(f"Worker {worker_index}: Finished. Processed {processed_count} matches.")
 
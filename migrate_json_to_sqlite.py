@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'src'))
+
+from modules import data_manager
+
+def migrate():
+    """Re-imports every data/data_*.json bucket into the SQLite match store."""
+    print(f"Importando buckets JSON de {data_manager.DATA_DIR} en {data_manager.DB_FILE}...")
+    summary = data_manager.import_json_buckets()
+    total = sum(summary.values())
+    for name, count in summary.items():
+        print(f"  {name}: {count} partidos")
+    print(f"Migración completada. {total} partidos importados.")
+
+if __name__ == "__main__":
+    migrate()
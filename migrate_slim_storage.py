@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'src'))
+
+from modules import data_manager
+from modules.estudio_scraper import backfill_structured_fields
+
+def migrate():
+    """
+    Reescribe todos los partidos guardados en formato slim: sin market_analysis_html /
+    historical_matches_html (se regeneran al renderizar) y con las estadísticas como números.
+    """
+    print(f"Compactando partidos de {data_manager.DB_FILE}...")
+    count, before, after = data_manager.slim_stored_matches(prepare=backfill_structured_fields)
+    ratio = before / after if after else 0
+    print(f"Migración completada. {count} partidos: {before / 1024:.0f} KB -> {after / 1024:.0f} KB ({ratio:.1f}x).")
+
+if __name__ == "__main__":
+    migrate()
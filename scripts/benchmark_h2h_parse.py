@@ -0,0 +1,81 @@
+"""
+Benchmark del parseo de la página H2H: árbol completo vs parseo parcial.
+
+Para cada fixture HTML del repositorio compara BeautifulSoup(html, 'lxml') con
+parse_h2h_html (solo tablas de historial, clasificación, cabecera, scripts y
+cuotas): mejor tiempo de N pasadas, pico de memoria durante el parseo y memoria
+retenida por la soup (tracemalloc), y si los extractores dan el mismo resultado.
+
+Uso: python scripts/benchmark_h2h_parse.py [--runs 10] [archivo.html ...]
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from bs4 import BeautifulSoup
+
+from modules import estudio_scraper
+from modules.h2h_page import parse_h2h_html
+
+FIXTURES = ['h2h_test.html', 'odds_test.html', 'league_36_raw.html']
+
+
+def _full(html):
+    return BeautifulSoup(html, 'lxml')
+
+
+def _best_ms(parse, html, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        parse(html)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def _memory_kb(parse, html):
+    """(pico durante el parseo, retenido por la soup) en KB."""
+    gc.collect()
+    tracemalloc.start()
+    soup = parse(html)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del soup
+    return peak / 1024, retained / 1024
+
+
+def _extraction(soup):
+    # Lo que lee el análisis de la página; las sub-peticiones solo se anotan.
+    scheduled = []
+    context = estudio_scraper._extract_analysis_context(soup, '0', lambda *args: scheduled.append(args))
+    return json.dumps([context, scheduled, estudio_scraper.extract_vs_odds(soup)], default=str, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('files', nargs='*', help='HTML a medir (por defecto, los fixtures del repositorio)')
+    args = parser.parse_args()
+
+    paths = [Path(f) for f in args.files] or [ROOT / name for name in FIXTURES]
+    print(f"{'página':<22}{'tamaño':>9}{'parser':>10}{'tiempo':>11}{'pico':>11}{'retenido':>11}{'iguales':>9}")
+    for path in paths:
+        html = path.read_text(encoding='utf-8')
+        same = _extraction(_full(html)) == _extraction(parse_h2h_html(html))
+        for label, parse in (('completo', _full), ('parcial', parse_h2h_html)):
+            best = _best_ms(parse, html, args.runs)
+            peak, retained = _memory_kb(parse, html)
+            print(f"{path.name:<22}{len(html) / 1024:>7.0f}KB{label:>10}{best:>9.1f}ms"
+                  f"{peak:>9.0f}KB{retained:>9.0f}KB{('sí' if same else 'NO'):>9}")
+
+
+if __name__ == "__main__":
+    main()
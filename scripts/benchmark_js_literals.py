@@ -0,0 +1,122 @@
+"""
+Benchmark del parser de literales JS (modules/js_literals) frente a los
+parseos anteriores hechos a mano con regex y reemplazos de texto.
+
+Por cada archivo detecta qué literales contiene (filas A[n]/B[n] de bf_data,
+Vs_hOdds de la página H2H, jh["R_n"] de resultados de liga), parsea con ambos
+métodos, comprueba que el resultado coincide y muestra el mejor tiempo de N
+pasadas.
+
+Uso: python scripts/benchmark_js_literals.py [--runs 20] [archivo ...]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from modules import js_literals
+
+FIXTURES = ['bf_data.js', 'odds_data.js', 'league_36_data.js', 'h2h_test.html']
+_LEAGUE_ID = '36'
+
+
+# --- Parseos anteriores (referencia) ---
+_OLD_ITEM_RE = re.compile(r"\s*(?:'((?:[^'\\]|\\.)*)'|([^,]*))\s*")
+
+
+def _old_split(body):
+    values, pos, end = [], 0, len(body)
+    while pos <= end:
+        m = _OLD_ITEM_RE.match(body, pos)
+        quoted, bare = m.group(1), m.group(2)
+        if quoted is not None:
+            values.append(quoted.replace("\\'", "'") if '\\' in quoted else quoted)
+        else:
+            values.append(bare.strip() or None)
+        pos = m.end() + 1
+    return values
+
+
+def _old_bf(content):
+    rows = [_old_split(m.group(1)) for m in re.finditer(r"^A\[\d+\]=\[(.*)\];\s*$", content, re.M)]
+    leagues = [_old_split(m.group(2)) for m in re.finditer(r"^B\[(\d+)\]=\[(.*)\];\s*$", content, re.M)]
+    return rows, leagues
+
+
+def _old_vs_odds(content):
+    raw_data = re.search(r'var Vs_hOdds\s*=\s*(\[\[.*?\]\]);', content, re.DOTALL).group(1).replace("'", '"')
+    while ',,' in raw_data:
+        raw_data = raw_data.replace(',,', ',null,')
+    return json.loads(raw_data)
+
+
+def _old_league(content):
+    found = []
+    for m in re.finditer(r'\[(\d+),' + _LEAGUE_ID + r',', content):
+        parts = content[m.start() + 1:content.find(']', m.start())].split(',')
+        if len(parts) > 11:
+            found.append((m.group(1), parts[11].strip().replace("'", "")))
+    return found
+
+
+# --- Parser unificado ---
+def _new_bf(content):
+    rows = [row for _, row in js_literals.parse_assignments(content, r"^A\[\d+\]", raw=True)]
+    leagues = [row for _, row in js_literals.parse_assignments(content, r"^B\[\d+\]", raw=True)]
+    return rows, leagues
+
+
+def _new_vs_odds(content):
+    return js_literals.parse_assignments(content, r"var Vs_hOdds", limit=1)[0][1]
+
+
+def _new_league(content):
+    return [(row[0], row[11] if row[11] is not None else '')
+            for _, rounds in js_literals.parse_assignments(content, r'jh\["[^"]*"\]', raw=True)
+            for row in rounds if len(row) > 11 and row[1] == _LEAGUE_ID]
+
+
+KINDS = [
+    ('bf A[n]/B[n]', lambda c: re.search(r"^A\[\d+\]=\[", c, re.M), _old_bf, _new_bf),
+    ('Vs_hOdds', lambda c: 'var Vs_hOdds' in c, _old_vs_odds, _new_vs_odds),
+    ('liga jh[...]', lambda c: 'jh["' in c, _old_league, _new_league),
+]
+
+
+def _best_ms(fn, content, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(content)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('files', nargs='*', help='archivos a medir (por defecto, los fixtures del repositorio)')
+    args = parser.parse_args()
+
+    paths = [Path(f) for f in args.files] or [ROOT / name for name in FIXTURES]
+    print(f"{'archivo':<20}{'literal':<15}{'tamaño':>9}{'anterior':>11}{'unificado':>11}{'iguales':>9}")
+    for path in paths:
+        content = path.read_text(encoding='utf-8')
+        kinds = [kind for kind in KINDS if kind[1](content)]
+        if not kinds:
+            print(f"{path.name:<20}{'(ninguno)':<15}{len(content) / 1024:>7.0f}KB")
+            continue
+        for label, _, old, new in kinds:
+            same = old(content) == new(content)
+            print(f"{path.name:<20}{label:<15}{len(content) / 1024:>7.0f}KB"
+                  f"{_best_ms(old, content, args.runs):>9.2f}ms{_best_ms(new, content, args.runs):>9.2f}ms"
+                  f"{('sí' if same else 'NO'):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark del almacenamiento de partidos: tiempo de carga y pico de RSS.
+
+Compara los buckets JSON legacy (data/data_*.json, indent=2) con matches.db
+en formato slim, sin comprimir y comprimido (zlib), cargando todo de golpe
+(load_all_matches) y en streaming (iter_matches).
+
+Uso: python scripts/benchmark_storage.py [--runs 5]
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+LEGACY_GLOB = str(ROOT / 'data' / 'data_*.json')
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _use_db(db_dir):
+    from modules import data_manager
+    data_manager.DATA_DIR = Path(db_dir)
+    data_manager.DB_FILE = Path(db_dir) / 'matches.db'
+    return data_manager
+
+
+def _measure(variant, db_dir, runs):
+    """Se ejecuta en un proceso hijo para que el pico de RSS sea el de esta variante."""
+    if variant == 'legacy':
+        def load():
+            count = 0
+            for path in sorted(glob.glob(LEGACY_GLOB)):
+                with open(path, 'r', encoding='utf-8') as f:
+                    count += len(json.load(f))
+            return count
+    else:
+        data_manager = _use_db(db_dir)
+        data_manager.load_pending_matches()  # abre la conexión y el esquema fuera de la medición
+        if variant.endswith('stream'):
+            def load():
+                return sum(1 for _ in data_manager.iter_matches())
+        else:
+            def load():
+                data_manager._snapshots.clear()
+                return len(data_manager.load_all_matches())
+
+    rss_before = _peak_rss_mb()
+    timings = []
+    count = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        count = load()
+        timings.append(time.perf_counter() - start)
+    print(json.dumps({'count': count, 'best_ms': min(timings) * 1000,
+                      'rss_before_mb': rss_before, 'rss_peak_mb': _peak_rss_mb()}))
+
+
+def _build_db(db_dir, codec):
+    for path in glob.glob(LEGACY_GLOB):
+        shutil.copy(path, db_dir)
+    data_manager = _use_db(db_dir)
+    data_manager.PAYLOAD_CODEC = codec
+    from modules.estudio_scraper import backfill_structured_fields
+    data_manager.slim_stored_matches(prepare=backfill_structured_fields)
+    print(os.path.getsize(data_manager.DB_FILE))
+
+
+def _run_child(*args):
+    # Procesos hijos desde un padre ligero: ru_maxrss se hereda a través de exec.
+    result = subprocess.run([sys.executable, __file__, *args], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--build', help=argparse.SUPPRESS)
+    parser.add_argument('--db-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        _measure(args.measure, args.db_dir, args.runs)
+        return
+    if args.build:
+        _build_db(args.db_dir, args.build)
+        return
+
+    work_dir = Path(tempfile.mkdtemp(prefix='bench_storage_'))
+    try:
+        sizes = {'legacy': sum(os.path.getsize(p) for p in glob.glob(LEGACY_GLOB))}
+        dirs = {}
+        for codec in ('none', 'zlib'):
+            dirs[codec] = work_dir / codec
+            dirs[codec].mkdir()
+            sizes[codec] = _run_child('--build', codec, '--db-dir', str(dirs[codec]))
+
+        variants = [
+            ('legacy', 'legacy', None),
+            ('slim sin comprimir', 'none', dirs['none']),
+            ('slim zlib', 'zlib', dirs['zlib']),
+            ('slim zlib streaming', 'zlib-stream', dirs['zlib']),
+        ]
+        print(f"{'formato':<22}{'tamaño':>10}{'partidos':>10}{'carga':>11}{'RSS pico':>11}{'Δ RSS':>9}")
+        for label, variant, db_dir in variants:
+            extra = ['--db-dir', str(db_dir)] if db_dir else []
+            result = _run_child('--measure', variant, '--runs', str(args.runs), *extra)
+            size = sizes[variant.split('-')[0]]
+            print(f"{label:<22}{size / 1024 / 1024:>8.2f}MB{result['count']:>10}{result['best_ms']:>9.1f}ms"
+                  f"{result['rss_peak_mb']:>9.1f}MB{result['rss_peak_mb'] - result['rss_before_mb']:>7.1f}MB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
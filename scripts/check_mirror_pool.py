@@ -0,0 +1,159 @@
+"""
+Comprobación de MirrorPool (modules/mirror_pool) contra servidores HTTP locales
+que hacen de espejos: uno lento, uno que falla y varios sanos.
+
+Escenarios:
+  - failover: el primer espejo devuelve 500 y se sirve desde el siguiente; el
+    que falla pasa detrás del sano y deja de recibir peticiones.
+  - hedge: el primer espejo tarda más que el retardo de hedge y gana el segundo.
+  - carga: N fetch concurrentes contra dos espejos igual de rápidos (por debajo
+    del retardo de hedge) no deben generar peticiones duplicadas.
+  - async: el hedge de fetch_async con aiohttp.
+
+Uso: python scripts/check_mirror_pool.py [--concurrent 48]
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+import aiohttp
+import requests
+
+from modules import mirror_pool
+from modules.mirror_pool import MirrorPool
+
+
+class _StandIn:
+    """Servidor local con retardo y código de estado configurables; cuenta las peticiones."""
+
+    def __init__(self, delay=0.0, status=200):
+        self.delay = delay
+        self.status = status
+        self.hits = 0
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stand_in._lock:
+                    stand_in.hits += 1
+                time.sleep(stand_in.delay)
+                body = f"{stand_in.url}{self.path}".encode()
+                try:
+                    self.send_response(stand_in.status)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Cliente perdedor de un hedge async (cancelado).
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _get(url, clock=None):
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    return response.text
+
+
+def _check(label, ok, detail):
+    print(f"{'OK ' if ok else 'MAL'} {label:<10}{detail}")
+    return ok
+
+
+def check_failover():
+    failing, healthy = _StandIn(status=500), _StandIn()
+    pool = MirrorPool([failing.url, healthy.url])
+    try:
+        bodies = [pool.fetch(f'/p{i}', _get) for i in range(mirror_pool.EJECT_AFTER_FAILURES + 2)]
+        ok = all(body.startswith(healthy.url) for body in bodies) and failing.hits == 1
+        return _check('failover', ok, f"respuestas del sano {len(bodies)}, peticiones al que falla {failing.hits}")
+    finally:
+        failing.close()
+        healthy.close()
+
+
+def check_hedge():
+    slow, fast = _StandIn(delay=mirror_pool.HEDGE_DEFAULT_DELAY_SECONDS * 2), _StandIn(delay=0.05)
+    pool = MirrorPool([slow.url, fast.url])
+    try:
+        start = time.perf_counter()
+        body = pool.fetch('/hedge', _get)
+        elapsed = time.perf_counter() - start
+        ok = body.startswith(fast.url) and elapsed < mirror_pool.HEDGE_DEFAULT_DELAY_SECONDS * 1.5
+        return _check('hedge', ok, f"ganó el rápido en {elapsed:.2f}s (lento {slow.hits}, rápido {fast.hits})")
+    finally:
+        slow.close()
+        fast.close()
+
+
+def check_load(concurrent_fetches):
+    delay = mirror_pool.HEDGE_DEFAULT_DELAY_SECONDS * 0.6
+    mirrors = [_StandIn(delay=delay), _StandIn(delay=delay)]
+    pool = MirrorPool([m.url for m in mirrors])
+    try:
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrent_fetches) as executor:
+            list(executor.map(lambda i: pool.fetch(f'/load{i}', _get), range(concurrent_fetches)))
+        elapsed = time.perf_counter() - start
+        hits = sum(m.hits for m in mirrors)
+        return _check('carga', hits == concurrent_fetches,
+                      f"{concurrent_fetches} fetch -> {hits} peticiones upstream en {elapsed:.2f}s")
+    finally:
+        for m in mirrors:
+            m.close()
+
+
+def check_async():
+    slow, fast = _StandIn(delay=mirror_pool.HEDGE_DEFAULT_DELAY_SECONDS * 2), _StandIn(delay=0.05)
+    pool = MirrorPool([slow.url, fast.url])
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            async def get(url, clock=None):
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    return await response.text()
+
+            start = time.perf_counter()
+            body = await pool.fetch_async('/async', get)
+            return body, time.perf_counter() - start
+
+    try:
+        body, elapsed = asyncio.run(run())
+        ok = body.startswith(fast.url) and elapsed < mirror_pool.HEDGE_DEFAULT_DELAY_SECONDS * 1.5
+        return _check('async', ok, f"ganó el rápido en {elapsed:.2f}s")
+    finally:
+        slow.close()
+        fast.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrent', type=int, default=48)
+    args = parser.parse_args()
+    results = [check_failover(), check_hedge(), check_load(args.concurrent), check_async()]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
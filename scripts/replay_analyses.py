@@ -0,0 +1,62 @@
+"""
+Re-ejecuta el análisis de partidos sobre la caché HTTP en disco, sin red.
+
+Sirve para re-aplicar cambios de los parsers a todo el histórico: cada página
+(h2h, estadísticas, cuotas) se lee de data/http_cache; lo que no esté en caché
+cuenta como fallo de red (el análisis sale parcial o con error).
+
+Uso: python scripts/replay_analyses.py [--ids 123 456] [--precacheo] [--save] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from modules import data_manager, http_cache
+from modules.estudio_scraper import analizar_partidos_async
+
+
+def _stored_matches(precacheo):
+    return {str(m.get('match_id')): m for m in data_manager.iter_matches(precacheo=precacheo) if m.get('match_id')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ids', nargs='*', help='IDs concretos (por defecto, todos los guardados)')
+    parser.add_argument('--precacheo', action='store_true', help='usar la tabla de pre-cacheo')
+    parser.add_argument('--save', action='store_true', help='guardar los análisis regenerados')
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    http_cache.set_replay_only(True)
+    stored = _stored_matches(args.precacheo)
+    match_ids = args.ids or list(stored)
+    print(f"Caché HTTP: {http_cache.stats()}")
+    print(f"Re-analizando {len(match_ids)} partidos en modo replay...")
+
+    counts = {'ok': 0, 'partial': 0, 'error': 0}
+    enqueue = data_manager.enqueue_precacheo_match if args.precacheo else data_manager.enqueue_match
+
+    def on_result(match_id, payload):
+        if payload.get('error'):
+            counts['error'] += 1
+            return
+        counts['partial' if payload.get('partial') else 'ok'] += 1
+        if args.save:
+            # Se conservan los campos propios del guardado (fechas de pre-cacheo, etc.).
+            enqueue({**stored.get(match_id, {}), **payload, 'match_id': match_id})
+
+    start = time.perf_counter()
+    asyncio.run(analizar_partidos_async(match_ids, on_result=on_result, concurrency=args.concurrency, force_refresh=True))
+    if args.save:
+        data_manager.flush_writes()
+    elapsed = time.perf_counter() - start
+    print(f"Completado en {elapsed:.1f}s: {counts['ok']} completos, {counts['partial']} parciales, {counts['error']} con error.")
+
+
+if __name__ == "__main__":
+    main()
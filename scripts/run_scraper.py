@@ -2,7 +2,7 @@ import asyncio
 import json
 
 # Importamos las funciones de scraping desde el nuevo módulo
-from scraping_logic import get_main_page_matches_async, get_main_page_finished_matches_async
+from scraping_logic import get_main_page_lists_async
 
 async def main():
     """
@@ -10,10 +10,10 @@ async def main():
     """
     print("Iniciando el proceso de scraping principal...")
     
-    # Obtenemos los partidos próximos y los finalizados en paralelo
-    proximos, finalizados = await asyncio.gather(
-        get_main_page_matches_async(limit=2000), # Aumentamos el límite para tener más datos
-        get_main_page_finished_matches_async(limit=1500)
+    # Una sola descarga y un solo parseo de la portada para ambas listas
+    proximos, finalizados = await get_main_page_lists_async(
+        upcoming_limit=2000, # Aumentamos el límite para tener más datos
+        finished_limit=1500
     )
     
     print(f"Scraping de listas finalizado. {len(proximos)} partidos próximos y {len(finalizados)} finalizados.")
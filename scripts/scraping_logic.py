@@ -1,15 +1,18 @@
 
 import asyncio
+import sys
+from pathlib import Path
 from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
 import datetime
-import re
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import threading
 from app_utils import normalize_handicap_to_half_bucket_str, _parse_handicap_to_float
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from modules import main_page
+
 URL_NOWGOAL = "https://live20.nowgoal25.com/"
 REQUEST_TIMEOUT_SECONDS = 12
 _REQUEST_HEADERS = {
@@ -141,60 +144,14 @@ async def _fetch_nowgoal_html(path: str | None = None, filter_state: int | None
         print(f"Error al obtener la pagina con Playwright ({target_url}): {browser_exc}")
     return None
 
-def parse_main_page_matches(html_content, limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    match_rows = soup.find_all('tr', id=lambda x: x and x.startswith('tr1_'))
-    upcoming_matches = []
-    now_utc = datetime.datetime.utcnow()
-
-    for row in match_rows:
-        match_id = row.get('id', '').replace('tr1_', '')
-        if not match_id: continue
-
-        time_cell = row.find('td', {'name': 'timeData'})
-        if not time_cell or not time_cell.has_attr('data-t'): continue
-        
-        try:
-            match_time = datetime.datetime.strptime(time_cell['data-t'], '%Y-%m-%d %H:%M:%S')
-        except (ValueError, IndexError):
-            continue
-
-        if match_time < now_utc: continue
-
-        home_team_tag = row.find('a', {'id': f'team1_{match_id}'})
-        away_team_tag = row.find('a', {'id': f'team2_{match_id}'})
-        odds_data = row.get('odds', '').split(',')
-        handicap = odds_data[2] if len(odds_data) > 2 else "N/A"
-        goal_line = odds_data[10] if len(odds_data) > 10 else "N/A"
-
-        if handicap == "N/A":
-            continue
-
-        upcoming_matches.append({
-            "id": match_id,
-            "time_obj": match_time,
-            "home_team": home_team_tag.text.strip() if home_team_tag else "N/A",
-            "away_team": away_team_tag.text.strip() if away_team_tag else "N/A",
-            "handicap": handicap,
-            "goal_line": goal_line
-        })
-
-    handicap_predicate = _build_handicap_filter_predicate(handicap_filter)
-    if handicap_predicate:
-        filtered = []
-        for m in upcoming_matches:
-            if handicap_predicate(m.get('handicap', '')):
-                filtered.append(m)
-        upcoming_matches = filtered
-
-    goal_predicate = _build_goal_line_filter_predicate(goal_line_filter)
-    if goal_predicate:
-        filtered = []
-        for m in upcoming_matches:
-            if goal_predicate(m.get('goal_line', '')):
-                filtered.append(m)
-        upcoming_matches = filtered
+def _parse_main_page_rows(html_content, handicap_filter=None, goal_line_filter=None):
+    return main_page.parse_main_page(
+        html_content,
+        handicap_predicate=_build_handicap_filter_predicate(handicap_filter),
+        goal_line_predicate=_build_goal_line_filter_predicate(goal_line_filter),
+    )
 
+def _format_upcoming_matches(upcoming_matches, limit=20, offset=0):
     upcoming_matches.sort(key=lambda x: x['time_obj'])
     
     paginated_matches = upcoming_matches[offset:offset+limit]
@@ -206,77 +163,7 @@ def parse_main_page_matches(html_content, limit=20, offset=0, handicap_filter=No
 
     return paginated_matches
 
-def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    match_rows = soup.find_all('tr', id=lambda x: x and x.startswith('tr1_'))
-    finished_matches = []
-    for row in match_rows:
-        match_id = row.get('id', '').replace('tr1_', '')
-        if not match_id: continue
-
-        state = row.get('state')
-        if state is not None and state != "-1":
-            continue
-
-        cells = row.find_all('td')
-        if len(cells) < 8: continue
-
-        home_team_tag = row.find('a', {'id': f'team1_{match_id}'})
-        away_team_tag = row.find('a', {'id': f'team2_{match_id}'})
-        
-        score_cell = cells[6]
-        score_text = "N/A"
-        if score_cell:
-            b_tag = score_cell.find('b')
-            if b_tag:
-                score_text = b_tag.text.strip()
-            else:
-                score_text = score_cell.get_text(strip=True)
-
-        if not re.match(r'^\d+\s*-\s*\d+$', score_text):
-            continue
-
-        odds_data = row.get('odds', '').split(',')
-        handicap = odds_data[2] if len(odds_data) > 2 else "N/A"
-        goal_line = odds_data[10] if len(odds_data) > 10 else "N/A"
-
-        if handicap == "N/A":
-            continue
-
-        time_cell = row.find('td', {'name': 'timeData'})
-        match_time = datetime.datetime.now()
-        if time_cell and time_cell.has_attr('data-t'):
-            try:
-                match_time = datetime.datetime.strptime(time_cell['data-t'], '%Y-%m-%d %H:%M:%S')
-            except (ValueError, IndexError):
-                continue
-        
-        finished_matches.append({
-            "id": match_id,
-            "time_obj": match_time,
-            "home_team": home_team_tag.text.strip() if home_team_tag else "N/A",
-            "away_team": away_team_tag.text.strip() if away_team_tag else "N/A",
-            "score": score_text,
-            "handicap": handicap,
-            "goal_line": goal_line
-        })
-
-    handicap_predicate = _build_handicap_filter_predicate(handicap_filter)
-    if handicap_predicate:
-        filtered = []
-        for m in finished_matches:
-            if handicap_predicate(m.get('handicap', '')):
-                filtered.append(m)
-        finished_matches = filtered
-
-    goal_predicate = _build_goal_line_filter_predicate(goal_line_filter)
-    if goal_predicate:
-        filtered = []
-        for m in finished_matches:
-            if goal_predicate(m.get('goal_line', '')):
-                filtered.append(m)
-        finished_matches = filtered
-
+def _format_finished_matches(finished_matches, limit=20, offset=0):
     finished_matches.sort(key=lambda x: x['time_obj'], reverse=True)
     
     paginated_matches = finished_matches[offset:offset+limit]
@@ -287,6 +174,41 @@ def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_
 
     return paginated_matches
 
+def parse_main_page_lists(html_content, upcoming_limit=20, finished_limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
+    """(próximos, finalizados) paginados a partir de un único parseo de la página."""
+    upcoming_matches, finished_matches = _parse_main_page_rows(html_content, handicap_filter, goal_line_filter)
+    return (
+        _format_upcoming_matches(upcoming_matches, upcoming_limit, offset),
+        _format_finished_matches(finished_matches, finished_limit, offset),
+    )
+
+def parse_main_page_matches(html_content, limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
+    upcoming_matches, _ = _parse_main_page_rows(html_content, handicap_filter, goal_line_filter)
+    return _format_upcoming_matches(upcoming_matches, limit, offset)
+
+def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
+    _, finished_matches = _parse_main_page_rows(html_content, handicap_filter, goal_line_filter)
+    return _format_finished_matches(finished_matches, limit, offset)
+
+async def get_main_page_lists_async(upcoming_limit=20, finished_limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
+    """
+    (próximos, finalizados) con una sola descarga de la portada, que trae ambas
+    clases de filas. Solo si no sale ningún finalizado se consulta football/results.
+    """
+    html_content = await _fetch_nowgoal_html()
+    if not html_content:
+        html_content = await _fetch_nowgoal_html(requests_first=False)
+        if not html_content:
+            return [], []
+    upcoming, finished = parse_main_page_lists(html_content, upcoming_limit, finished_limit, offset, handicap_filter, goal_line_filter)
+    if not upcoming and not finished:
+        html_content = await _fetch_nowgoal_html(requests_first=False)
+        if html_content:
+            upcoming, finished = parse_main_page_lists(html_content, upcoming_limit, finished_limit, offset, handicap_filter, goal_line_filter)
+    if not finished:
+        finished = await get_main_page_finished_matches_async(finished_limit, offset, handicap_filter, goal_line_filter)
+    return upcoming, finished
+
 async def get_main_page_matches_async(limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
     html_content = await _fetch_nowgoal_html(filter_state=3)
     if not html_content:
@@ -5,7 +5,6 @@ sys.path.insert(0, str(Path(__file__).resolve().parent))
 from flask import Flask, render_template, abort, request, redirect, url_for
 import asyncio
 
-from bs4 import BeautifulSoup
 import datetime
 import re
 import math
@@ -26,18 +25,27 @@ import concurrent.futures
 _json_save_lock = threading.Lock()
 
 from modules import league_scraper
+from modules import main_page
 from modules import history_manager
 
 # ¡Importante! Importa tu nuevo módulo de scraping
 from modules.estudio_scraper import (
     analizar_partido_completo, 
+    analizar_partidos_async,
+    ANALYSIS_ASYNC_CONCURRENCY,
     format_ah_as_decimal_string_of,
     parse_ah_to_number_of,
     check_handicap_cover,
-    generar_analisis_completo_mercado
+    generar_analisis_completo_mercado,
+    hydrate_match_html,
+    lookup_bf_odds,
+    resolve_final_scores,
+    live_mirror_stats,
+    stats_to_rows
 )
 
 from modules.pattern_search import find_similar_patterns, explore_matches
+from modules.single_flight import SingleFlight
 from flask import jsonify # Asegúrate de que jsonify está importado
 
 app = Flask(__name__)
@@ -124,6 +132,7 @@ def save_match_to_csv(match_data):
         print(f"Error guardando en CSV: {e}")
 
 from modules import data_manager
+from modules import rate_limiter
 
 def save_match_to_json(match_data):
     """Guarda los datos del partido usando el nuevo sistema de buckets."""
@@ -141,6 +150,28 @@ def save_match_to_json_thread_safe(match_data):
     # data_manager is already thread-safe per file
     save_match_to_json(match_data)
 
+def queue_match_to_json(match_data, on_saved=None):
+    """
+    Como save_match_to_json pero vía la cola write-behind de data_manager:
+    el worker no espera a la escritura. on_saved se llama cuando ya está guardado.
+    """
+    try:
+        match_data['cached_at'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if not data_manager.enqueue_match(match_data, on_saved=on_saved):
+            print(f"Partido {match_data.get('match_id')} ignorado (filtro).")
+            if on_saved:
+                on_saved()
+    except Exception as e:
+        print(f"Error encolando partido {match_data.get('match_id')}: {e}")
+
+def _flush_background_writes(label):
+    """Vacía la cola write-behind al terminar/parar un proceso de background."""
+    if not data_manager.flush_writes(timeout=data_manager.SYNC_FLUSH_TIMEOUT_SECONDS):
+        print(f"[{label}] La cola de escritura no terminó en {data_manager.SYNC_FLUSH_TIMEOUT_SECONDS:g}s; sigue en segundo plano.")
+    stats = data_manager.get_write_queue_stats()
+    print(f"[{label}] Escrituras: {stats['written']} partidos en {stats['flushes']} lotes "
+          f"(último {stats['last_flush_ms']:.1f} ms, medio {stats['avg_flush_ms']:.1f} ms, cola {stats['depth']}).")
+
 
 # --- Mantén tu lógica para la página principal ---
 URL_NOWGOAL = "https://live20.nowgoal25.com/"
@@ -156,7 +187,14 @@ _REQUEST_HEADERS = {
 
 _requests_session = None
 _requests_session_lock = threading.Lock()
-_requests_fetch_lock = threading.Lock()
+
+# Página principal: sin lock global. Cada URL se descarga una sola vez a la vez
+# (single-flight), la respuesta vale MAIN_PAGE_CACHE_TTL_SECONDS y después se
+# revalida con If-None-Match / If-Modified-Since cuando el servidor da ETag/Last-Modified.
+MAIN_PAGE_CACHE_TTL_SECONDS = 15
+_main_page_cache = {}  # url -> {'ts', 'text', 'etag', 'last_modified'}
+_main_page_cache_lock = threading.Lock()
+_main_page_flight = SingleFlight()
 
 _EMPTY_DATA_TEMPLATE = {"upcoming_matches": [], "finished_matches": []}
 _DATA_FILE_CANDIDATES = [
@@ -171,30 +209,104 @@ else:
     DATA_FILE = _DATA_FILE_CANDIDATES[0]
 
 _data_file_lock = threading.Lock()
+_data_view = None
+_data_view_key = None
 
 
-def load_data_from_file():
-    """Carga los datos desde el archivo JSON, similar a la app ligera."""
+def _read_data_file():
+    if not DATA_FILE.exists():
+        return {key: [] for key in _EMPTY_DATA_TEMPLATE}
+    try:
+        with DATA_FILE.open('r', encoding='utf-8') as fh:
+            data = json.load(fh)
+    except (json.JSONDecodeError, OSError) as exc:
+        print(f"Error al leer {DATA_FILE}: {exc}")
+        return {key: [] for key in _EMPTY_DATA_TEMPLATE}
+    if not isinstance(data, dict):
+        return {key: [] for key in _EMPTY_DATA_TEMPLATE}
+
+    normalized = {}
+    for key in _EMPTY_DATA_TEMPLATE:
+        value = data.get(key, [])
+        if isinstance(value, list):
+            normalized[key] = [item for item in value if isinstance(item, dict)]
+        else:
+            normalized[key] = []
+    return normalized
+
+
+class _DataView:
+    """
+    Vista pre-procesada de data.json: se construye una vez por versión del archivo
+    (mtime + tamaño). Cada partido queda como tupla
+    (entry, parsed_time, sort_time, handicap_bucket, goal_line_value), con las
+    secciones ya ordenadas en ambos sentidos y un mapa id -> (entry, section).
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.by_id = {}
+        self.sorted = {}
+        self._filtered = {}
+        self._filtered_lock = threading.Lock()
+        for section in _EMPTY_DATA_TEMPLATE:
+            rows = []
+            for entry in data.get(section, []):
+                self.by_id.setdefault(str(entry.get('id')), (entry, section))
+                parsed_time = _parse_time_obj(entry.get('time_obj'))
+                rows.append((
+                    entry,
+                    parsed_time,
+                    parsed_time or datetime.datetime.min,
+                    normalize_handicap_to_half_bucket_str(entry.get('handicap', '') or ''),
+                    _goal_line_value(entry.get('goal_line', '')),
+                ))
+            sort_key = lambda row: (row[2], row[0].get('id', ''))
+            self.sorted[(section, False)] = sorted(rows, key=sort_key)
+            self.sorted[(section, True)] = sorted(rows, key=sort_key, reverse=True)
+
+    def filtered(self, section, handicap_filter, goal_line_filter, sort_desc):
+        """Filas ordenadas que pasan los filtros AH/OU (memoizado por combinación de filtros)."""
+        key = (section, handicap_filter or None, goal_line_filter or None, bool(sort_desc))
+        cached = self._filtered.get(key)
+        if cached is not None:
+            return cached
+        rows = self.sorted.get((section, bool(sort_desc)), [])
+        handicap_predicate = _build_handicap_bucket_predicate(handicap_filter)
+        if handicap_predicate:
+            rows = [row for row in rows if handicap_predicate(row[3])]
+        goal_predicate = _build_goal_line_value_predicate(goal_line_filter)
+        if goal_predicate:
+            rows = [row for row in rows if goal_predicate(row[4])]
+        with self._filtered_lock:
+            if len(self._filtered) > 256:
+                self._filtered.clear()
+            self._filtered[key] = rows
+        return rows
+
+
+def _get_data_view():
+    """Devuelve la vista de data.json, reconstruyéndola solo si el archivo cambió."""
+    global _data_view, _data_view_key
+    try:
+        stat = DATA_FILE.stat()
+        view_key = (str(DATA_FILE), stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        view_key = (str(DATA_FILE), None, None)
+    view = _data_view
+    if view is not None and _data_view_key == view_key:
+        return view
     with _data_file_lock:
-        if not DATA_FILE.exists():
-            return {key: [] for key in _EMPTY_DATA_TEMPLATE}
-        try:
-            with DATA_FILE.open('r', encoding='utf-8') as fh:
-                data = json.load(fh)
-        except (json.JSONDecodeError, OSError) as exc:
-            print(f"Error al leer {DATA_FILE}: {exc}")
-            return {key: [] for key in _EMPTY_DATA_TEMPLATE}
-        if not isinstance(data, dict):
-            return {key: [] for key in _EMPTY_DATA_TEMPLATE}
-
-        normalized = {}
-        for key in _EMPTY_DATA_TEMPLATE:
-            value = data.get(key, [])
-            if isinstance(value, list):
-                normalized[key] = [item for item in value if isinstance(item, dict)]
-            else:
-                normalized[key] = []
-        return normalized
+        if _data_view is None or _data_view_key != view_key:
+            _data_view = _DataView(_read_data_file())
+            _data_view_key = view_key
+        return _data_view
+
+
+def load_data_from_file():
+    """Carga los datos desde el archivo JSON (cacheado hasta que cambie el archivo)."""
+    data = _get_data_view().data
+    return {key: list(value) for key, value in data.items()}
 
 
 def _parse_time_obj(value):
@@ -218,6 +330,14 @@ def _ensure_time_string(entry, parsed_time):
 
 
 def _build_handicap_filter_predicate(handicap_filter):
+    bucket_predicate = _build_handicap_bucket_predicate(handicap_filter)
+    if not bucket_predicate:
+        return None
+    return lambda raw_value: bucket_predicate(normalize_handicap_to_half_bucket_str(raw_value or ''))
+
+
+def _build_handicap_bucket_predicate(handicap_filter):
+    """Como _build_handicap_filter_predicate, pero sobre el bucket ya normalizado."""
     if not handicap_filter:
         return None
     try:
@@ -230,8 +350,7 @@ def _build_handicap_filter_predicate(handicap_filter):
 
     use_range = abs(target_float) >= 2.0 and target_float != 0.0
 
-    def predicate(raw_value):
-        hv = normalize_handicap_to_half_bucket_str(raw_value or '')
+    def predicate(hv):
         if hv is None:
             return False
         if not use_range:
@@ -257,7 +376,22 @@ def _normalize_goal_line_option_str(value):
     return text
 
 
+def _goal_line_value(raw_value):
+    try:
+        return _parse_handicap_to_float(raw_value or '')
+    except Exception:
+        return None
+
+
 def _build_goal_line_filter_predicate(goal_line_filter):
+    value_predicate = _build_goal_line_value_predicate(goal_line_filter)
+    if not value_predicate:
+        return None
+    return lambda raw_value: value_predicate(_goal_line_value(raw_value))
+
+
+def _build_goal_line_value_predicate(goal_line_filter):
+    """Como _build_goal_line_filter_predicate, pero sobre la línea ya parseada."""
     if not goal_line_filter:
         return None
     try:
@@ -268,11 +402,7 @@ def _build_goal_line_filter_predicate(goal_line_filter):
         return None
     use_range = target_value >= 4.0
 
-    def predicate(raw_value):
-        try:
-            current_value = _parse_handicap_to_float(raw_value or '')
-        except Exception:
-            current_value = None
+    def predicate(current_value):
         if current_value is None:
             return False
         if not use_range:
@@ -314,72 +444,35 @@ def _build_goal_line_options_from_lists(match_lists):
 
 
 def _filter_and_slice_matches(section, limit=None, offset=0, handicap_filter=None, goal_line_filter=None, sort_desc=False, min_time=None):
-    data = load_data_from_file()
-    matches = data.get(section, [])
-    prepared = []
-    for original in matches:
-        entry = dict(original)
-        parsed_time = _parse_time_obj(entry.get('time_obj'))
-        entry['_sort_time'] = parsed_time or datetime.datetime.min
-        _ensure_time_string(entry, parsed_time)
-        
-        if min_time and parsed_time and parsed_time < min_time:
-            continue
-            
-        prepared.append(entry)
+    rows = _get_data_view().filtered(section, handicap_filter, goal_line_filter, sort_desc)
 
-    handicap_predicate = _build_handicap_filter_predicate(handicap_filter)
-    if handicap_predicate:
-        filtered = []
-        for entry in prepared:
-            if handicap_predicate(entry.get('handicap', '')):
-                filtered.append(entry)
-        prepared = filtered
-
-    goal_predicate = _build_goal_line_filter_predicate(goal_line_filter)
-    if goal_predicate:
-        filtered = []
-        for entry in prepared:
-            if goal_predicate(entry.get('goal_line', '')):
-                filtered.append(entry)
-        prepared = filtered
-
-    prepared.sort(key=lambda item: (item['_sort_time'], item.get('id', '')), reverse=sort_desc)
+    if min_time:
+        rows = [row for row in rows if not (row[1] and row[1] < min_time)]
 
     offset = max(int(offset or 0), 0)
-    if offset:
-        if offset >= len(prepared):
-            prepared = []
-        else:
-            prepared = prepared[offset:]
-
+    end = None
     if limit is not None:
         try:
             limit_val = int(limit)
         except (TypeError, ValueError):
             limit_val = None
         if limit_val is not None and limit_val >= 0:
-            prepared = prepared[:limit_val]
+            end = offset + limit_val
 
-    for entry in prepared:
-        # Add start_time before removing _sort_time
-        if '_sort_time' in entry:
-             spain_time = entry['_sort_time'] + datetime.timedelta(hours=1) # Matching the +1 logic from parsing
-             entry['start_time'] = spain_time.isoformat()
-        
-        entry.pop('_sort_time', None)
+    prepared = []
+    for original, parsed_time, sort_time, _, _ in rows[offset:end]:
+        entry = dict(original)
+        _ensure_time_string(entry, parsed_time)
+        spain_time = sort_time + datetime.timedelta(hours=1) # Matching the +1 logic from parsing
+        entry['start_time'] = spain_time.isoformat()
+        prepared.append(entry)
     return prepared
 
 
 def _find_match_basic_data(match_id: str):
     if not match_id:
         return None, None
-    data = load_data_from_file()
-    for section in ('upcoming_matches', 'finished_matches'):
-        for entry in data.get(section, []):
-            if str(entry.get('id')) == str(match_id):
-                return entry, section
-    return None, None
+    return _get_data_view().by_id.get(str(match_id), (None, None))
 
 
 def _get_preview_cache_dir():
@@ -437,16 +530,47 @@ def _get_shared_requests_session():
         return _requests_session
 
 
-def _fetch_nowgoal_html_sync(url: str) -> str | None:
+def _revalidate_nowgoal_html(url: str) -> str | None:
+    with _main_page_cache_lock:
+        entry = _main_page_cache.get(url)
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+
     session = _get_shared_requests_session()
     try:
-        with _requests_fetch_lock:
-            response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
-        response.raise_for_status()
-        return response.text
+        with rate_limiter.limited(url) as probe:
+            response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS, headers=headers)
+            probe['status'] = response.status_code
+        if response.status_code == 304 and entry:
+            text = entry['text']
+        else:
+            response.raise_for_status()
+            text = response.text
+            entry = {
+                'text': text,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
     except Exception as exc:
         print(f"Error al obtener {url} con requests: {exc}")
-        return None
+        # Mejor una copia algo vieja que nada; no se renueva su TTL.
+        return entry['text'] if entry else None
+
+    with _main_page_cache_lock:
+        _main_page_cache[url] = {**entry, 'ts': time.time()}
+    return text
+
+
+def _fetch_nowgoal_html_sync(url: str) -> str | None:
+    with _main_page_cache_lock:
+        entry = _main_page_cache.get(url)
+    if entry and (time.time() - entry['ts']) <= MAIN_PAGE_CACHE_TTL_SECONDS:
+        return entry['text']
+    html, _ = _main_page_flight.do(url, _revalidate_nowgoal_html, url)
+    return html
 
 
 async def _fetch_nowgoal_html(path: str | None = None, filter_state: int | None = None, requests_first: bool = True) -> str | None:
@@ -455,7 +579,8 @@ async def _fetch_nowgoal_html(path: str | None = None, filter_state: int | None
 
     if requests_first:
         try:
-            html = _fetch_nowgoal_html_sync(target_url)
+            # En un hilo: así asyncio.gather de varias URLs descarga en paralelo.
+            html = await asyncio.to_thread(_fetch_nowgoal_html_sync, target_url)
             if html:
                 return html
         except Exception as e:
@@ -549,64 +674,17 @@ def normalize_handicap_to_half_bucket_str(text: str):
     # Formato con un decimal
     return f"{b:.1f}"
 
-def parse_main_page_matches(html_content, limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    match_rows = soup.find_all('tr', id=lambda x: x and x.startswith('tr1_'))
-    upcoming_matches = []
-    now_utc = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-
-    for row in match_rows:
-        match_id = row.get('id', '').replace('tr1_', '')
-        if not match_id: continue
-
-        time_cell = row.find('td', {'name': 'timeData'})
-        if not time_cell or not time_cell.has_attr('data-t'): continue
-        
-        try:
-            match_time = datetime.datetime.strptime(time_cell['data-t'], '%Y-%m-%d %H:%M:%S')
-        except (ValueError, IndexError):
-            continue
-
-        if match_time < now_utc: continue
-
-        home_team_tag = row.find('a', {'id': f'team1_{match_id}'})
-        away_team_tag = row.find('a', {'id': f'team2_{match_id}'})
-        odds_data = row.get('odds', '').split(',')
-        handicap = odds_data[2] if len(odds_data) > 2 else "N/A"
-        goal_line = odds_data[10] if len(odds_data) > 10 else "N/A"
-
-        if handicap == "N/A":
-            continue
-
-
-        upcoming_matches.append({
-            "id": match_id,
-            "time_obj": match_time,
-            "home_team": home_team_tag.text.strip() if home_team_tag else "N/A",
-            "away_team": away_team_tag.text.strip() if away_team_tag else "N/A",
-            "handicap": handicap,
-            "goal_line": goal_line
-        })
-
-    handicap_predicate = _build_handicap_filter_predicate(handicap_filter)
-    if handicap_predicate:
-        filtered = []
-        for m in upcoming_matches:
-            if handicap_predicate(m.get('handicap', '')):
-                filtered.append(m)
-        upcoming_matches = filtered
-
-    goal_predicate = _build_goal_line_filter_predicate(goal_line_filter)
-    if goal_predicate:
-        filtered = []
-        for m in upcoming_matches:
-            if goal_predicate(m.get('goal_line', '')):
-                filtered.append(m)
-        upcoming_matches = filtered
+def _parse_main_page_rows(html_content, handicap_filter=None, goal_line_filter=None):
+    return main_page.parse_main_page(
+        html_content,
+        handicap_predicate=_build_handicap_filter_predicate(handicap_filter),
+        goal_line_predicate=_build_goal_line_filter_predicate(goal_line_filter),
+    )
 
+def _format_upcoming_matches(upcoming_matches, limit=20, offset=0):
     upcoming_matches.sort(key=lambda x: x['time_obj'])
     
-    paginated_matches = upcoming_matches[offset:offset+limit]
+    paginated_matches = upcoming_matches[offset:offset + limit if limit is not None else None]
 
     for match in paginated_matches:
         # Spanish time: UTC+1 in winter, adjust as needed
@@ -640,80 +718,10 @@ def parse_main_page_matches(html_content, limit=20, offset=0, handicap_filter=No
 
     return paginated_matches
 
-def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    match_rows = soup.find_all('tr', id=lambda x: x and x.startswith('tr1_'))
-    finished_matches = []
-    for row in match_rows:
-        match_id = row.get('id', '').replace('tr1_', '')
-        if not match_id: continue
-
-        state = row.get('state')
-        if state is not None and state != "-1":
-            continue
-
-        cells = row.find_all('td')
-        if len(cells) < 8: continue
-
-        home_team_tag = row.find('a', {'id': f'team1_{match_id}'})
-        away_team_tag = row.find('a', {'id': f'team2_{match_id}'})
-        
-        score_cell = cells[6]
-        score_text = "N/A"
-        if score_cell:
-            b_tag = score_cell.find('b')
-            if b_tag:
-                score_text = b_tag.text.strip()
-            else:
-                score_text = score_cell.get_text(strip=True)
-
-        if not re.match(r'^\d+\s*-\s*\d+$', score_text):
-            continue
-
-        odds_data = row.get('odds', '').split(',')
-        handicap = odds_data[2] if len(odds_data) > 2 else "N/A"
-        goal_line = odds_data[10] if len(odds_data) > 10 else "N/A"
-
-        if handicap == "N/A":
-            continue
-
-        time_cell = row.find('td', {'name': 'timeData'})
-        match_time = datetime.datetime.now()
-        if time_cell and time_cell.has_attr('data-t'):
-            try:
-                match_time = datetime.datetime.strptime(time_cell['data-t'], '%Y-%m-%d %H:%M:%S')
-            except (ValueError, IndexError):
-                continue
-        
-        finished_matches.append({
-            "id": match_id,
-            "time_obj": match_time,
-            "home_team": home_team_tag.text.strip() if home_team_tag else "N/A",
-            "away_team": away_team_tag.text.strip() if away_team_tag else "N/A",
-            "score": score_text,
-            "handicap": handicap,
-            "goal_line": goal_line
-        })
-
-    handicap_predicate = _build_handicap_filter_predicate(handicap_filter)
-    if handicap_predicate:
-        filtered = []
-        for m in finished_matches:
-            if handicap_predicate(m.get('handicap', '')):
-                filtered.append(m)
-        finished_matches = filtered
-
-    goal_predicate = _build_goal_line_filter_predicate(goal_line_filter)
-    if goal_predicate:
-        filtered = []
-        for m in finished_matches:
-            if goal_predicate(m.get('goal_line', '')):
-                filtered.append(m)
-        finished_matches = filtered
-
+def _format_finished_matches(finished_matches, limit=20, offset=0):
     finished_matches.sort(key=lambda x: x['time_obj'], reverse=True)
     
-    paginated_matches = finished_matches[offset:offset+limit]
+    paginated_matches = finished_matches[offset:offset + limit if limit is not None else None]
 
     for match in paginated_matches:
         # Existing logic added +2 hours for finished matches? 
@@ -726,6 +734,22 @@ def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_
 
     return paginated_matches
 
+def parse_main_page_lists(html_content, upcoming_limit=20, finished_limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
+    """(próximos, finalizados) paginados y formateados a partir de un único parseo de la página."""
+    upcoming_matches, finished_matches = _parse_main_page_rows(html_content, handicap_filter, goal_line_filter)
+    return (
+        _format_upcoming_matches(upcoming_matches, upcoming_limit, offset),
+        _format_finished_matches(finished_matches, finished_limit, offset),
+    )
+
+def parse_main_page_matches(html_content, limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
+    upcoming_matches, _ = _parse_main_page_rows(html_content, handicap_filter, goal_line_filter)
+    return _format_upcoming_matches(upcoming_matches, limit, offset)
+
+def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
+    _, finished_matches = _parse_main_page_rows(html_content, handicap_filter, goal_line_filter)
+    return _format_finished_matches(finished_matches, limit, offset)
+
 async def get_main_page_matches_async(limit=None, offset=0, handicap_filter=None, goal_line_filter=None, min_time=None):
     return _filter_and_slice_matches(
         'upcoming_matches',
@@ -751,62 +775,55 @@ async def get_main_page_finished_matches_async(limit=None, offset=0, handicap_fi
 
 # --- FUNCIONES DE SCRAPING DIRECTO PARA COLAB / BACKGROUND ---
 
-async def scrape_main_page_matches_async_direct(limit=None, offset=0, handicap_filter=None, goal_line_filter=None, min_time=None):
+def _filter_min_time(matches, min_time):
+    filtered = []
+    for m in matches:
+        t_str = m.get('start_time')
+        if t_str and t_str != 'N/A':
+            try:
+                t_obj = datetime.datetime.fromisoformat(t_str)
+                if t_obj.replace(tzinfo=None) >= min_time.replace(tzinfo=None):
+                    filtered.append(m)
+            except Exception as e:
+                pass
+    return filtered
+
+async def scrape_main_page_lists_async_direct(limit=None, offset=0, handicap_filter=None, goal_line_filter=None, min_time=None):
     """
-    Versión DEDICADA para scripts de fondo (Colab). Descarga la web fresca.
+    Versión DEDICADA para scripts de fondo (Colab). Descarga la web fresca UNA vez
+    y devuelve (próximos, finalizados) de un único parseo. min_time solo filtra próximos.
     NO USAR EN LA WEB (lento).
     """
-    print("🌍 [DIRECT SCRAPE] Descargando página principal (Próximos)...")
+    print("🌍 [DIRECT SCRAPE] Descargando página principal...")
     html = await _fetch_nowgoal_html() # path None = home
     if not html:
         print("❌ [DIRECT SCRAPE] Error: No se pudo descargar HTML.")
-        return []
+        return [], []
 
     print(f"✅ [DIRECT SCRAPE] HTML descargado ({len(html)} bytes). Parseando...")
-    matches = parse_main_page_matches(
-        html, 
-        limit=limit, 
-        offset=offset, 
-        handicap_filter=handicap_filter, 
+    upcoming, finished = parse_main_page_lists(
+        html,
+        upcoming_limit=limit,
+        finished_limit=limit,
+        offset=offset,
+        handicap_filter=handicap_filter,
         goal_line_filter=goal_line_filter
     )
-    
     if min_time:
-        filtered = []
-        for m in matches:
-            t_str = m.get('start_time')
-            if t_str and t_str != 'N/A':
-                try:
-                    t_obj = datetime.datetime.fromisoformat(t_str)
-                    if t_obj.replace(tzinfo=None) >= min_time.replace(tzinfo=None):
-                        filtered.append(m)
-                except Exception as e:
-                    pass
-        matches = filtered
+        upcoming = _filter_min_time(upcoming, min_time)
 
-    print(f"✅ [DIRECT SCRAPE] Encontrados {len(matches)} partidos.")
-    return matches
+    print(f"✅ [DIRECT SCRAPE] Encontrados {len(upcoming)} partidos próximos y {len(finished)} terminados.")
+    return upcoming, finished
 
-async def scrape_main_page_finished_matches_async_direct(limit=None, offset=0, handicap_filter=None, goal_line_filter=None):
-    """
-    Versión DEDICADA para scripts de fondo (Colab). Descarga la web fresca para terminados.
-    """
-    print("🌍 [DIRECT SCRAPE] Descargando página principal (Finalizados)...")
-    html = await _fetch_nowgoal_html()
-    if not html:
-        print("❌ [DIRECT SCRAPE] Error: No se pudo descargar HTML.")
-        return []
+async def scrape_main_page_matches_async_direct(limit=None, offset=0, handicap_filter=None, goal_line_filter=None, min_time=None):
+    """Próximos de scrape_main_page_lists_async_direct."""
+    upcoming, _ = await scrape_main_page_lists_async_direct(limit, offset, handicap_filter, goal_line_filter, min_time)
+    return upcoming
 
-    print(f"✅ [DIRECT SCRAPE] HTML descargado. Parseando...")
-    matches = parse_main_page_finished_matches(
-        html,
-        limit=limit,
-        offset=offset,
-        handicap_filter=handicap_filter,
-        goal_line_filter=goal_line_filter
-    )
-    print(f"✅ [DIRECT SCRAPE] Encontrados {len(matches)} partidos terminados.")
-    return matches
+async def scrape_main_page_finished_matches_async_direct(limit=None, offset=0, handicap_filter=None, goal_line_filter=None):
+    """Finalizados de scrape_main_page_lists_async_direct."""
+    _, finished = await scrape_main_page_lists_async_direct(limit, offset, handicap_filter, goal_line_filter)
+    return finished
 
 
 
@@ -903,98 +920,86 @@ def api_all_finished_matches():
         return jsonify({'error': str(e)}), 500
 
 # --- CACHE STATE PERSISTENCE ---
+# Snapshot JSON + log append-only de IDs (ver modules/id_checkpoint.py):
+# comprobar y añadir un ID es O(1), sin reescribir el fichero por cada partido.
+from modules.id_checkpoint import ProcessedIdCheckpoint
+
 CACHE_STATE_FILE = Path(__file__).resolve().parent / 'cache_state.json'
-_cache_state_lock = threading.Lock()
+_cache_checkpoint = ProcessedIdCheckpoint(CACHE_STATE_FILE)
 
 def load_cache_state():
-    with _cache_state_lock:
-        if CACHE_STATE_FILE.exists():
-            try:
-                with open(CACHE_STATE_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                pass
-    return {'processed_ids': []}
+    return {'processed_ids': sorted(_cache_checkpoint.ids())}
 
 def save_cache_state(state):
-    with _cache_state_lock:
-        try:
-            with open(CACHE_STATE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(state, f, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving cache state: {e}")
+    try:
+        _cache_checkpoint.replace(state.get('processed_ids', []))
+    except Exception as e:
+        print(f"Error saving cache state: {e}")
 
 def add_processed_id(match_id):
-    state = load_cache_state()
-    if str(match_id) not in state['processed_ids']:
-        state['processed_ids'].append(str(match_id))
-        save_cache_state(state)
+    _cache_checkpoint.add(match_id)
 
 
 # --- PRE-CACHE STATE PERSISTENCE ---
 PRECACHE_STATE_FILE = Path(__file__).resolve().parent / 'precache_state.json'
-_precache_state_lock = threading.Lock()
+_precache_checkpoint = ProcessedIdCheckpoint(PRECACHE_STATE_FILE)
 
 def load_precache_state():
-    with _precache_state_lock:
-        if PRECACHE_STATE_FILE.exists():
-            try:
-                with open(PRECACHE_STATE_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                pass
-    return {'processed_ids': []}
+    return {'processed_ids': sorted(_precache_checkpoint.ids())}
 
 def save_precache_state(state):
-    with _precache_state_lock:
-        try:
-            with open(PRECACHE_STATE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(state, f, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving precache state: {e}")
-
-def add_precache_processed_id(match_id):
-    state = load_precache_state()
-    if str(match_id) not in state['processed_ids']:
-        state['processed_ids'].append(str(match_id))
-        save_precache_state(state)
-
-def process_single_match_worker(match_id):
-    """Worker function for single match processing."""
     try:
-        # Check if already processed in this session/state
-        # (Though we check before submitting, keeping it robust)
-        
-        # Analyze
-        match_data = analizar_partido_completo(str(match_id))
-        if match_data and not match_data.get('error'):
-            save_match_to_json(match_data)
-            add_processed_id(match_id)
-            return True, match_id
-        else:
-            return False, match_id
-            
+        _precache_checkpoint.replace(state.get('processed_ids', []))
     except Exception as e:
-        print(f"Error processing {match_id}: {e}")
-        return False, match_id
+        print(f"Error saving precache state: {e}")
 
-def process_single_precache_worker(match_id):
-    """Worker for upcoming matches (Pre-Cacheo)."""
-    try:
-        match_data = analizar_partido_completo(str(match_id))
-        if match_data and not match_data.get('error'):
-             match_data['match_id'] = str(match_id)
-             match_data['precacheo_date'] = datetime.datetime.now().isoformat()
-             data_manager.save_precacheo_match(match_data)
-             add_precache_processed_id(match_id)
-             return True, match_id
-        else:
-            return False, match_id
-    except Exception as e:
-        print(f"Error precaching {match_id}: {e}")
-        return False, match_id
+def add_precache_processed_id(match_id):
+    _precache_checkpoint.add(match_id)
+
+def store_analyzed_match(match_id, match_data):
+    """Encola un análisis terminado (cacheo de finalizados). Devuelve True si se guardó."""
+    if match_data and not match_data.get('error'):
+        # El ID se marca como procesado solo cuando el partido ya está escrito.
+        queue_match_to_json(match_data, on_saved=lambda: add_processed_id(match_id))
+        return True
+    return False
+
+def store_precached_match(match_id, match_data):
+    """Encola un análisis terminado en Pre-Cacheo. Devuelve True si se guardó."""
+    if match_data and not match_data.get('error'):
+        match_data['match_id'] = str(match_id)
+        match_data['precacheo_date'] = datetime.datetime.now().isoformat()
+        data_manager.enqueue_precacheo_match(match_data, on_saved=lambda: add_precache_processed_id(match_id))
+        return True
+    return False
 
-def process_upcoming_matches_background(handicap_filter=None, goal_line_filter=None, workers=5, order_by_recent=True):
+def run_background_analyses(match_ids, store, label, concurrency=None):
+    """
+    Analiza match_ids con el motor asyncio (un solo hilo, `concurrency` análisis en
+    vuelo, conexiones limitadas por host) y guarda cada resultado con store(mid, data).
+    Respeta STOP_CACHE_EVENT para los que aún no han empezado. Devuelve los completados.
+    """
+    concurrency = concurrency or ANALYSIS_ASYNC_CONCURRENCY
+    total = len(match_ids)
+    progress = {'completed': 0}
+
+    def on_result(mid, match_data):
+        progress['completed'] += 1
+        try:
+            store(mid, match_data)
+        except Exception as e:
+            print(f"Excepción guardando {mid} ({label}): {e}")
+        if progress['completed'] % 5 == 0 or progress['completed'] == total:
+            print(f"Progreso {label}: {progress['completed']}/{total} procesados.")
+
+    print(f"Iniciando {label} con hasta {concurrency} análisis en vuelo...")
+    asyncio.run(analizar_partidos_async(match_ids, on_result=on_result, concurrency=concurrency, stop_event=STOP_CACHE_EVENT))
+    for host, host_stats in rate_limiter.stats().items():
+        print(f"Ritmo {label} [{host}]: {host_stats['rate']} req/s, latencia {host_stats['latency']}s, "
+              f"concurrencia ~{host_stats['concurrency']}")
+    return progress['completed']
+
+def process_upcoming_matches_background(handicap_filter=None, goal_line_filter=None, workers=None, order_by_recent=True):
     """
     Procesa partidos PRÓXIMOS (Pre-Cacheo) en segundo plano con optimizaciones:
     - Filtros
@@ -1029,8 +1034,7 @@ def process_upcoming_matches_background(handicap_filter=None, goal_line_filter=N
         print(f"Se encontraron {len(matches)} partidos próximos candidatos.")
         
         # 2. Cargar estado
-        state = load_precache_state()
-        processed_ids = set(state.get('processed_ids', []))
+        processed_ids = _precache_checkpoint
         
         # 3. Filtrar los que ya están hechos y preparar para ordenar por proximidad temporal
         # Checkeo rápido contra el archivo (state) es más eficiente que cargar todo data_manager
@@ -1038,17 +1042,13 @@ def process_upcoming_matches_background(handicap_filter=None, goal_line_filter=N
         now = datetime.datetime.now()
         candidates = []  # Lista de (match_id, start_time_str, distance_from_now)
         
-        for m in matches:
-            mid = str(m.get('id') or m.get('match_id'))
-            
-            # FIX: Verificar si REALMENTE tenemos datos, no solo si el state dice que sí.
-            exists_in_data = False
-            is_processed = mid in processed_ids
-            if is_processed:
-                 # Doble check: ¿está en el archivo de precacheo?
-                 cached_match = data_manager.get_precacheo_match(mid)
-                 if cached_match:
-                     exists_in_data = True
+        # FIX: Verificar si REALMENTE tenemos datos, no solo si el state dice que sí.
+        # Doble check en bloque contra el índice de precacheo (sin parsear payloads).
+        match_ids = [str(m.get('id') or m.get('match_id')) for m in matches]
+        cached_ids = data_manager.existing_precacheo_ids(mid for mid in match_ids if mid in processed_ids)
+        
+        for m, mid in zip(matches, match_ids):
+            exists_in_data = mid in cached_ids
             
             if mid and not exists_in_data:
                 # Extraer hora de inicio para ordenar
@@ -1080,43 +1080,17 @@ def process_upcoming_matches_background(handicap_filter=None, goal_line_filter=N
             print("Nada nuevo que scrapear en Pre-Cacheo.")
             return
 
-        # 5. Procesar en paralelo PERO manteniendo orden de proximidad
-        # Usamos chunks del tamaño de workers para procesar en batches ordenados
-        max_workers = workers if workers else 5 
-        total = len(to_process)
-        completed = 0
-        
-        print(f"Iniciando Pool Pre-Cacheo con {max_workers} workers (orden: más cercanos primero)...")
-        
-        # Procesar en batches ordenados para garantizar que los más cercanos se hagan primero
-        batch_size = max_workers * 2  # Procesar en batches un poco más grandes para eficiencia
-        
-        for batch_start in range(0, total, batch_size):
-            if STOP_CACHE_EVENT.is_set():
-                print("Señal de parada recibida (Pre-Cacheo). Deteniendo...")
-                break
-                
-            batch = to_process[batch_start:batch_start + batch_size]
-            
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {executor.submit(process_single_precache_worker, mid): mid for mid in batch}
-                
-                for future in concurrent.futures.as_completed(futures):
-                    if STOP_CACHE_EVENT.is_set():
-                        print("Señal de parada recibida (Pre-Cacheo). Cancelando tareas...")
-                        executor.shutdown(wait=False, cancel_futures=True)
-                        break
-
-                    mid = futures[future]
-                    try:
-                        success, _ = future.result()
-                        completed += 1
-                        
-                        if completed % 5 == 0 or completed == total:
-                            print(f"Progreso Pre-Cacheo: {completed}/{total} procesados.")
-                            
-                    except Exception as e:
-                        print(f"Excepción en worker Pre-Cacheo {mid}: {e}")
+        # Tabla de cuotas bf_data: una descarga/parseo para todo el lote; los
+        # fallbacks de cada análisis la consultan luego en memoria.
+        try:
+            bf_odds = lookup_bf_odds(to_process)
+            print(f"Tabla bf_data: {len(bf_odds)}/{len(to_process)} partidos presentes en el feed.")
+        except Exception as e:
+            print(f"Tabla bf_data no disponible: {e}")
+
+        # 5. Procesar con el motor asyncio; el semáforo es FIFO, así que los más
+        # cercanos en el tiempo siguen empezando primero.
+        completed = run_background_analyses(to_process, store_precached_match, "Pre-Cacheo", workers)
                     
         if STOP_CACHE_EVENT.is_set():
              print(f"Pre-Cacheo detenido. {completed} partidos completados.")
@@ -1125,6 +1099,8 @@ def process_upcoming_matches_background(handicap_filter=None, goal_line_filter=N
         
     except Exception as e:
         print(f"Error fatal en Pre-Cacheo background: {e}")
+    finally:
+        _flush_background_writes("Pre-Cacheo")
 
 def scrape_pending_results_background():
     """
@@ -1201,55 +1177,45 @@ def scrape_pending_results_background():
             print("No hay partidos pendientes de resultado (todos recientes o ya tienen score).")
             return
         
-        # 4. Scrapear en paralelo con 8 workers
-        success_count = 0
-        max_workers = 8
+        # 4. Resultados en bloque (filas finalizadas de la portada, feed bf_data y,
+        # para el resto, solo la cabecera h2h) y parche de final_score/score.
+        scores = resolve_final_scores(to_process, known_scores=_main_page_final_scores())
+        patched = data_manager.patch_final_scores(scores, precacheo=True)
         total = len(to_process)
-        completed = 0
-        
-        print(f"Iniciando scrape de resultados con {max_workers} workers...")
-        
-        def scrape_single_result(mid):
-            """Worker para scrapear un solo partido."""
-            try:
-                match_data = analizar_partido_completo(str(mid), force_refresh=True)
-                
-                if match_data and not match_data.get('error'):
-                    new_score = match_data.get('score') or match_data.get('final_score')
-                    
-                    if new_score and new_score not in ['??', '?:?', '? : ?']:
-                        match_data['match_id'] = str(mid)
-                        data_manager.save_precacheo_match(match_data)
-                        return (True, mid, new_score)
-                    else:
-                        return (False, mid, "Sin resultado aún")
-                return (False, mid, "Error scraping")
-            except Exception as e:
-                return (False, mid, str(e))
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(scrape_single_result, mid): mid for mid in to_process}
-            
-            for future in concurrent.futures.as_completed(futures):
-                mid = futures[future]
-                completed += 1
-                try:
-                    success, match_id, info = future.result()
-                    if success:
-                        print(f"  ✓ [{completed}/{total}] {match_id}: {info}")
-                        success_count += 1
-                    else:
-                        print(f"  ✗ [{completed}/{total}] {match_id}: {info}")
-                except Exception as e:
-                    print(f"  ✗ [{completed}/{total}] {mid}: Error - {e}")
-                
-        print(f"Scrape de resultados completado. {success_count}/{total} obtuvieron resultado.")
+        for mid in to_process:
+            mid = str(mid)
+            if mid in patched:
+                print(f"  ✓ {mid}: {scores[mid]}")
+            else:
+                print(f"  ✗ {mid}: Sin resultado aún")
+        print(f"Scrape de resultados completado. {len(patched)}/{total} obtuvieron resultado.")
+
+        # 5. Re-análisis completo solo de los que se guardaron incompletos
+        # (deadline vencido): sus datos sí cambian al volver a scrapear.
+        stored = {str(m.get('match_id')): m for m in precacheo_matches}
+        incomplete = [mid for mid in patched if (stored.get(mid) or {}).get('partial')]
+        if incomplete:
+            run_background_analyses(incomplete, store_precached_match, "Re-análisis de resultados")
         
     except Exception as e:
         print(f"Error fatal en scrape de resultados pendientes: {e}")
+    finally:
+        _flush_background_writes("Resultados pendientes")
+
 
+def _main_page_final_scores():
+    """{match_id: 'h-a'} de las filas finalizadas de la página principal (una sola descarga)."""
+    try:
+        html = _fetch_nowgoal_html_sync(_build_nowgoal_url(None))
+    except Exception as e:
+        print(f"Error descargando la página principal: {e}")
+        return {}
+    if not html:
+        return {}
+    return {m['id']: m['score'] for m in parse_main_page_finished_matches(html, limit=None)}
 
-def process_all_finished_matches_background(handicap_filter=None, goal_line_filter=None, workers=5):
+
+def process_all_finished_matches_background(handicap_filter=None, goal_line_filter=None, workers=None):
     """
     Procesa partidos finalizados en segundo plano con optimizaciones:
     - Filtros
@@ -1281,8 +1247,7 @@ def process_all_finished_matches_background(handicap_filter=None, goal_line_filt
         print(f"Se encontraron {len(matches)} partidos candidatos.")
         
         # 2. Cargar estado anterior
-        state = load_cache_state()
-        processed_ids = set(state.get('processed_ids', []))
+        processed_ids = _cache_checkpoint
         
         # 3. Filtrar los que ya están hechos
         to_process = []
@@ -1297,36 +1262,8 @@ def process_all_finished_matches_background(handicap_filter=None, goal_line_filt
             print("Nada nuevo que procesar.")
             return
 
-        # 4. Procesar en paralelo
-        max_workers = workers
-        total = len(to_process)
-        completed = 0
-        
-        print(f"Iniciando Pool con {max_workers} workers...")
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(process_single_match_worker, mid): mid for mid in to_process}
-            
-            for future in concurrent.futures.as_completed(futures):
-                # STOP CHECK
-                if STOP_CACHE_EVENT.is_set():
-                    print("Señal de parada recibida. Cancelando tareas restantes...")
-                    executor.shutdown(wait=False, cancel_futures=True)
-                    break
-
-                mid = futures[future]
-                try:
-                    success, _ = future.result()
-                    completed += 1
-                    if success:
-                        pass # Log extra if needed
-                    
-                    # Log de progreso simple
-                    if completed % 5 == 0 or completed == total:
-                        print(f"Progreso: {completed}/{total} procesados.")
-                        
-                except Exception as e:
-                    print(f"Excepción en worker {mid}: {e}")
+        # 4. Procesar con el motor asyncio (workers = análisis en vuelo)
+        completed = run_background_analyses(to_process, store_analyzed_match, "Cacheo", workers)
                     
         if STOP_CACHE_EVENT.is_set():
             print(f"Proceso detenido. {completed} partidos completados antes de parar.")
@@ -1335,6 +1272,8 @@ def process_all_finished_matches_background(handicap_filter=None, goal_line_filt
         
     except Exception as e:
         print(f"Error fatal en proceso de background: {e}")
+    finally:
+        _flush_background_writes("Cacheo")
 
         return jsonify({'error': str(e)}), 500
 
@@ -1348,8 +1287,25 @@ STOP_CACHE_EVENT = threading.Event()
 def api_stop_background_cache():
     """Endpoint para detener el cacheo en background."""
     STOP_CACHE_EVENT.set()
+    # Pide al writer que escriba ya lo encolado (sin esperar a que termine).
+    data_manager.flush_writes(timeout=0)
     return jsonify({'status': 'success', 'message': 'Se ha enviado la señal de parada. El proceso se detendrá pronto.'})
 
+@app.route('/api/write_queue_stats')
+def api_write_queue_stats():
+    """Profundidad de la cola write-behind y latencias de flush."""
+    return jsonify(data_manager.get_write_queue_stats())
+
+@app.route('/api/rate_limiter_stats')
+def api_rate_limiter_stats():
+    """Ritmo actual (req/s), latencia media y concurrencia sostenible por host upstream."""
+    return jsonify(rate_limiter.stats())
+
+@app.route('/api/mirror_stats')
+def api_mirror_stats():
+    """Salud de los dominios espejo (fallos, peticiones ganadas, retardo de hedging)."""
+    return jsonify(live_mirror_stats())
+
 @app.route('/api/cache_all_finished_background', methods=['POST'])
 def api_cache_all_finished_background():
     """Endpoint para iniciar el cacheo (acepta filtros)."""
@@ -1428,8 +1384,7 @@ def process_id_ranges_background(ranges_str):
                     count += 1
                 else:
                     print(f"No se obtuvieron datos para {match_id}")
-                
-                time.sleep(1) # Pausa respetuosa
+                # Sin pausa fija: rate_limiter ya espacia las peticiones por host.
             except Exception as e:
                 print(f"Error procesando {match_id}: {e}")
         
@@ -1530,6 +1485,7 @@ def mostrar_estudio(match_id):
         abort(500, description=error_message)
 
     datos_partido['match_id'] = target_match_id
+    hydrate_match_html(datos_partido)
     print(f"Datos obtenidos para {datos_partido['home_name']} vs {datos_partido['away_name']}. Renderizando plantilla...")
     return render_template(
         'estudio.html',
@@ -1563,6 +1519,8 @@ def api_estudio_panel(match_id):
         save_match_to_json(datos_partido)
         # ----------------------
 
+        # Si el análisis viene del almacenamiento slim, regenera el HTML.
+        hydrate_match_html(datos_partido)
         html = render_template(
             'partials/analysis_panel.html',
             data=datos_partido,
@@ -1643,25 +1601,12 @@ def api_analisis(match_id):
             return jsonify({'error': (datos or {}).get('error', 'No se pudieron obtener datos.')}), 500
 
         # --- Lógica para el payload complejo (la original) ---
-        def df_to_rows(df):
-            rows = []
+        def stats_rows_of(stats):
+            # stats: tupla (estadística, casa, fuera) de get_match_progression_stats_data.
             try:
-                if df is not None and hasattr(df, 'iterrows'):
-                    for idx, row in df.iterrows():
-                        label = str(idx)
-                        label = label.replace('Shots on Goal', 'Tiros a Puerta')                                     .replace('Shots', 'Tiros')                                     .replace('Dangerous Attacks', 'Ataques Peligrosos')                                     .replace('Attacks', 'Ataques')
-                        try:
-                            home_val = row['Casa']
-                        except Exception:
-                            home_val = ''
-                        try:
-                            away_val = row['Fuera']
-                        except Exception:
-                            away_val = ''
-                        rows.append({'label': label, 'home': home_val or '', 'away': away_val or ''})
+                return [{**row, 'home': row['home'] or '', 'away': row['away'] or ''} for row in stats_to_rows(stats)]
             except Exception:
-                pass
-            return rows
+                return []
 
         payload = {
             'match_id': match_id,
@@ -1761,7 +1706,7 @@ def api_analisis(match_id):
                 'score': (last_home_details.get('score') or '').replace(':', ' : '),
                 'ah': format_ah_as_decimal_string_of(last_home_details.get('handicap_line_raw') or '-'),
                 'ou': last_home_details.get('ouLine') or '-',
-                'stats_rows': df_to_rows(last_home.get('stats')),
+                'stats_rows': stats_rows_of(last_home.get('stats')),
                 'date': last_home_details.get('date'),
                 'cover_status': get_cover_status_vs_current(last_home_details)
             }
@@ -1775,7 +1720,7 @@ def api_analisis(match_id):
                 'score': (last_away_details.get('score') or '').replace(':', ' : '),
                 'ah': format_ah_as_decimal_string_of(last_away_details.get('handicap_line_raw') or '-'),
                 'ou': last_away_details.get('ouLine') or '-',
-                'stats_rows': df_to_rows(last_away.get('stats')),
+                'stats_rows': stats_rows_of(last_away.get('stats')),
                 'date': last_away_details.get('date'),
                 'cover_status': get_cover_status_vs_current(last_away_details)
             }
@@ -1794,7 +1739,7 @@ def api_analisis(match_id):
                 'score': f"{h2h_col3_details.get('goles_home')} : {h2h_col3_details.get('goles_away')}",
                 'ah': format_ah_as_decimal_string_of(h2h_col3_details.get('handicap_line_raw') or '-'),
                 'ou': h2h_col3_details.get('ou_result') or '-',
-                'stats_rows': df_to_rows(h2h_col3.get('stats')),
+                'stats_rows': stats_rows_of(h2h_col3.get('stats')),
                 'date': h2h_col3_details.get('date'),
                 'cover_status': get_cover_status_vs_current(h2h_col3_details_adapted),
                 'analysis': analyze_h2h_rivals(last_home_details, last_away_details)
@@ -1815,7 +1760,7 @@ def api_analisis(match_id):
                 'score': score_text.replace(':', ' : '),
                 'ah': h2h_general_details.get('ah6') or '-',
                 'ou': h2h_general_details.get('ou_result6') or '-',
-                'stats_rows': df_to_rows(h2h_general.get('stats')),
+                'stats_rows': stats_rows_of(h2h_general.get('stats')),
                 'date': h2h_general_details.get('date'),
                 'cover_status': get_cover_status_vs_current(cover_input) if score_text else 'NEUTRO'
             }
@@ -1832,7 +1777,7 @@ def api_analisis(match_id):
                 'ah': format_ah_as_decimal_string_of(comp_left_details.get('ah_line') or '-'),
                 'ou': comp_left_details.get('ou_line') or '-',
                 'localia': comp_left_details.get('localia') or '',
-                'stats_rows': df_to_rows(comp_left.get('stats')),
+                'stats_rows': stats_rows_of(comp_left.get('stats')),
                 'cover_status': get_cover_status_vs_current(comp_left_details),
                 'analysis': analyze_indirect_comparison(comp_left_details, datos.get('home_name'))
             }
@@ -1849,7 +1794,7 @@ def api_analisis(match_id):
                 'ah': format_ah_as_decimal_string_of(comp_right_details.get('ah_line') or '-'),
                 'ou': comp_right_details.get('ou_line') or '-',
                 'localia': comp_right_details.get('localia') or '',
-                'stats_rows': df_to_rows(comp_right.get('stats')),
+                'stats_rows': stats_rows_of(comp_right.get('stats')),
                 'cover_status': get_cover_status_vs_current(comp_right_details),
                 'analysis': analyze_indirect_comparison(comp_right_details, datos.get('away_name'))
             }
@@ -2040,7 +1985,7 @@ def api_precacheo_scrape_background():
         data = request.json or {}
         handicap_filter = data.get('handicap')
         goal_line_filter = data.get('ou')
-        workers = data.get('workers', 5)
+        workers = data.get('workers')
         
         # Iniciar hilo
         thread = threading.Thread(
@@ -2052,7 +1997,7 @@ def api_precacheo_scrape_background():
         
         return jsonify({
             'status': 'success', 
-            'message': f'Pre-Cacheo iniciado (Filtros: AH={handicap_filter}, OU={goal_line_filter}, Workers={workers}).'
+            'message': f'Pre-Cacheo iniciado (Filtros: AH={handicap_filter}, OU={goal_line_filter}, En vuelo={workers or ANALYSIS_ASYNC_CONCURRENCY}).'
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2449,19 +2394,7 @@ def api_cache_matches():
 def api_pending_matches():
     """Devuelve la lista de partidos con resultado pendiente (??)."""
     try:
-        # Load directly from the specific bucket file if possible, or search all
-        # To be safe and consistent with data_manager, we should use a method there.
-        # For now, let's load manualy or generic.
-        # Assuming data_manager has logic or we implement reading 'data_pending_results.json'
-        
-        pending_file =  Path(__file__).resolve().parent / 'data' / 'data_pending_results.json'
-        matches = []
-        if pending_file.exists():
-            try:
-                with open(pending_file, 'r', encoding='utf-8') as f:
-                    matches = json.load(f)
-            except:
-                matches = []
+        matches = data_manager.load_pending_matches()
         return jsonify({'matches': matches})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2475,8 +2408,21 @@ def api_reanalyze_pending():
         if not match_id:
              return jsonify({'error': 'Falta match_id'}), 400
              
-        # Re-analyze
-        match_data = analizar_partido_completo(str(match_id), force_refresh=True)
+        match_id = str(match_id)
+        stored = data_manager.get_match(match_id)
+        if stored and not stored.get('partial'):
+            # Solo falta el resultado: se consulta en bf_data / cabecera h2h y se parchea.
+            scores = resolve_final_scores([match_id])
+            if data_manager.patch_final_scores(scores):
+                stored = data_manager.get_match(match_id)
+            return jsonify({
+                'status': 'success',
+                'match': stored,
+                'result_found': match_id in scores
+            })
+
+        # Sin datos guardados o análisis incompleto: re-análisis completo
+        match_data = analizar_partido_completo(match_id, force_refresh=True)
         if not match_data or match_data.get('error'):
              return jsonify({'error': 'Falló el análisis'}), 500
              
@@ -2487,25 +2433,9 @@ def api_reanalyze_pending():
         # Save (this handles moving to correct bucket if score found, or updating pending if not)
         data_manager.save_match(match_data)
         
-        # If result found, we should remove from pending file explicitly if save_match doesn't do it automatically
-        # data_manager.save_match ADDS to buckets. It might not remove from pending if it goes to another bucket.
-        # We need to manually remove from pending if it moved to a numbered bucket.
-        
+        # save_match ADDS to buckets; once a result exists the match must leave the pending bucket.
         if result_found:
-            # Load pending, remove this id, save
-            pending_file = Path(__file__).resolve().parent / 'data' / 'data_pending_results.json'
-            if pending_file.exists():
-                try:
-                    with open(pending_file, 'r', encoding='utf-8') as f:
-                        pm = json.load(f)
-                    
-                    new_pm = [m for m in pm if str(m.get('match_id')) != str(match_id)]
-                    
-                    if len(new_pm) != len(pm):
-                         with open(pending_file, 'w', encoding='utf-8') as f:
-                            json.dump(new_pm, f, indent=2, ensure_ascii=False)
-                except:
-                    pass
+            data_manager.remove_from_pending(match_id)
         
         return jsonify({
             'status': 'success', 
@@ -2585,12 +2515,7 @@ def api_ai_prediction():
             return jsonify({'error': 'match_id is required'}), 400
         
         # Get match data from precacheo (it's a list of matches)
-        precacheo_list = data_manager.load_precacheo_matches()
-        match_data = {}
-        for m in precacheo_list:
-            if str(m.get('match_id')) == str(match_id):
-                match_data = m
-                break
+        match_data = data_manager.get_precacheo_match(str(match_id)) or {}
         
         # Use frontend team names if available, fallback to precacheo data
         home_team = frontend_home_team or match_data.get('home_team', 'Home Team')
@@ -1,7 +1,6 @@
 # modules/analisis_reciente.py
-import re
 import math
-from bs4 import BeautifulSoup
+from modules.h2h_page import H2HPage, HOME_TABLE, AWAY_TABLE
 from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of, check_handicap_cover
 
 def analizar_rendimiento_reciente_con_handicap(soup, team_name, is_home_team=True):
@@ -17,56 +16,26 @@ def analizar_rendimiento_reciente_con_handicap(soup, team_name, is_home_team=Tru
         dict: Diccionario con el análisis del rendimiento reciente
     """
     # Determinar qué tabla usar según si es equipo local o visitante
-    table_id = "table_v1" if is_home_team else "table_v2"
-    table = soup.find("table", id=table_id)
+    page = H2HPage.of(soup)
+    table = HOME_TABLE if is_home_team else AWAY_TABLE
     
-    if not table:
+    if not page.has_table(table):
         return {"error": "No se encontró la tabla de partidos recientes"}
     
-    # Extraer los últimos 5 partidos del equipo
+    # Extraer los últimos 5 partidos del equipo (filas completas con resultado)
     matches = []
-    score_selector = 'fscore_1' if is_home_team else 'fscore_2'
-    
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
+    for row in page.by_team(team_name, table):
         if len(matches) >= 5:  # Limitar a los últimos 5 partidos
             break
-            
-        # Extraer información del partido
-        cells = row.find_all('td')
-        if len(cells) < 12:
-            continue
-            
-        # Obtener nombres de equipos
-        home_team_cell = cells[2]
-        away_team_cell = cells[4]
-        
-        home_team = home_team_cell.get_text(strip=True)
-        away_team = away_team_cell.get_text(strip=True)
-        
-        # Verificar si el equipo está en este partido
-        if team_name.lower() not in [home_team.lower(), away_team.lower()]:
+        if not row.complete or row.score_text is None or '-' not in row.score_text:
             continue
-            
-        # Obtener resultado
-        score_cell = cells[3]
-        score_span = score_cell.find('span', class_=score_selector)
-        if not score_span:
-            continue
-            
-        score_raw = score_span.get_text(strip=True)
-        if '-' not in score_raw:
-            continue
-            
-        # Obtener handicap
-        ah_cell = cells[11]
-        ah_line_raw = (ah_cell.get('data-o') or ah_cell.text).strip()
         
         matches.append({
-            'home_team': home_team,
-            'away_team': away_team,
-            'score': score_raw,
-            'ah_line_raw': ah_line_raw,
-            'ah_line_num': parse_ah_to_number_of(ah_line_raw)
+            'home_team': row.home,
+            'away_team': row.away,
+            'score': row.score_text,
+            'ah_line_raw': row.ah_raw,
+            'ah_line_num': parse_ah_to_number_of(row.ah_raw)
         })
     
     # Analizar el rendimiento
@@ -1,7 +1,20 @@
 # modules/analisis_rivales.py
-import re
-from bs4 import BeautifulSoup
-from modules.utils import get_match_details_from_row_of
+from modules.h2h_page import H2HPage, HOME_TABLE, AWAY_TABLE
+from modules.utils import format_ah_as_decimal_string_of
+
+
+def _detalles_partidos(page, table):
+    """Filas completas de la tabla como dicts de partido (equipos, marcador, línea AH, fecha)."""
+    partidos = []
+    for row in page.rows(table):
+        if not row.complete or not row.home or not row.away:
+            continue
+        partidos.append({
+            'home': row.home, 'away': row.away, 'score': row.score, 'score_raw': row.score_raw,
+            'ahLine': format_ah_as_decimal_string_of(row.ah_raw) if row.ah_raw not in ['', '-'] else '-',
+            'ahLine_raw': row.ah_raw or '-', 'date': row.date
+        })
+    return partidos
 
 def analizar_rivales_comunes(soup, team_a, team_b):
     """
@@ -16,24 +29,22 @@ def analizar_rivales_comunes(soup, team_a, team_b):
         dict: Diccionario con el análisis de rivales comunes
     """
     # Buscar tablas de partidos para ambos equipos
-    table_v1 = soup.find("table", id="table_v1")  # Partidos de team_a como local
-    table_v2 = soup.find("table", id="table_v2")  # Partidos de team_b como visitante
-    
-    if not table_v1 or not table_v2:
+    page = H2HPage.of(soup)
+    if not page.has_table(HOME_TABLE) or not page.has_table(AWAY_TABLE):
         return {"error": "No se encontraron las tablas de partidos"}
+    partidos_v1 = _detalles_partidos(page, HOME_TABLE)  # Partidos de team_a
+    partidos_v2 = _detalles_partidos(page, AWAY_TABLE)  # Partidos de team_b
     
     # Extraer rivales de team_a (como local)
     rivals_a = set()
-    for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_1', source_table_type='hist')
-        if details and team_a.lower() in details['home'].lower():
+    for details in partidos_v1:
+        if team_a.lower() in details['home'].lower():
             rivals_a.add(details['away'].lower())
     
     # Extraer rivales de team_b (como visitante)
     rivals_b = set()
-    for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_2', source_table_type='hist')
-        if details and team_b.lower() in details['away'].lower():
+    for details in partidos_v2:
+        if team_b.lower() in details['away'].lower():
             rivals_b.add(details['home'].lower())
     
     # Encontrar rivales comunes
@@ -43,9 +54,8 @@ def analizar_rivales_comunes(soup, team_a, team_b):
     common_matches = []
     
     # Partidos de team_a contra rivales comunes
-    for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_1', source_table_type='hist')
-        if details and details['away'].lower() in common_rivals:
+    for details in partidos_v1:
+        if details['away'].lower() in common_rivals:
             common_matches.append({
                 'team': team_a,
                 'opponent': details['away'],
@@ -59,9 +69,8 @@ def analizar_rivales_comunes(soup, team_a, team_b):
             })
     
     # Partidos de team_b contra rivales comunes
-    for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_2', source_table_type='hist')
-        if details and details['home'].lower() in common_rivals:
+    for details in partidos_v2:
+        if details['home'].lower() in common_rivals:
             common_matches.append({
                 'team': team_b,
                 'opponent': details['home'],
@@ -100,17 +109,16 @@ def analizar_contra_rival_del_rival(soup, team_a, team_b, rival_a_rival, rival_b
         dict: Diccionario con el análisis contra el rival del rival
     """
     # Buscar tablas de partidos
-    table_v1 = soup.find("table", id="table_v1")  # Partidos de team_a como local
-    table_v2 = soup.find("table", id="table_v2")  # Partidos de team_b como visitante
-    
-    if not table_v1 or not table_v2:
+    page = H2HPage.of(soup)
+    if not page.has_table(HOME_TABLE) or not page.has_table(AWAY_TABLE):
         return {"error": "No se encontraron las tablas de partidos"}
+    partidos_v1 = _detalles_partidos(page, HOME_TABLE)  # Partidos de team_a
+    partidos_v2 = _detalles_partidos(page, AWAY_TABLE)  # Partidos de team_b
     
     # Buscar partidos de team_a contra rival_b_rival
     matches_a_vs_rival_b_rival = []
-    for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_1', source_table_type='hist')
-        if details and (
+    for details in partidos_v1:
+        if (
             (team_a.lower() in details['home'].lower() and rival_b_rival.lower() in details['away'].lower()) or
             (team_a.lower() in details['away'].lower() and rival_b_rival.lower() in details['home'].lower())
         ):
@@ -127,9 +135,8 @@ def analizar_contra_rival_del_rival(soup, team_a, team_b, rival_a_rival, rival_b
     
     # Buscar partidos de team_b contra rival_a_rival
     matches_b_vs_rival_a_rival = []
-    for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_2', source_table_type='hist')
-        if details and (
+    for details in partidos_v2:
+        if (
             (team_b.lower() in details['home'].lower() and rival_a_rival.lower() in details['away'].lower()) or
             (team_b.lower() in details['away'].lower() and rival_a_rival.lower() in details['home'].lower())
         ):
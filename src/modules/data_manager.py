@@ -1,15 +1,80 @@
+import atexit
 import json
-import os
+import sqlite3
 import threading
+import time
+import zlib
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 
 # Config
 DATA_DIR = Path(__file__).resolve().parent.parent.parent / 'data'
 DATA_DIR.mkdir(exist_ok=True)
 
-# Locks for each bucket file to ensure thread safety
-_locks = {}
-_global_lock = threading.Lock()
+# Matches live in an embedded SQLite store (WAL mode, safe across the
+# cli_scraper processes spawned by background_runner.py). The legacy
+# data_*.json buckets (+ their append logs) are imported once on first use.
+DB_FILE = DATA_DIR / 'matches.db'
+DB_BUSY_TIMEOUT_SECONDS = 30
+LOG_SUFFIX = '.log'
+PENDING_BUCKET = "data_pending_results.json"
+PRECACHEO_BUCKET = "data_precacheo.json"
+PENDING_SCORES = ('??', '?-?', '?:?', '? - ?', '? : ?')
+
+# Slim storage: payloads are stored without the HTML that estudio_scraper can
+# rebuild (hydrate_match_html) and with stats_rows packed as numbers.
+SLIM_STORAGE = True
+_STATS_SECTIONS = ('last_home_match', 'last_away_match', 'h2h_col3', 'h2h_stadium', 'h2h_general')
+_STATS_SUBSECTIONS = (('comparativas_indirectas', 'left'), ('comparativas_indirectas', 'right'))
+_RECORD_LISTS = ('recent_home_matches', 'recent_away_matches')
+_STATS_KEYS = ('stats_rows', 'stats_values')
+_TITLE_KEYS = ('title_home_name', 'title_away_name')
+
+# Payload compression: 'zlib' (standard library), 'zstd' (optional `zstandard`
+# package) or 'none'. Compressed blobs start with a one-byte codec tag; plain
+# JSON blobs (written before compression existed) start with '{' and still load.
+PAYLOAD_CODEC = 'zlib'
+ZLIB_LEVEL = 6
+_CODEC_TAGS = {'zlib': b'\x01', 'zstd': b'\x02'}
+
+# Write-behind queue (enqueue_match / enqueue_precacheo_match): a batch is written
+# once it holds this many matches or its oldest match waited this long.
+WRITE_BATCH_SIZE = 100
+WRITE_FLUSH_INTERVAL_SECONDS = 2.0
+# A batch failing this many times in a row is written row by row and the rows
+# that still fail are dropped (dead-lettered: logged and kept in the queue stats).
+WRITE_MAX_ATTEMPTS = 5
+DEAD_LETTER_KEEP = 100
+# Synchronous writers/readers wait at most this long for the queue before going on.
+SYNC_FLUSH_TIMEOUT_SECONDS = 30.0
+
+_MATCH_COLUMNS = (
+    "match_id TEXT PRIMARY KEY,"
+    " bucket TEXT NOT NULL,"
+    " ah_line REAL,"
+    " goal_line REAL,"
+    " home_team TEXT,"
+    " away_team TEXT,"
+    " league TEXT,"
+    " match_date TEXT,"
+    " final_score TEXT,"
+    " state TEXT NOT NULL,"
+    " cached_at TEXT,"
+    " payload BLOB NOT NULL"
+)
+_INDEXED_COLUMNS = ('bucket', 'ah_line', 'goal_line', 'home_team', 'away_team', 'league', 'match_date', 'final_score', 'state')
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_for = None
+
+# Read-through snapshots: "table:bucket" -> (version, tuple of matches). Every write
+# bumps the bucket's row in bucket_versions inside the same transaction, so a
+# snapshot is reused until this or any other process changes that bucket.
+_snapshots = {}
+_snapshot_locks = {}
+_snapshot_lock = threading.Lock()
 
 def get_bucket_name(ah_val):
     """
@@ -25,310 +90,948 @@ def get_bucket_name(ah_val):
     """
     if ah_val is None or ah_val == 'N/A':
         return "data_unknown.json"
-    
+
     try:
         val = float(ah_val)
     except ValueError:
         return "data_unknown.json"
 
-    # Filter out erroneous 3 / -3 as requested (though this function just returns bucket, 
+    # Filter out erroneous 3 / -3 as requested (though this function just returns bucket,
     # filtering should happen before saving)
-    
+
     if val == 0:
         return "data_ah_0.json"
-    
+
     abs_val = abs(val)
     sign = "minus_" if val < 0 else ""
-    
+
     if 0.25 <= abs_val <= 0.75:
         return f"data_{sign}ah_0.5.json"
-    
+
     if 1.0 <= abs_val <= 1.75:
         return f"data_{sign}ah_1.5.json"
-        
+
     if abs_val >= 2.0:
         return f"data_{sign}ah_2_plus.json"
-        
+
     return "data_others.json" # Should not happen with standard AH
 
-def get_file_lock(filename):
-    with _global_lock:
-        if filename not in _locks:
-            _locks[filename] = threading.Lock()
-        return _locks[filename]
+# --- SQLite plumbing ---
+def _connect():
+    conn = sqlite3.connect(str(DB_FILE), timeout=DB_BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_SECONDS * 1000}")
+    return conn
 
-def save_match(match_data):
-    """
-    Saves a single match to its appropriate JSON bucket.
-    Thread-safe.
-    """
-    # 1. Clean/Validate
+def _get_conn():
+    """One connection per thread; the schema (and legacy import) is set up once per process."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'db_file', None) != DB_FILE:
+        conn = _connect()
+        _local.conn = conn
+        _local.db_file = DB_FILE
+    _ensure_schema(conn)
+    return conn
+
+@contextmanager
+def _write_tx(conn):
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers queue
+    # on busy_timeout instead of failing on a lock upgrade.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def _ensure_schema(conn):
+    global _schema_ready_for
+    if _schema_ready_for == DB_FILE:
+        return
+    with _schema_lock:
+        if _schema_ready_for == DB_FILE:
+            return
+        with _write_tx(conn):
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS bucket_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            for table in ('matches', 'precacheo'):
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({_MATCH_COLUMNS})")
+                for column in _INDEXED_COLUMNS:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column})")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS match_stats ("
+                " match_id TEXT PRIMARY KEY,"
+                " stats TEXT NOT NULL,"
+                " final INTEGER NOT NULL,"
+                " fetched_at REAL NOT NULL)"
+            )
+            imported = conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone()
+        if not imported:
+            import_json_buckets(conn)
+        _schema_ready_for = DB_FILE
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _match_ah(match_data):
     ah = match_data.get('handicap')
     if ah is None:
-        ah = match_data.get('main_match_odds', {}).get('ah_linea')
-        
+        ah = (match_data.get('main_match_odds') or {}).get('ah_linea')
+    return ah
+
+def _match_score(match_data):
     score = match_data.get('score')
     if score is None:
         score = match_data.get('final_score')
-    
+    return score
+
+def _is_pending_score(score):
+    return not score or score in PENDING_SCORES
+
+def _stat_number(value):
+    return int(value) if isinstance(value, str) and value.isdigit() else value
+
+def _pack_stats(section):
+    if not isinstance(section, dict) or not section.get('stats_rows'):
+        return section
+    section = dict(section)
+    rows = section.pop('stats_rows')
+    section['stats_values'] = {row.get('label'): [_stat_number(row.get('home')), _stat_number(row.get('away'))] for row in rows}
+    return section
+
+def _unpack_stats(section):
+    if isinstance(section, dict) and 'stats_values' in section:
+        values = section.pop('stats_values')
+        section['stats_rows'] = [{'label': label, 'home': str(home), 'away': str(away)} for label, (home, away) in values.items()]
+
+def _pack_records(records):
+    # List of same-shaped dicts -> column names + value rows (score_raw is rebuilt from score).
+    if not records or not all(isinstance(r, dict) for r in records):
+        return records
+    columns = list(dict.fromkeys(k for r in records for k in r))
+    if 'score' in columns and all(r.get('score_raw') == str(r.get('score')).replace(':', '-') for r in records):
+        columns.remove('score_raw')
+    return {'columns': columns, 'rows': [[r.get(c) for c in columns] for r in records]}
+
+def _unpack_records(packed):
+    if not isinstance(packed, dict):
+        return packed
+    records = [dict(zip(packed['columns'], row)) for row in packed['rows']]
+    if 'score' in packed['columns'] and 'score_raw' not in packed['columns']:
+        for r in records:
+            r['score_raw'] = str(r['score']).replace(':', '-')
+    return records
+
+def _without_stats(section):
+    return {k: v for k, v in section.items() if k not in _STATS_KEYS}
+
+def _iter_stats_sections(match_data):
+    for key in _STATS_SECTIONS:
+        yield match_data, key
+    for parent, key in _STATS_SUBSECTIONS:
+        if isinstance(match_data.get(parent), dict):
+            yield match_data[parent], key
+
+def slim_match(match_data):
+    """
+    Storage form of a match: drops market_analysis_html / historical_matches_html
+    when the structured data to rebuild them is present (market_analysis_data,
+    recent_home_matches / recent_away_matches) and packs stats_rows as numbers.
+    Returns a new dict; the input is not modified.
+    """
+    slim = dict(match_data)
+    if slim.get('market_analysis_data'):
+        slim.pop('market_analysis_html', None)
+    if 'recent_home_matches' in slim or 'recent_away_matches' in slim:
+        slim.pop('historical_matches_html', None)
+    if isinstance(slim.get('comparativas_indirectas'), dict):
+        slim['comparativas_indirectas'] = dict(slim['comparativas_indirectas'])
+        for side in ('left', 'right'):
+            section = slim['comparativas_indirectas'].get(side)
+            if (isinstance(section, dict) and section.get('title_home_name') == slim.get('home_name')
+                    and section.get('title_away_name') == slim.get('away_name')):
+                # Titles repeat the match's own team names.
+                slim['comparativas_indirectas'][side] = {k: v for k, v in section.items() if k not in _TITLE_KEYS}
+    for container, key in _iter_stats_sections(slim):
+        if key in container:
+            container[key] = _pack_stats(container[key])
+    for key in _RECORD_LISTS:
+        if key in slim:
+            slim[key] = _pack_records(slim[key])
+    # h2h_stadium and h2h_general carry the same H2H data; only their stats differ.
+    stadium, general = slim.get('h2h_stadium'), slim.get('h2h_general')
+    if isinstance(stadium, dict) and isinstance(general, dict) and _without_stats(stadium) == _without_stats(general):
+        slim['h2h_general'] = {'same_as_h2h_stadium': True, **{k: v for k, v in general.items() if k in _STATS_KEYS}}
+    return slim
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("PAYLOAD_CODEC='zstd' requires the zstandard package (pip install zstandard)")
+    return zstandard
+
+def _compress(raw):
+    if PAYLOAD_CODEC == 'zlib':
+        return _CODEC_TAGS['zlib'] + zlib.compress(raw, ZLIB_LEVEL)
+    if PAYLOAD_CODEC == 'zstd':
+        return _CODEC_TAGS['zstd'] + _zstd().ZstdCompressor().compress(raw)
+    return raw
+
+def _decompress(blob):
+    tag = bytes(blob[:1])
+    if tag == _CODEC_TAGS['zlib']:
+        return zlib.decompress(blob[1:])
+    if tag == _CODEC_TAGS['zstd']:
+        return _zstd().ZstdDecompressor().decompress(blob[1:])
+    return blob
+
+def _encode_payload(match_data):
+    if SLIM_STORAGE:
+        match_data = slim_match(match_data)
+    return _compress(json.dumps(match_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+def _decode_payload(blob):
+    match_data = json.loads(_decompress(blob))
+    general = match_data.get('h2h_general')
+    if isinstance(general, dict) and general.pop('same_as_h2h_stadium', False):
+        match_data['h2h_general'] = {**_without_stats(match_data.get('h2h_stadium') or {}), **general}
+    for key in _RECORD_LISTS:
+        if key in match_data:
+            match_data[key] = _unpack_records(match_data[key])
+    for section in (match_data.get('comparativas_indirectas') or {}).values():
+        if isinstance(section, dict) and 'title_home_name' not in section:
+            section['title_home_name'] = match_data.get('home_name')
+            section['title_away_name'] = match_data.get('away_name')
+    for container, key in _iter_stats_sections(match_data):
+        _unpack_stats(container.get(key))
+    return match_data
+
+def _row_values(match_data, bucket):
+    """Values for every column of a matches/precacheo row."""
+    odds = match_data.get('main_match_odds') or {}
+    score = _match_score(match_data)
+    goal_line = odds.get('goals_linea') or match_data.get('goal_line')
+    return (
+        str(match_data.get('match_id')),
+        Path(bucket).stem,
+        _to_float(_match_ah(match_data)),
+        _to_float(goal_line),
+        match_data.get('home_name') or match_data.get('home_team'),
+        match_data.get('away_name') or match_data.get('away_team'),
+        match_data.get('league_name') or match_data.get('competition'),
+        match_data.get('match_date') or match_data.get('match_datetime') or match_data.get('start_time'),
+        score,
+        'pending' if _is_pending_score(score) else 'final',
+        match_data.get('cached_at') or match_data.get('precacheo_date'),
+        _encode_payload(match_data),
+    )
+
+def _chunks(items, size=500):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _buckets_of(conn, table, match_ids):
+    buckets = set()
+    for chunk in _chunks(list(match_ids)):
+        placeholders = ','.join('?' * len(chunk))
+        buckets.update(row[0] for row in conn.execute(f"SELECT DISTINCT bucket FROM {table} WHERE match_id IN ({placeholders})", chunk))
+    return buckets
+
+def _bump_versions(conn, table, buckets):
+    conn.executemany(
+        "INSERT INTO bucket_versions (name, version) VALUES (?, 1)"
+        " ON CONFLICT(name) DO UPDATE SET version = version + 1",
+        [(f"{table}:{bucket}",) for bucket in buckets],
+    )
+
+def _read_version(conn, name):
+    row = conn.execute("SELECT version FROM bucket_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+def _delete_rows(conn, table, match_ids, bucket=None):
+    match_ids = [str(mid) for mid in match_ids]
+    touched = _buckets_of(conn, table, match_ids)
+    if bucket is not None:
+        touched &= {bucket}
+        conn.executemany(f"DELETE FROM {table} WHERE match_id = ? AND bucket = ?", [(mid, bucket) for mid in match_ids])
+    else:
+        conn.executemany(f"DELETE FROM {table} WHERE match_id = ?", [(mid,) for mid in match_ids])
+    _bump_versions(conn, table, touched)
+
+def _upsert_rows(conn, table, rows):
+    # A match moving to another bucket changes both buckets.
+    touched = _buckets_of(conn, table, [row[0] for row in rows])
+    touched.update(row[1] for row in rows)
+    # ON CONFLICT ... DO UPDATE keeps the original rowid, so re-saved matches keep
+    # their position in load order (like the old replace-in-place on the JSON list).
+    conn.executemany(
+        f"INSERT INTO {table} (match_id, bucket, ah_line, goal_line, home_team, away_team, league,"
+        " match_date, final_score, state, cached_at, payload) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)"
+        " ON CONFLICT(match_id) DO UPDATE SET bucket=excluded.bucket, ah_line=excluded.ah_line,"
+        " goal_line=excluded.goal_line, home_team=excluded.home_team, away_team=excluded.away_team,"
+        " league=excluded.league, match_date=excluded.match_date, final_score=excluded.final_score,"
+        " state=excluded.state, cached_at=excluded.cached_at, payload=excluded.payload",
+        rows,
+    )
+    _bump_versions(conn, table, touched)
+
+def _load_payloads(sql, params=()):
+    conn = _get_conn()
+    return [_decode_payload(row[0]) for row in conn.execute(sql, params)]
+
+def _bucket_snapshot(table, bucket):
+    """
+    Returns the (cached) matches of one bucket as an immutable tuple, parsed at most
+    once per bucket version. The match dicts are shared between callers: read-only.
+    """
+    key = f"{table}:{bucket}"
+    conn = _get_conn()
+    cached = _snapshots.get(key)
+    if cached is not None and cached[0] == _read_version(conn, key):
+        return cached[1]
+
+    with _snapshot_lock:
+        key_lock = _snapshot_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        # Version and rows are read in one transaction so they describe the same state.
+        conn.execute("BEGIN")
+        try:
+            version = _read_version(conn, key)
+            cached = _snapshots.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            matches = tuple(
+                _decode_payload(row[0])
+                for row in conn.execute(f"SELECT payload FROM {table} WHERE bucket = ? ORDER BY rowid", (bucket,))
+            )
+        finally:
+            conn.execute("COMMIT")
+        _snapshots[key] = (version, matches)
+        return matches
+
+def _table_snapshot(table):
+    conn = _get_conn()
+    buckets = [row[0] for row in conn.execute(f"SELECT DISTINCT bucket FROM {table} ORDER BY bucket")]
+    matches = []
+    for bucket in buckets:
+        matches.extend(_bucket_snapshot(table, bucket))
+    return tuple(matches)
+
+# --- Legacy JSON buckets (one-shot import) ---
+def _read_legacy_bucket(file_path):
+    """Reads a legacy data_*.json bucket, replaying its append-only .log if present."""
+    merged = {}
+    if file_path.exists():
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for m in data if isinstance(data, list) else []:
+                merged[str(m.get('match_id'))] = m
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Skipping unreadable bucket {file_path.name}: {e}")
+    log_path = file_path.with_suffix(LOG_SUFFIX)
+    if log_path.exists():
+        with open(log_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                mid = str(record.get('match_id'))
+                if record.get('_deleted'):
+                    merged.pop(mid, None)
+                else:
+                    merged[mid] = record
+    return list(merged.values())
+
+def import_json_buckets(conn=None, data_dir=None):
+    """
+    Imports every legacy data_*.json bucket (and data_precacheo.json) into SQLite.
+    Runs automatically the first time the store is opened; safe to re-run
+    (rows are upserted). Returns {bucket_filename: imported_count}.
+    """
+    conn = conn or _get_conn()
+    data_dir = Path(data_dir) if data_dir else DATA_DIR
+    names = {p.name for p in data_dir.glob("data_*.json")}
+    names.update(p.with_suffix('.json').name for p in data_dir.glob(f"data_*{LOG_SUFFIX}"))
+    summary = {}
+    with _write_tx(conn):
+        for name in sorted(names):
+            matches = [m for m in _read_legacy_bucket(data_dir / name) if m.get('match_id') is not None]
+            table = 'precacheo' if name == PRECACHEO_BUCKET else 'matches'
+            _upsert_rows(conn, table, [_row_values(m, name) for m in matches])
+            summary[name] = len(matches)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)", (json.dumps(summary),))
+    if summary:
+        print(f"Imported legacy JSON buckets into {DB_FILE.name}: {summary}")
+    return summary
+
+# --- Public API ---
+def _match_row(match_data):
+    """Applies the bucket filters of save_match. Returns the row to store, or None if skipped."""
+    # 1. Clean/Validate
+    ah = _match_ah(match_data)
+    score = _match_score(match_data)
+
     # Filter: AH 3 or -3
     if ah in [3, 3.0, '3', '3.0', -3, -3.0, '-3', '-3.0']:
         print(f"Skipping match {match_data.get('match_id')} with AH {ah}")
-        return False
-        
+        return None
+
     # Filter: Score "??" -> Save to pending results
     if score == "??" or score == "?-?":
         print(f"Saving match {match_data.get('match_id')} to pending results (score {score})")
-        bucket_name = "data_pending_results.json"
-        # Skip the rest of the logic and save directly to this bucket
-        file_path = DATA_DIR / bucket_name
-        lock = get_file_lock(bucket_name)
-        with lock:
-            data = []
-            if file_path.exists():
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                except json.JSONDecodeError:
-                    data = []
-            
-            match_id = match_data.get('match_id')
-            existing_idx = next((i for i, m in enumerate(data) if m.get('match_id') == match_id), -1)
-            
-            if existing_idx >= 0:
-                data[existing_idx] = match_data
-            else:
-                data.append(match_data)
-                
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-        return True
+        bucket_name = PENDING_BUCKET
+    else:
+        bucket_name = get_bucket_name(ah)
 
-    bucket_name = get_bucket_name(ah)
-    file_path = DATA_DIR / bucket_name
-    
-    lock = get_file_lock(bucket_name)
-    
-    with lock:
-        # Load existing
-        data = []
-        if file_path.exists():
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            except json.JSONDecodeError:
-                data = []
-        
-        # Update or Append
-        match_id = match_data.get('match_id')
-        existing_idx = next((i for i, m in enumerate(data) if m.get('match_id') == match_id), -1)
-        
-        if existing_idx >= 0:
-            data[existing_idx] = match_data
-        else:
-            data.append(match_data)
-            
-        # Save
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-            
+    return _row_values(match_data, bucket_name)
+
+def save_match(match_data):
+    """
+    Saves a single match to its appropriate bucket (a single-row upsert).
+    Thread-safe and process-safe.
+    """
+    row = _match_row(match_data)
+    if row is None:
+        return False
+
+    _flush_before_sync('matches', [row[0]])
+    conn = _get_conn()
+    with _write_tx(conn):
+        _upsert_rows(conn, 'matches', [row])
     return True
 
+def iter_matches(ah_filter=None, precacheo=False):
+    """
+    Streams stored matches one at a time (decoded lazily from the cursor) instead
+    of building the whole list: for one-off scans and exports. Same filter as
+    load_matches_by_bucket; precacheo=True streams the pre-cacheo table instead.
+    """
+    table = 'precacheo' if precacheo else 'matches'
+    sql, params = f"SELECT payload FROM {table}", ()
+    if not precacheo and ah_filter and ah_filter != 'all':
+        sql, params = sql + " WHERE bucket = ?", (Path(get_bucket_name(ah_filter)).stem,)
+    _flush_before_sync()
+    _get_conn()  # schema / legacy import
+    conn = _connect()
+    try:
+        for (blob,) in conn.execute(sql + " ORDER BY rowid", params):
+            yield _decode_payload(blob)
+    finally:
+        conn.close()
+
+def get_match(match_id):
+    """Gets a single saved match (any bucket) by ID."""
+    queued = _write_behind.get_queued('matches', match_id)
+    if queued is not None:
+        return queued
+    rows = _load_payloads("SELECT payload FROM matches WHERE match_id = ?", (str(match_id),))
+    return rows[0] if rows else None
+
 def load_all_matches():
-    """Loads matches from ALL buckets."""
-    all_matches = []
-    for file in DATA_DIR.glob("data_*.json"):
-        try:
-            with open(file, 'r', encoding='utf-8') as f:
-                all_matches.extend(json.load(f))
-        except:
-            pass
-    return all_matches
+    """
+    Loads matches from ALL buckets (pre-cacheo included, as with the old data_*.json glob).
+    Returns a cached, read-only tuple. Rows still in the write-behind queue are flushed first.
+    """
+    _flush_before_sync()
+    return _table_snapshot('matches') + _table_snapshot('precacheo')
 
 def load_matches_by_bucket(ah_filter):
     """
     Loads matches from the specific bucket(s) relevant to the filter.
     If ah_filter is 'all', loads everything.
+    Returns a cached, read-only tuple (re-read only after the bucket changes).
     """
     if not ah_filter or ah_filter == 'all':
         return load_all_matches()
-        
-    # Determine which file this AH belongs to
-    bucket = get_bucket_name(ah_filter)
-    file_path = DATA_DIR / bucket
-    
-    if file_path.exists():
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
 
-# --- Pre-Cacheo Functions ---
-PRECACHEO_FILE = DATA_DIR / "data_precacheo.json"
-_precacheo_lock = threading.Lock()
+    # Determine which bucket this AH belongs to
+    _flush_before_sync()
+    return _bucket_snapshot('matches', Path(get_bucket_name(ah_filter)).stem)
+
+# --- Pending Results Functions ---
+def load_pending_matches():
+    """Loads matches saved without a final result (score ??)."""
+    _flush_before_sync()
+    return _bucket_snapshot('matches', Path(PENDING_BUCKET).stem)
 
+def remove_from_pending(match_id):
+    """Removes a match from the pending results bucket."""
+    _flush_before_sync('matches', [match_id])
+    conn = _get_conn()
+    with _write_tx(conn):
+        _delete_rows(conn, 'matches', [match_id], bucket=Path(PENDING_BUCKET).stem)
+    return True
+
+# --- Pre-Cacheo Functions ---
 def save_precacheo_match(match_data):
-    """Saves a match to the pre-cacheo JSON (upcoming matches without final result)."""
-    with _precacheo_lock:
-        data = []
-        if PRECACHEO_FILE.exists():
-            try:
-                with open(PRECACHEO_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            except json.JSONDecodeError:
-                data = []
-        
-        match_id = match_data.get('match_id')
-        existing_idx = next((i for i, m in enumerate(data) if m.get('match_id') == match_id), -1)
-        
-        if existing_idx >= 0:
-            data[existing_idx] = match_data
-        else:
-            data.append(match_data)
-            
-        with open(PRECACHEO_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    """Saves a match to the pre-cacheo store (upcoming matches without final result)."""
+    row = _row_values(match_data, PRECACHEO_BUCKET)
+    _flush_before_sync('precacheo', [row[0]])
+    conn = _get_conn()
+    with _write_tx(conn):
+        _upsert_rows(conn, 'precacheo', [row])
     return True
 
 def load_precacheo_matches():
     """Loads all pre-cached matches."""
-    if PRECACHEO_FILE.exists():
-        try:
-            with open(PRECACHEO_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    _flush_before_sync()
+    return _bucket_snapshot('precacheo', Path(PRECACHEO_BUCKET).stem)
 
 def remove_from_precacheo(match_id):
     """Removes a match from precacheo after it's finalized."""
-    with _precacheo_lock:
-        data = load_precacheo_matches()
-        initial_len = len(data)
-        data = [m for m in data if str(m.get('match_id')) != str(match_id)]
-        
-        if len(data) < initial_len:
-            with open(PRECACHEO_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+    _flush_before_sync('precacheo', [match_id])
+    conn = _get_conn()
+    with _write_tx(conn):
+        _delete_rows(conn, 'precacheo', [match_id])
     return True
 
 def get_precacheo_match(match_id):
     """Gets a single match from precacheo by ID."""
-    matches = load_precacheo_matches()
-    for m in matches:
-        if str(m.get('match_id')) == str(match_id):
-            return m
-    return None
+    queued = _write_behind.get_queued('precacheo', match_id)
+    if queued is not None:
+        return queued
+    rows = _load_payloads("SELECT payload FROM precacheo WHERE match_id = ?", (str(match_id),))
+    return rows[0] if rows else None
+
+def get_precacheo_matches(match_ids):
+    """Bulk keyed read: {match_id: match} for the requested IDs found in precacheo."""
+    ids = list(dict.fromkeys(str(mid) for mid in match_ids))
+    found = {}
+    conn = _get_conn()
+    for chunk in _chunks(ids):
+        placeholders = ','.join('?' * len(chunk))
+        for mid, blob in conn.execute(f"SELECT match_id, payload FROM precacheo WHERE match_id IN ({placeholders})", chunk):
+            found[mid] = _decode_payload(blob)
+    for mid in ids:
+        queued = _write_behind.get_queued('precacheo', mid)
+        if queued is not None:
+            found[mid] = queued
+    return found
+
+def existing_precacheo_ids(match_ids):
+    """Set of the given IDs that are in precacheo (primary-key lookup, payloads are not read)."""
+    ids = list(dict.fromkeys(str(mid) for mid in match_ids))
+    found = set(mid for mid in ids if _write_behind.is_queued('precacheo', mid))
+    conn = _get_conn()
+    for chunk in _chunks(ids):
+        placeholders = ','.join('?' * len(chunk))
+        found.update(row[0] for row in conn.execute(f"SELECT match_id FROM precacheo WHERE match_id IN ({placeholders})", chunk))
+    return found
+
+def precacheo_match_exists(match_id):
+    """Cheap existence check for a single precacheo match."""
+    return bool(existing_precacheo_ids([match_id]))
 
 def finalize_precacheo_batch(match_ids):
     """
-    Finalizes a batch of matches:
-    1. Reads precacheo ONCE.
+    Finalizes a batch of matches in ONE transaction:
+    1. Reads the requested precacheo rows.
     2. Identifies matches with results.
-    3. Groups them by target bucket.
-    4. Writes to buckets efficiently (locking each bucket once).
-    5. Removes from precacheo ONCE.
+    3. Upserts them into their target bucket.
+    4. Removes them from precacheo.
     Returns: (count_success, count_failed, errors_list)
     """
-    success_count = 0
     errors = []
-    
-    with _precacheo_lock:
-        # 1. Load Precacheo
-        if not PRECACHEO_FILE.exists():
-            return 0, len(match_ids), ["Precacheo file not found"]
-            
-        try:
-            with open(PRECACHEO_FILE, 'r', encoding='utf-8') as f:
-                precacheo_data = json.load(f)
-        except json.JSONDecodeError:
-            return 0, len(match_ids), ["Precacheo file corrupt"]
-
-        # Map for fast lookup
-        precacheo_map = {str(m.get('match_id')): m for m in precacheo_data}
-        
-        matches_to_move = []
-        ids_to_remove = set()
-        
+    ids = [str(mid) for mid in match_ids]
+    if not ids:
+        return 0, 0, errors
+
+    _flush_before_sync('precacheo', ids)
+    conn = _get_conn()
+    with _write_tx(conn):
+        # 1. Load the requested Precacheo rows
+        precacheo_map = {}
+        for chunk in _chunks(ids):
+            placeholders = ','.join('?' * len(chunk))
+            for mid, blob in conn.execute(f"SELECT match_id, payload FROM precacheo WHERE match_id IN ({placeholders})", chunk):
+                precacheo_map[mid] = _decode_payload(blob)
+
+        rows = []
+        ids_to_remove = []
+
         # 2. Identify candidates
-        for mid in match_ids:
-            mid_str = str(mid)
-            match = precacheo_map.get(mid_str)
+        for mid in ids:
+            match = precacheo_map.get(mid)
             if not match:
                 errors.append(f"Match {mid} not found in precacheo")
                 continue
-                
+
             # Check validity (has score)
             score = match.get('score') or match.get('final_score')
             if not score or score in ['??', '?-?', '? - ?']:
                 errors.append(f"Match {mid} has no result ({score})")
                 continue
-                
-            matches_to_move.append(match)
-            ids_to_remove.add(mid_str)
-
-        # 3. Group by bucket
-        bucket_actions = {} # filename -> [matches]
-        
-        for m in matches_to_move:
-            ah = m.get('handicap')
-            if ah is None:
-                ah = m.get('main_match_odds', {}).get('ah_linea')
-            
-            score = m.get('score') or m.get('final_score')
-            if score == "??" or score == "?-?":
-                 b_name = "data_pending_results.json"
-            else:
-                 b_name = get_bucket_name(ah)
-                 
-            if b_name not in bucket_actions:
-                bucket_actions[b_name] = []
-            bucket_actions[b_name].append(m)
-
-        # 4. Write to buckets
-        for filename, matches in bucket_actions.items():
-            file_path = DATA_DIR / filename
-            lock = get_file_lock(filename)
-            
-            with lock:
-                # Load existing
-                existing_data = []
-                if file_path.exists():
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            existing_data = json.load(f)
-                    except:
-                        existing_data = []
-                
-                # Update/Append in memory
-                existing_map = {str(item.get('match_id')): i for i, item in enumerate(existing_data)}
-                
-                for new_m in matches:
-                    nid = str(new_m.get('match_id'))
-                    if nid in existing_map:
-                        existing_data[existing_map[nid]] = new_m
-                    else:
-                        existing_data.append(new_m)
-                        existing_map[nid] = len(existing_data) - 1
-                
-                # Write back
-                try:
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        json.dump(existing_data, f, indent=2, ensure_ascii=False)
-                    success_count += len(matches)
-                except Exception as e:
-                    errors.append(f"Failed to write to {filename}: {str(e)}")
-
-        # 5. Remove from Precacheo
-        if ids_to_remove:
-            new_precacheo_data = [m for m in precacheo_data if str(m.get('match_id')) not in ids_to_remove]
+
+            # 3. Target bucket
+            rows.append(_row_values(match, get_bucket_name(_match_ah(match))))
+            ids_to_remove.append(mid)
+
+        # 4. Move
+        if rows:
+            _upsert_rows(conn, 'matches', rows)
+            _delete_rows(conn, 'precacheo', ids_to_remove)
+
+    success_count = len(rows)
+    return success_count, len(match_ids) - success_count, errors
+
+def patch_final_scores(scores, precacheo=False):
+    """
+    Sets the final score of stored matches without re-scraping them.
+    scores: {match_id: 'h:a'}. Only final_score (and score, if the payload has
+    one) change; in the matches table the row leaves the pending bucket for the
+    bucket save_match would pick. Returns the list of patched IDs.
+    """
+    scores = {str(mid): score for mid, score in scores.items() if not _is_pending_score(score)}
+    if not scores:
+        return []
+    table = 'precacheo' if precacheo else 'matches'
+    # No discard on timeout: the queued rows are newer analyses, not superseded by a score patch.
+    _flush_before_sync()
+    conn = _get_conn()
+    with _write_tx(conn):
+        rows = []
+        dropped = []
+        for chunk in _chunks(list(scores)):
+            placeholders = ','.join('?' * len(chunk))
+            for mid, blob in conn.execute(f"SELECT match_id, payload FROM {table} WHERE match_id IN ({placeholders})", chunk):
+                match_data = _decode_payload(blob)
+                match_data['final_score'] = scores[mid]
+                if 'score' in match_data:
+                    match_data['score'] = scores[mid]
+                row = _row_values(match_data, PRECACHEO_BUCKET) if precacheo else _match_row(match_data)
+                if row is None:
+                    dropped.append(mid)
+                else:
+                    rows.append(row)
+        if rows:
+            _upsert_rows(conn, table, rows)
+        if dropped:
+            # Filtered out by save_match (AH 3 / -3): just leave the pending bucket.
+            _delete_rows(conn, table, dropped, bucket=Path(PENDING_BUCKET).stem)
+    return [row[0] for row in rows]
+
+
+# --- Per-match progression stats (shots, attacks...) ---
+def get_match_stats(match_id, live_max_age, with_final=False):
+    """
+    Stored progression stats {stat_name: [home, away]} for match_id, or None if
+    missing. Stats of a finished match never expire; stats saved while the match
+    was not final are only returned for live_max_age seconds. with_final=True
+    returns (stats, final) instead.
+    """
+    row = _get_conn().execute(
+        "SELECT stats, final, fetched_at FROM match_stats WHERE match_id = ?", (str(match_id),)
+    ).fetchone()
+    if row is None:
+        return None
+    stats, final, fetched_at = row
+    if not final and (time.time() - fetched_at) > live_max_age:
+        return None
+    if with_final:
+        return json.loads(stats), bool(final)
+    return json.loads(stats)
+
+def save_match_stats(match_id, stats, final):
+    """Stores progression stats for match_id; final=True makes them permanent."""
+    conn = _get_conn()
+    with _write_tx(conn):
+        conn.execute(
+            "INSERT INTO match_stats (match_id, stats, final, fetched_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(match_id) DO UPDATE SET stats = excluded.stats, final = excluded.final,"
+            " fetched_at = excluded.fetched_at",
+            (str(match_id), json.dumps(stats, ensure_ascii=False, separators=(',', ':')), 1 if final else 0, time.time()),
+        )
+
+
+# --- Slim storage migration ---
+def slim_stored_matches(prepare=None):
+    """
+    Rewrites every stored payload in slim form (see slim_match) and with the
+    current PAYLOAD_CODEC, one transaction per table, then VACUUMs the file. prepare(match) may fill in the structured
+    fields first (estudio_scraper.backfill_structured_fields) so the HTML of old
+    records can be dropped. Returns (count, bytes_before, bytes_after).
+    """
+    _flush_before_sync()
+    conn = _get_conn()
+    count = before = after = 0
+    for table in ('matches', 'precacheo'):
+        with _write_tx(conn):
+            updates = []
+            for mid, bucket, blob in conn.execute(f"SELECT match_id, bucket, payload FROM {table}").fetchall():
+                match_data = _decode_payload(blob)
+                if prepare is not None:
+                    match_data = prepare(match_data) or match_data
+                new_blob = _encode_payload(match_data)
+                before += len(blob)
+                after += len(new_blob)
+                updates.append((new_blob, mid))
+            conn.executemany(f"UPDATE {table} SET payload = ? WHERE match_id = ?", updates)
+            buckets = [row[0] for row in conn.execute(f"SELECT DISTINCT bucket FROM {table}")]
+            _bump_versions(conn, table, buckets)
+            count += len(updates)
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return count, before, after
+
+
+# --- Write-behind queue for background workers ---
+class _WriteBehindQueue:
+    """
+    Single writer thread fed by the scrape workers. Queued matches are coalesced
+    by (table, match_id), so a match re-scraped before the flush is written once
+    with its latest data, and each batch is one transaction.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = {}  # (table, match_id) -> row
+        self._callbacks = []  # [(key, on_saved)]
+        self._superseded = set()
+        self._dead_letters = deque(maxlen=DEAD_LETTER_KEEP)
+        self._oldest_at = None
+        self._enqueued_seq = 0
+        self._written_seq = 0
+        self._flush_requested = False
+        self._closing = False
+        self._thread = None
+        self._stats = {'flushes': 0, 'written': 0, 'coalesced': 0, 'errors': 0, 'dropped': 0,
+                       'max_depth': 0, 'last_flush_ms': 0.0, 'total_flush_ms': 0.0}
+
+    def put(self, table, row, on_saved=None):
+        with self._cond:
+            key = (table, row[0])
+            self._superseded.discard(key)
+            if key in self._pending:
+                self._stats['coalesced'] += 1
+            self._pending[key] = row
+            if on_saved is not None:
+                self._callbacks.append((key, on_saved))
+            if self._oldest_at is None:
+                self._oldest_at = time.monotonic()
+            self._enqueued_seq += 1
+            self._stats['max_depth'] = max(self._stats['max_depth'], len(self._pending))
+            self._ensure_thread()
+            self._cond.notify_all()
+
+    def get_queued(self, table, match_id):
+        key = (table, str(match_id))
+        with self._cond:
+            row = self._pending.get(key) if key not in self._superseded else None
+        return _decode_payload(row[-1]) if row else None
+
+    def is_queued(self, table, match_id):
+        key = (table, str(match_id))
+        with self._cond:
+            return key in self._pending and key not in self._superseded
+
+    def discard(self, table, match_ids):
+        """Drops the queued rows of match_ids (a synchronous write supersedes them)."""
+        with self._cond:
+            # Left out when the writer takes the next batch (so the flush sequence
+            # still advances), and not queued again if the batch holding it fails.
+            # Their on_saved callbacks still run: the synchronous write saved the match.
+            self._superseded.update((table, str(match_id)) for match_id in match_ids)
+
+    def flush(self, timeout=None):
+        """Asks the writer to write everything queued so far and waits for it. Returns False on timeout."""
+        with self._cond:
+            if self._thread is threading.current_thread():
+                return True
+            target = self._enqueued_seq
+            if self._written_seq >= target:
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._written_seq < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            by_bucket = {}
+            for row in self._pending.values():
+                by_bucket[row[1]] = by_bucket.get(row[1], 0) + 1
+            stats['depth'] = len(self._pending)
+            stats['depth_by_bucket'] = by_bucket
+            stats['dead_letters'] = list(self._dead_letters)
+        stats['avg_flush_ms'] = stats['total_flush_ms'] / stats['flushes'] if stats['flushes'] else 0.0
+        return stats
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, name='data_manager-writer', daemon=True)
+            self._thread.start()
+
+    def _take_batch(self):
+        """Waits for a size/time/flush trigger and takes the pending batch. None means stop."""
+        with self._cond:
+            while not self._pending:
+                if self._closing:
+                    return None
+                self._cond.wait()
+            while (len(self._pending) < WRITE_BATCH_SIZE and not self._flush_requested
+                   and not self._closing):
+                remaining = self._oldest_at + WRITE_FLUSH_INTERVAL_SECONDS - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, callbacks, seq = self._pending, self._callbacks, self._enqueued_seq
+            if self._superseded:
+                batch = {key: row for key, row in batch.items() if key not in self._superseded}
+            self._pending, self._callbacks, self._oldest_at = {}, [], None
+            self._flush_requested = False
+            self._superseded = set()
+            return batch, callbacks, seq
+
+    def _write_rows_one_by_one(self, batch):
+        """Last attempt for a failing batch: one transaction per row. Returns the keys written."""
+        written = set()
+        conn = _get_conn()
+        for key, row in batch.items():
             try:
-                with open(PRECACHEO_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(new_precacheo_data, f, indent=2, ensure_ascii=False)
+                with _write_tx(conn):
+                    _upsert_rows(conn, key[0], [row])
+                written.add(key)
             except Exception as e:
-                errors.append(f"Failed to update precacheo file: {str(e)}")
+                print(f"Dropping queued match {key[1]} ({key[0]}) after {WRITE_MAX_ATTEMPTS} failed writes: {e}")
+                with self._cond:
+                    self._stats['dropped'] += 1
+                    self._dead_letters.append({'table': key[0], 'match_id': key[1], 'error': str(e), 'at': time.time()})
+        return written
 
-    return success_count, len(match_ids) - success_count, errors
+    def _run(self):
+        attempts = 0
+        while True:
+            taken = self._take_batch()
+            if taken is None:
+                return
+            batch, callbacks, seq = taken
+            by_table = {}
+            for (table, _), row in batch.items():
+                by_table.setdefault(table, []).append(row)
+
+            started = time.perf_counter()
+            try:
+                conn = _get_conn()
+                with _write_tx(conn):
+                    for table, rows in by_table.items():
+                        _upsert_rows(conn, table, rows)
+            except Exception as e:
+                attempts += 1
+                print(f"Error writing {len(batch)} queued matches (attempt {attempts}/{WRITE_MAX_ATTEMPTS}): {e}")
+                with self._cond:
+                    self._stats['errors'] += 1
+                    if attempts < WRITE_MAX_ATTEMPTS and not self._closing:
+                        # Put the batch back (newer queued rows win) and retry on the next cycle.
+                        for key, row in batch.items():
+                            if key not in self._superseded:
+                                self._pending.setdefault(key, row)
+                        self._callbacks = callbacks + self._callbacks
+                        if self._oldest_at is None:
+                            self._oldest_at = time.monotonic()
+                        self._cond.wait(WRITE_FLUSH_INTERVAL_SECONDS)
+                        continue
+                # Out of attempts (or shutting down): isolate the bad rows and drop them
+                # so flush() waiters and the rest of the batch are not held forever.
+                attempts = 0
+                written = self._write_rows_one_by_one(batch)
+                with self._cond:
+                    self._written_seq = seq
+                    self._stats['written'] += len(written)
+                    self._cond.notify_all()
+                self._run_callbacks(callback for key, callback in callbacks if key in written)
+                continue
+            attempts = 0
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with self._cond:
+                self._written_seq = seq
+                self._stats['flushes'] += 1
+                self._stats['written'] += len(batch)
+                self._stats['last_flush_ms'] = elapsed_ms
+                self._stats['total_flush_ms'] += elapsed_ms
+                self._cond.notify_all()
+
+            self._run_callbacks(callback for _, callback in callbacks)
+
+    @staticmethod
+    def _run_callbacks(callbacks):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in write-behind callback: {e}")
+
+_write_behind = _WriteBehindQueue()
+
+def enqueue_match(match_data, on_saved=None):
+    """
+    Like save_match, but the write is done by the background writer thread in a
+    batched transaction; the caller never waits on the database.
+    on_saved (optional) is called from the writer once the match is committed.
+    Returns False if the match is skipped by the bucket filters.
+    """
+    row = _match_row(match_data)
+    if row is None:
+        return False
+    _write_behind.put('matches', row, on_saved)
+    return True
+
+def enqueue_precacheo_match(match_data, on_saved=None):
+    """Write-behind version of save_precacheo_match (see enqueue_match)."""
+    _write_behind.put('precacheo', _row_values(match_data, PRECACHEO_BUCKET), on_saved)
+    return True
+
+def flush_writes(timeout=None):
+    """
+    Writes everything queued so far and waits for it (no-op if the queue is
+    empty). Returns False if it did not finish within timeout seconds.
+    """
+    return _write_behind.flush(timeout)
+
+def _flush_before_sync(table=None, match_ids=()):
+    """
+    Bounded flush_writes before a synchronous write or read. On timeout the
+    queued rows of match_ids are discarded (the synchronous write supersedes
+    them) and the caller goes on without waiting for the rest of the queue.
+    """
+    if flush_writes(SYNC_FLUSH_TIMEOUT_SECONDS):
+        return True
+    print(f"Write-behind queue did not flush within {SYNC_FLUSH_TIMEOUT_SECONDS:g}s; continuing without it.")
+    if table and match_ids:
+        _write_behind.discard(table, match_ids)
+    return False
+
+def get_write_queue_stats():
+    """Queue depth (total and per bucket) and flush counters/latencies of the write-behind queue."""
+    return _write_behind.stats()
+
+def shutdown_writer(timeout=30):
+    """Flushes the write-behind queue and stops its thread (also run at interpreter exit)."""
+    flushed = flush_writes(timeout)
+    _write_behind.close(timeout)
+    return flushed
 
+atexit.register(shutdown_writer)
@@ -2,22 +2,37 @@
 
 import time
 import copy
+import os
+import asyncio
 import requests
 import re
 import json
 import math
 import threading
+import concurrent.futures
 from contextlib import contextmanager
+import aiohttp
 from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
+from modules.single_flight import SingleFlight
+from modules import http_cache
+from modules import data_manager
+from modules import rate_limiter
+from modules import js_literals
+from modules.mirror_pool import MirrorPool
+from modules.h2h_page import H2HPage, H2HRow, HOME_TABLE, AWAY_TABLE, H2H_TABLE, parse_h2h_html
 from urllib3.util.retry import Retry
-import pandas as pd
 # Selenium imports removed
 SELENIUM_AVAILABLE = False
 
 
 # --- CONFIGURACIÓN GLOBAL ---
 BASE_URL_OF = "https://live2.nowgoal26.com"
+# Dominios espejo que sirven las mismas rutas /match/...; las URLs de BASE_URL_OF se
+# piden con hedging entre ellos (NOWGOAL_LIVE_MIRRORS="https://a,https://b" para cambiarlos).
+LIVE_MIRRORS = [u.strip() for u in os.environ.get('NOWGOAL_LIVE_MIRRORS', '').split(',') if u.strip()] or [
+    BASE_URL_OF, "https://live20.nowgoal25.com",
+]
 SELENIUM_TIMEOUT_SECONDS_OF = 10
 PLACEHOLDER_NODATA = "*(No disponible)*"
 REQUEST_TIMEOUT_SECONDS = 10
@@ -29,8 +44,33 @@ REQUEST_HEADERS = {
     "Referer": BASE_URL_OF,
 }
 SOUP_CACHE_TTL_SECONDS = 45
+# force_refresh (refresco pedido por el usuario): la página H2H de un partido sin
+# terminar solo se acepta de http_cache si tiene menos de esto.
+FORCE_REFRESH_MAX_AGE_SECONDS = 30
 STATS_CACHE_TTL_SECONDS = 300
+# Estadísticas persistidas (data_manager.match_stats): permanentes cuando el partido
+# ya terminó, y válidas solo este tiempo si se guardaron con el partido en juego.
+MATCH_STATS_LIVE_TTL_SECONDS = 60
 ANALYSIS_CACHE_TTL_SECONDS = 120
+# Fan-out de sub-peticiones (H2H col3 + páginas de estadísticas) dentro de un análisis.
+ANALYSIS_FANOUT_WORKERS = 8
+ANALYSIS_DEADLINE_SECONDS = 20
+# Motor asyncio: una sesión aiohttp por event loop con límite de conexiones por host.
+# Son topes fijos; las peticiones en vuelo por host las acota el límite AIMD de
+# rate_limiter (enter/leave), que se aprende de la latencia y los 429/5xx.
+AIOHTTP_CONNECTION_LIMIT = 100
+AIOHTTP_LIMIT_PER_HOST = 20
+AIOHTTP_RETRIES = 3
+ANALYSIS_ASYNC_CONCURRENCY = 200
+# bf_en-idn.js se parsea entero una vez por refresco (mismo TTL que su clase en http_cache).
+BF_ODDS_TTL_SECONDS = 60
+# resolve_final_scores: pool propio (no compite con el fan-out de los análisis) y
+# copia de http_cache aceptada solo si es reciente (o inmutable: partido terminado).
+RESOLVE_HEADER_WORKERS = 4
+RESOLVE_HEADER_MAX_AGE_SECONDS = 60
+# Bytes leídos tras id="mScore" antes de cortar la descarga de la cabecera.
+RESOLVE_HEADER_WINDOW_BYTES = 800
+BF_STATE_FINISHED = '-1'
 
 _requests_session = None
 _requests_session_lock = threading.Lock()
@@ -41,6 +81,29 @@ _stats_cache_lock = threading.Lock()
 _analysis_cache = {}
 _analysis_cache_lock = threading.Lock()
 _STATS_NOT_FOUND = object()
+_STAT_TITLES_EN = ("Shots", "Shots on Goal", "Attacks", "Dangerous Attacks")
+_STAT_LABELS_ES = {"Shots": "Tiros", "Shots on Goal": "Tiros a Puerta", "Attacks": "Ataques", "Dangerous Attacks": "Ataques Peligrosos"}
+# Cabecera común de /match/h2h-{id} y /match/live-{id}: <div class="row state ">Finished</div>
+_FINISHED_STATE_RE = re.compile(r"""id=["']mScore["'].{0,400}?state\s*["']>\s*Finished""", re.S)
+_fanout_executor = None
+_fanout_executor_lock = threading.Lock()
+_resolve_executor = None
+_resolve_executor_lock = threading.Lock()
+_aiohttp_sessions = {}
+_aiohttp_sessions_lock = threading.Lock()
+# Single-flight: peticiones simultáneas del mismo análisis / URL comparten el trabajo,
+# vengan de hilos (do) o del motor asyncio (do_async): un registro para ambos.
+_analysis_flight = SingleFlight()
+_http_flight = SingleFlight()
+_live_mirrors = MirrorPool(LIVE_MIRRORS)
+# Tabla de cuotas de bf_en-idn.js (match_id -> fila), compartida por todos los análisis.
+_bf_odds_table = {'ts': 0.0, 'rows': None}
+_bf_odds_lock = threading.Lock()
+_bf_odds_flight = SingleFlight()
+_SCORE_HEADER_RE = re.compile(r"""id=["']mScore["']""")
+_LIVE_STATS_BLOCK_RE = re.compile(r"""id=["']teamTechDiv_detail["']""")
+_SCORE_HEADER_BYTES_RE = re.compile(rb"""id=["']mScore["']""")
+_HEADER_SCORE_VALUE_RE = re.compile(r"""class=["']score["']>\s*(\d+)\s*<""")
 
 
 def _read_cache(cache_dict, key, ttl_seconds, lock):
@@ -69,6 +132,41 @@ def _get_cached_analysis(match_id: str):
 def _set_cached_analysis(match_id: str, payload: dict):
     _write_cache(_analysis_cache, match_id, copy.deepcopy(payload), _analysis_cache_lock)
 
+
+def _get_fanout_executor():
+    """Pool compartido y acotado: N análisis simultáneos no abren N*8 conexiones."""
+    global _fanout_executor
+    with _fanout_executor_lock:
+        if _fanout_executor is None:
+            _fanout_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=ANALYSIS_FANOUT_WORKERS, thread_name_prefix="analysis-fetch"
+            )
+        return _fanout_executor
+
+
+def _get_resolve_executor():
+    """Pool pequeño para resolve_final_scores: cientos de IDs pendientes no dejan sin hilos a los análisis."""
+    global _resolve_executor
+    with _resolve_executor_lock:
+        if _resolve_executor is None:
+            _resolve_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=RESOLVE_HEADER_WORKERS, thread_name_prefix="resolve-header"
+            )
+        return _resolve_executor
+
+
+def _result_before(future, deadline, default):
+    """Resultado del future si termina antes de `deadline` (time.time()); si no, (default, False).
+    Un fetch que vence sigue en segundo plano y deja su resultado en _stats_cache."""
+    if future is None:
+        return default, True
+    try:
+        return future.result(timeout=max(0.0, deadline - time.time())), True
+    except concurrent.futures.TimeoutError:
+        return default, False
+    except Exception:
+        return default, True
+
 # --- FUNCIONES HELPER PARA PARSEO Y FORMATEO ---
 def parse_ah_to_number_of(ah_line_str: str):
     if not isinstance(ah_line_str, str): return None
@@ -127,18 +225,15 @@ def format_ah_as_decimal_string_of(ah_line_str: str, for_sheets=False, absolute=
         return "'" + output_str.replace('.', ',') if output_str not in ['-','?'] else output_str
     return output_str
 
-def _df_to_rows(df):
-    rows = []
-    if df is None or df.empty:
-        return rows
-    for idx, row in df.iterrows():
-        label = str(idx).replace('Shots on Goal', 'Tiros a Puerta').replace('Shots', 'Tiros').replace('Dangerous Attacks', 'Ataques Peligrosos').replace('Attacks', 'Ataques')
-        rows.append({
-            'label': label,
-            'home': row.get('Casa', ''),
-            'away': row.get('Fuera', '')
-        })
-    return rows
+def get_stats_rows(match_id_value):
+    if not match_id_value:
+        return []
+    return stats_to_rows(get_match_progression_stats_data(str(match_id_value)))
+
+
+def stats_to_rows(stats):
+    """[{label, home, away}] (etiquetas en español) de una tabla de get_match_progression_stats_data."""
+    return [{'label': _STAT_LABELS_ES.get(name, name), 'home': home, 'away': away} for name, home, away in stats or ()]
 
 # --- SISTEMA DE ANÁLISIS DE MERCADO ---
 def check_handicap_cover(resultado_raw: str, ah_line_num: float, favorite_team_name: str, home_team_in_h2h: str, away_team_in_h2h: str, main_home_team_name: str):
@@ -577,6 +672,78 @@ def _build_historical_matches_list_html(home_matches, away_matches, home_team_na
     html += "</div></div>"
     return html
 
+# --- ALMACENAMIENTO SLIM: REGENERACIÓN DEL HTML ---
+_RECENT_MATCH_FIELDS = ('date', 'league_id_hist', 'home', 'away', 'score', 'score_raw', 'ahLine', 'ouLine')
+
+def _slim_recent_matches(matches):
+    """Solo los campos que usa _build_historical_matches_list_html."""
+    return [{k: m.get(k) for k in _RECENT_MATCH_FIELDS if k in m} for m in (matches or [])]
+
+def _market_analysis_inputs(match):
+    odds = match.get('main_match_odds') or {}
+    main_odds = {'ah_linea_raw': odds.get('ah_linea', '-'), 'goals_linea_raw': odds.get('goals_linea', '-')}
+    return main_odds, match.get('h2h_stadium') or {}
+
+def hydrate_match_html(match):
+    """
+    Rellena market_analysis_html / historical_matches_html si el partido viene del
+    almacenamiento slim (data_manager.slim_match). Modifica y devuelve el dict.
+    """
+    if not match.get('market_analysis_html') and match.get('h2h_stadium'):
+        main_odds, h2h_data = _market_analysis_inputs(match)
+        match['market_analysis_html'], _ = generar_analisis_completo_mercado(main_odds, h2h_data, match.get('home_name', ''), match.get('away_name', ''))
+    if not match.get('historical_matches_html') and ('recent_home_matches' in match or 'recent_away_matches' in match):
+        match['historical_matches_html'] = _build_historical_matches_list_html(
+            match.get('recent_home_matches'), match.get('recent_away_matches'),
+            match.get('home_name', ''), match.get('away_name', '')
+        )
+    return match
+
+def _parse_historical_matches_html(html):
+    """Inverso de _build_historical_matches_list_html: {'Partidos en Casa': [...], 'Partidos Fuera': [...]}."""
+    tables = {}
+    for card in BeautifulSoup(html, 'html.parser').find_all('div', class_='card'):
+        title = card.find('strong')
+        rows = []
+        for tr in card.select('tbody tr'):
+            cells = [td.get_text(strip=True) for td in tr.find_all('td')]
+            if len(cells) < 6:
+                continue
+            league, date, home, score, away, ah = cells[:6]
+            rows.append({
+                'date': date, 'league_id_hist': league, 'home': home, 'away': away,
+                'score': score, 'score_raw': score.replace(':', '-'), 'ahLine': ah, 'ouLine': 'N/A'
+            })
+        if title:
+            tables[title.get_text(strip=True)] = rows
+    return tables
+
+def backfill_structured_fields(match):
+    """
+    Para partidos guardados antes del almacenamiento slim: calcula market_analysis_data
+    y las listas recent_home_matches / recent_away_matches a partir de lo guardado,
+    para que el HTML pueda descartarse y regenerarse luego con hydrate_match_html.
+    """
+    if not match.get('market_analysis_data') and match.get('h2h_stadium'):
+        main_odds, h2h_data = _market_analysis_inputs(match)
+        try:
+            _, market_data = generar_analisis_completo_mercado(main_odds, h2h_data, match.get('home_name', ''), match.get('away_name', ''))
+        except Exception as e:
+            print(f"No se pudo recalcular market_analysis_data de {match.get('match_id')}: {e}")
+            market_data = None
+        if market_data:
+            match['market_analysis_data'] = market_data
+    if 'recent_home_matches' not in match and 'recent_away_matches' not in match:
+        html = match.get('historical_matches_html')
+        if html:
+            tables = _parse_historical_matches_html(html)
+            match['recent_home_matches'] = tables.get('Partidos en Casa', [])
+            match['recent_away_matches'] = tables.get('Partidos Fuera', [])
+        elif html is not None:
+            match['recent_home_matches'] = []
+            match['recent_away_matches'] = []
+    return match
+
 # --- FUNCIONES DE EXTRACCIÓN DE DATOS ---
 def extract_vs_odds(soup):
     """
@@ -597,16 +764,9 @@ def extract_vs_odds(soup):
     
     try:
         # Extraer el array Vs_hOdds = [[...]];
-        match = re.search(r'var Vs_hOdds\s*=\s*(\[\[.*?\]\]);', script_content, re.DOTALL)
-        if match:
-            raw_data = match.group(1)
-            # Limpiar para JSON
-            raw_data = raw_data.replace("'", '"')
-            # Manejar posibles trailing commas o ,,
-            while ',,' in raw_data:
-                raw_data = raw_data.replace(',,', ',null,')
-            
-            data = json.loads(raw_data)
+        parsed = js_literals.parse_assignments(script_content, r"var Vs_hOdds", limit=1)
+        if parsed:
+            data = parsed[0][1]
             
             # Procesar datos
             # Formato: [MatchID, BookieID, H, AH, A, ...]
@@ -640,76 +800,35 @@ def extract_vs_odds(soup):
 
 def get_match_details_from_row_of(row_element, score_class_selector='score', source_table_type='h2h', odds_map=None):
     try:
-        cells = row_element.find_all('td')
-        home_idx, score_idx, away_idx, ah_idx = 2, 3, 4, 11
-        if len(cells) <= ah_idx: return None
-        date_span = cells[1].find('span', attrs={'name': 'timeData'})
-        # Priorizar data-t si existe (formato YYYY-MM-DD HH:MM:SS)
-        if date_span and date_span.get('data-t'):
-             date_txt = date_span.get('data-t', '').split(' ')[0]
-        elif cells[1].get('data-t'):
-             date_txt = cells[1].get('data-t', '').split(' ')[0]
-        else:
-             date_txt = date_span.get_text(strip=True) if date_span else ''
-        
-        def get_cell_txt(idx):
-            a = cells[idx].find('a')
-            return a.get_text(strip=True) if a else cells[idx].get_text(strip=True)
-        
-        def get_red_card(idx):
-            # Buscar span con clase 'rcard' o 'red-card'
-            rc = cells[idx].find('span', class_=lambda c: c and ('rcard' in c or 'red-card' in c))
-            return rc.get_text(strip=True) if rc else None
-
-        home, away = get_cell_txt(home_idx), get_cell_txt(away_idx)
-        home_red, away_red = get_red_card(home_idx), get_red_card(away_idx)
-
-        if not home or not away: return None
-        score_cell = cells[score_idx]
-        score_span = score_cell.find('span', class_=lambda c: isinstance(c, str) and score_class_selector in c)
-        score_raw_text = (score_span.get_text(strip=True) if score_span else score_cell.get_text(strip=True)) or ''
-        m = re.search(r'(\d+)\s*-\s*(\d+)', score_raw_text)
-        score_raw, score_fmt = (f"{m.group(1)}-{m.group(2)}", f"{m.group(1)}:{m.group(2)}") if m else ('?-?', '?:?')
-        ah_cell = cells[ah_idx]
-        ah_line_raw = (ah_cell.get('data-o') or ah_cell.text).strip()
-        
-        # Fallback usando odds_map si está disponible y el dato está vacío
-        if (not ah_line_raw or ah_line_raw == '-') and odds_map:
-            match_index = row_element.get('index')
-            if match_index and match_index in odds_map:
-                ah_line_raw = odds_map[match_index]
-
-        ah_line_fmt = format_ah_as_decimal_string_of(ah_line_raw) if ah_line_raw not in ['', '-'] else '-'
-        
-        # Intentar extraer Goal Line (O/U)
-        # Basado en analisis.txt, la columna O/U parece estar después de AH Away
-        # Indices típicos: Home(2), Score(3), Away(4), ... AH(11) ...
-        # En analisis.txt:
-        # td[10] -> AH Home Odds
-        # td[11] -> AH Line
-        # td[12] -> AH Away Odds
-        # td[13] -> AH Result (W/L)
-        # td[14] -> OU Result (U/O) ?? No, wait.
-        
-        # Vamos a intentar extraer de la celda siguiente a AH si existe
-        ou_line_raw = 'N/A'
-        if len(cells) > 12:
-             # A veces la linea de gol esta en otra columna o data attribute
-             # Por ahora, si no la encontramos explícitamente, dejaremos N/A o intentaremos buscar en data-o
-             # En analisis.txt, la celda 12 (indice 12) tiene data-o="0.90" (Away Odds?)
-             pass
-
-        return {
-            'date': date_txt, 'home': home, 'away': away, 'score': score_fmt,
-            'score_raw': score_raw, 'ahLine': ah_line_fmt, 'ahLine_raw': ah_line_raw or '-',
-            'ouLine': ou_line_raw, # Placeholder por ahora
-            'matchIndex': row_element.get('index'), 'vs': row_element.get('vs'),
-            'league_id_hist': row_element.get('title') or row_element.get('name'), # Usar title como nombre de liga si existe
-            'home_red': home_red, 'away_red': away_red
-        }
+        return _row_details(H2HRow(row_element, None, 0, score_class=score_class_selector), odds_map)
     except Exception:
         return None
 
+def _row_details(row, odds_map=None):
+    """Dict de detalles de partido (formato histórico de los extractores) para una H2HRow."""
+    if not row.complete or not row.home or not row.away:
+        return None
+    ah_line_raw = row.ah_raw
+    # Fallback usando odds_map si está disponible y el dato está vacío
+    if (not ah_line_raw or ah_line_raw == '-') and odds_map:
+        if row.index and row.index in odds_map:
+            ah_line_raw = odds_map[row.index]
+    ah_line_fmt = format_ah_as_decimal_string_of(ah_line_raw) if ah_line_raw not in ['', '-'] else '-'
+    return {
+        'date': row.date, 'home': row.home, 'away': row.away, 'score': row.score,
+        'score_raw': row.score_raw, 'ahLine': ah_line_fmt, 'ahLine_raw': ah_line_raw or '-',
+        'ouLine': 'N/A',  # La línea O/U no viene en estas tablas
+        'matchIndex': row.index, 'vs': row.vs,
+        'league_id_hist': row.league,  # Usar title como nombre de liga si existe
+        'home_red': row.home_red, 'away_red': row.away_red
+    }
+
+def _table_details(soup, table, odds_map=None, rows=None):
+    """Detalles de las filas válidas de una tabla (o de `rows`, ya filtradas del modelo)."""
+    if rows is None:
+        rows = H2HPage.of(soup).rows(table)
+    return [d for d in (_row_details(row, odds_map) for row in rows) if d]
+
 def get_requests_session_of():
     global _requests_session
     with _requests_session_lock:
@@ -723,61 +842,188 @@ def get_requests_session_of():
             _requests_session = session
         return _requests_session
 
-def get_match_progression_stats_data(match_id: str) -> pd.DataFrame | None:
+async def _on_connection_queued_end(session, trace_config_ctx, params):
+    # La espera por un hueco del conector (limit_per_host) no es latencia del upstream:
+    # la medida para rate_limiter empieza cuando la petición obtiene conexión.
+    timing = trace_config_ctx.trace_request_ctx
+    if isinstance(timing, dict):
+        timing['start'] = time.perf_counter()
+
+
+def _connection_wait_trace():
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_queued_end.append(_on_connection_queued_end)
+    return trace_config
+
+
+async def get_aiohttp_session_of():
+    """Sesión aiohttp compartida dentro del event loop actual (las sesiones no cruzan loops)."""
+    loop = asyncio.get_running_loop()
+    with _aiohttp_sessions_lock:
+        entry = _aiohttp_sessions.get(id(loop))
+        if entry and entry[0] is loop and not entry[1].closed:
+            return entry[1]
+        connector = aiohttp.TCPConnector(
+            limit=AIOHTTP_CONNECTION_LIMIT, limit_per_host=AIOHTTP_LIMIT_PER_HOST, ttl_dns_cache=300
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            headers=REQUEST_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS),
+            trace_configs=[_connection_wait_trace()],
+        )
+        _aiohttp_sessions[id(loop)] = (loop, session)
+        return session
+
+async def close_aiohttp_session_of():
+    loop = asyncio.get_running_loop()
+    with _aiohttp_sessions_lock:
+        entry = _aiohttp_sessions.pop(id(loop), None)
+    if entry and entry[0] is loop:
+        await entry[1].close()
+
+def _get_text_uncoalesced(url: str, max_age=None) -> str:
+    cached = http_cache.get(url, max_age=max_age)
+    if cached is not None:
+        return cached
+    if http_cache.is_replay_only():
+        raise http_cache.CacheMiss(f"Sin copia en caché (modo replay): {url}")
+    path = _live_mirrors.path_of(url)
+    text = _get_text_direct(url) if path is None else _live_mirrors.fetch(path, _get_text_direct)
+    http_cache.put(url, text, immutable=_page_is_immutable(url, text))
+    return text
+
+def _get_text_direct(url: str, clock=None) -> str:
+    with rate_limiter.limited(url) as probe:
+        if clock is not None:
+            # Para MirrorPool: la latencia del espejo empieza con el token concedido.
+            clock.sent()
+        response = get_requests_session_of().get(url, timeout=REQUEST_TIMEOUT_SECONDS)
+        probe['status'] = response.status_code
+    response.raise_for_status()
+    return response.text
+
+def live_mirror_stats():
+    """Salud de los dominios espejo de BASE_URL_OF (ver MirrorPool.stats)."""
+    return _live_mirrors.stats()
+
+def _page_is_final(html: str) -> bool:
+    """True si la página es de un partido terminado (su contenido ya no cambia)."""
+    return bool(html) and _FINISHED_STATE_RE.search(html) is not None
+
+def _page_is_immutable(url: str, html: str) -> bool:
+    """
+    Si http_cache puede guardar la página sin caducidad: partido terminado y, en
+    /match/live-{id}, con el bloque de estadísticas (si llegó tarde o la página
+    vino cortada, se vuelve a pedir pasado el TTL en vez de quedarse vacía).
+    """
+    if not _page_is_final(html):
+        return False
+    return '/match/live-' not in url or _LIVE_STATS_BLOCK_RE.search(html) is not None
+
+def _fetch_text(url: str, max_age=None) -> str:
+    """
+    GET de texto con single-flight: la misma URL pedida a la vez se descarga una
+    vez. max_age acota la copia de http_cache aceptada (si no, el TTL de su clase).
+    """
+    text, _ = _http_flight.do((url, max_age), _get_text_uncoalesced, url, max_age)
+    return text
+
+def get_match_progression_stats_data(match_id: str) -> tuple | None:
+    """
+    Estadísticas de progresión del partido como tupla inmutable de
+    (estadística_en, casa, fuera) en el orden de _STAT_TITLES_EN; None si no
+    se pudieron descargar. La misma tupla se comparte desde _stats_cache.
+    """
     if not match_id or not str(match_id).isdigit():
         return None
     match_id = str(match_id)
-    cached_value = _read_cache(_stats_cache, match_id, STATS_CACHE_TTL_SECONDS, _stats_cache_lock)
-    if cached_value is not None:
-        if cached_value is _STATS_NOT_FOUND:
-            return None
-        return cached_value.copy(deep=True)
+    hit, cached_stats = _get_cached_match_progression_stats(match_id)
+    if hit:
+        return cached_stats
+
+    stored = _load_stored_match_stats(match_id)
+    if stored is not None:
+        stats = _stats_table(stored[0])
+        _cache_match_progression_stats(match_id, stats, stored[1])
+        return stats
 
     url = f"{BASE_URL_OF}/match/live-{match_id}"
     try:
-        session = get_requests_session_of()
-        response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
-        stat_titles = {"Shots": "-", "Shots on Goal": "-", "Attacks": "-", "Dangerous Attacks": "-"}
-        team_tech_div = soup.find('div', id='teamTechDiv_detail')
-        if team_tech_div and (stat_list := team_tech_div.find('ul', class_='stat')):
-            for li in stat_list.find_all('li'):
-                if (title_span := li.find('span', class_='stat-title')) and (stat_title := title_span.get_text(strip=True)) in stat_titles:
-                    values = [v.get_text(strip=True) for v in li.find_all('span', class_='stat-c')]
-                    if len(values) == 2:
-                        stat_titles[stat_title] = {"Home": values[0], "Away": values[1]}
-        table_rows = [{"Estadistica_EN": name, "Casa": vals.get('Home', '-'), "Fuera": vals.get('Away', '-')}
-                      for name, vals in stat_titles.items() if isinstance(vals, dict)]
-        df = pd.DataFrame(table_rows)
-        df = df.set_index("Estadistica_EN") if not df.empty else df
-        cache_value = df.copy(deep=True) if df is not None else _STATS_NOT_FOUND
-        _write_cache(_stats_cache, match_id, cache_value, _stats_cache_lock)
-        return df
+        # La página de un partido terminado queda inmutable en http_cache (max_age no
+        # le afecta); la de uno en juego solo vale MATCH_STATS_LIVE_TTL_SECONDS.
+        stat_values, final = _parse_match_progression_stats(_fetch_text(url, max_age=MATCH_STATS_LIVE_TTL_SECONDS))
     except requests.RequestException:
-        _write_cache(_stats_cache, match_id, _STATS_NOT_FOUND, _stats_cache_lock)
+        _cache_match_progression_stats(match_id, None)
+        return None
+    _store_match_stats(match_id, stat_values, final)
+    stats = _stats_table(stat_values)
+    _cache_match_progression_stats(match_id, stats, final)
+    return stats
+
+def _parse_match_progression_stats(html: str):
+    """
+    ({stat_en: [casa, fuera]}, definitivas) de una página /match/live-{id};
+    definitivas si el partido terminó y la página trae estadísticas.
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    stat_values = {}
+    team_tech_div = soup.find('div', id='teamTechDiv_detail')
+    if team_tech_div and (stat_list := team_tech_div.find('ul', class_='stat')):
+        for li in stat_list.find_all('li'):
+            if (title_span := li.find('span', class_='stat-title')) and (stat_title := title_span.get_text(strip=True)) in _STAT_TITLES_EN:
+                values = [v.get_text(strip=True) for v in li.find_all('span', class_='stat-c')]
+                if len(values) == 2:
+                    stat_values[stat_title] = values
+    # Vacías (bloque que carga tarde, página cortada): se guardan con el TTL de en juego.
+    return stat_values, bool(stat_values) and _page_is_final(html)
+
+def _stats_table(stat_values) -> tuple:
+    return tuple((name, stat_values[name][0], stat_values[name][1]) for name in _STAT_TITLES_EN if name in stat_values)
+
+def _load_stored_match_stats(match_id: str):
+    """(stat_values, final) guardadas en data_manager, o None."""
+    try:
+        return data_manager.get_match_stats(match_id, MATCH_STATS_LIVE_TTL_SECONDS, with_final=True)
+    except Exception as e:
+        print(f"Error leyendo estadísticas guardadas de {match_id}: {e}")
         return None
 
+def _store_match_stats(match_id: str, stat_values, final: bool):
+    try:
+        data_manager.save_match_stats(match_id, stat_values, final)
+    except Exception as e:
+        print(f"Error guardando estadísticas de {match_id}: {e}")
+
+def _cache_match_progression_stats(match_id: str, stats, final=False):
+    # Tuplas inmutables: se guardan y se devuelven sin copiar. Las de un partido
+    # sin terminar (y los 'no encontrado') caducan a los MATCH_STATS_LIVE_TTL_SECONDS.
+    cache_value = stats if stats is not None else _STATS_NOT_FOUND
+    ttl = STATS_CACHE_TTL_SECONDS if final and stats is not None else MATCH_STATS_LIVE_TTL_SECONDS
+    _write_cache(_stats_cache, match_id, (cache_value, time.time() + ttl), _stats_cache_lock)
+
+def _get_cached_match_progression_stats(match_id: str):
+    """(hit, stats) desde _stats_cache; stats es None para un 'no encontrado' cacheado."""
+    cached = _read_cache(_stats_cache, match_id, STATS_CACHE_TTL_SECONDS, _stats_cache_lock)
+    if cached is None or time.time() > cached[1]:
+        return False, None
+    if cached[0] is _STATS_NOT_FOUND:
+        return True, None
+    return True, cached[0]
+
 def get_rival_a_for_original_h2h_of(soup, league_id=None):
-    if not soup or not (table := soup.find("table", id="table_v1")): return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr1_\d+")):
-        if league_id and row.get("name") != str(league_id):
-            continue
-        if row.get("vs") == "1" and (key_id := row.get("index")):
-            onclicks = row.find_all("a", onclick=True)
-            if len(onclicks) > 1 and (rival_tag := onclicks[1]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
-                return key_id, rival_id_match.group(1), rival_tag.text.strip()
-    return None, None, None
+    return _rival_for_original_h2h_of(soup, HOME_TABLE, 1, league_id)
 
 def get_rival_b_for_original_h2h_of(soup, league_id=None):
-    if not soup or not (table := soup.find("table", id="table_v2")): return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
-        if league_id and row.get("name") != str(league_id):
-            continue
-        if row.get("vs") == "1" and (key_id := row.get("index")):
-            onclicks = row.find_all("a", onclick=True)
-            if len(onclicks) > 0 and (rival_tag := onclicks[0]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
-                return key_id, rival_id_match.group(1), rival_tag.text.strip()
+    return _rival_for_original_h2h_of(soup, AWAY_TABLE, 0, league_id)
+
+def _rival_for_original_h2h_of(soup, table, link_pos, league_id=None):
+    if not soup or not (page := H2HPage.of(soup)).has_table(table): return None, None, None
+    rows = page.by_league(league_id, table) if league_id else page.rows(table)
+    for row in rows:
+        if row.vs == "1" and (key_id := row.index):
+            if len(row.teams) > link_pos and (rival_id := row.teams[link_pos][0]):
+                return key_id, rival_id, row.teams[link_pos][1]
     return None, None, None
 
 def get_h2h_details_for_original_logic_of(key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
@@ -786,80 +1032,45 @@ def get_h2h_details_for_original_logic_of(key_match_id, rival_a_id, rival_b_id,
     
     url = f"{BASE_URL_OF}/match/h2h-{key_match_id}"
     try:
-        session = get_requests_session_of()
-        response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "lxml")
-        
-        # Extraer odds del script Vs_hOdds
-        odds_map = extract_vs_odds(soup)
-        
+        soup = parse_h2h_html(_fetch_text(url))
     except Exception as e:
         return {"status": "error", "resultado": f"N/A (Error Requests en H2H Col3: {type(e).__name__})"}
+    return _parse_h2h_details_for_original_logic_of(soup, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+
+def _parse_h2h_details_for_original_logic_of(soup, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
+    # Extraer odds del script Vs_hOdds
+    odds_map = extract_vs_odds(soup)
 
-    if not (table := soup.find("table", id="table_v2")):
+    page = H2HPage.of(soup)
+    if not page.has_table(AWAY_TABLE):
         return {"status": "error", "resultado": "N/A (Tabla H2H Col3 no encontrada)"}
-    
-    for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
-        links = row.find_all("a", onclick=True)
-        if len(links) < 2: continue
-        
-        # Extract IDs from onclick="...team(123)..."
-        h_id_m = re.search(r"team\((\d+)\)", links[0].get("onclick", ""))
-        a_id_m = re.search(r"team\((\d+)\)", links[1].get("onclick", ""))
-        
-        if not (h_id_m and a_id_m): continue
-        h_id, a_id = h_id_m.group(1), a_id_m.group(1)
-        
+
+    for row in page.rows(AWAY_TABLE):
+        if len(row.teams) < 2: continue
+        # IDs de onclick="...team(123)..."
+        h_id, a_id = row.teams[0][0], row.teams[1][0]
+        if not (h_id and a_id): continue
+
         if {h_id, a_id} == {str(rival_a_id), str(rival_b_id)}:
-            if not (score_span := row.find("span", class_="fscore_2")) or "-" not in score_span.text: continue
-            score = score_span.text.strip().split("(")[0].strip()
+            if row.score_text is None or "-" not in row.score_text: continue
+            score = row.score_text.split("(")[0].strip()
             try:
                 g_h, g_a = score.split("-", 1)
             except ValueError:
                 continue
-                
-            tds = row.find_all("td")
-            handicap_raw = "N/A"
-            if len(tds) > 11:
-                cell = tds[11]
-                handicap_raw = (cell.get("data-o") or cell.text).strip()
-            
+
+            handicap_raw = row.ah_raw if row.complete else "N/A"
             # Fallback con Vs_hOdds
             if (not handicap_raw or handicap_raw == '-' or handicap_raw == 'N/A'):
-                match_idx = row.get('index')
-                if match_idx and match_idx in odds_map:
-                    handicap_raw = odds_map[match_idx]
-            
-            # Extract Date
-            date_txt = "N/A"
-            if len(tds) > 1:
-                date_span = tds[1].find('span', attrs={'name': 'timeData'})
-                if date_span and date_span.get('data-t'):
-                    date_txt = date_span.get('data-t', '').split(' ')[0]
-                elif tds[1].get('data-t'):
-                    date_txt = tds[1].get('data-t', '').split(' ')[0]
-                else:
-                    date_txt = date_span.get_text(strip=True) if date_span else ''
-
-            # Extract Red Cards
-            def get_red_card(cell):
-                rc = cell.find('span', class_=lambda c: c and ('rcard' in c or 'red-card' in c))
-                return rc.get_text(strip=True) if rc else None
-            
-            # Assuming home team is in cell 2 (index 2) and away in cell 4 (index 4) based on typical layout
-            # But we need to be careful about which link corresponds to which team.
-            # The links list has [home_link, away_link].
-            # Let's try to find the parent td for each link to check for red cards.
-            home_red = get_red_card(links[0].find_parent('td'))
-            away_red = get_red_card(links[1].find_parent('td'))
+                if row.index and row.index in odds_map:
+                    handicap_raw = odds_map[row.index]
 
             return {
                 "status": "found", "goles_home": g_h.strip(), "goles_away": g_a.strip(),
-                "handicap": handicap_raw or "N/A", "match_id": row.get('index'),
-                "h2h_home_team_name": links[0].text.strip(), "h2h_away_team_name": links[1].text.strip(),
-                "date": date_txt,
-                "home_red": home_red, "away_red": away_red
+                "handicap": handicap_raw or "N/A", "match_id": row.index,
+                "h2h_home_team_name": row.teams[0][1], "h2h_away_team_name": row.teams[1][1],
+                "date": row.date if row.date is not None else "N/A",
+                "home_red": row.home_red, "away_red": row.away_red
             }
     return {"status": "not_found", "resultado": f"H2H directo no encontrado para {rival_a_name} vs {rival_b_name}."}
 
@@ -894,29 +1105,12 @@ def extract_recent_matches(soup, table_id, team_name, league_id, is_home_game, o
     Extrae una lista de los últimos partidos del equipo en esa condición (Local/Visitante).
     Retorna una lista de diccionarios con detalles del partido.
     """
-    if not soup or not (table := soup.find("table", id=table_id)): return []
-    matches = []
-    score_selector = 'fscore_1' if is_home_game else 'fscore_2'
-    
-    # Iterar sobre las filas de la tabla
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist', odds_map=odds_map)):
-            continue
-            
-        # Filtrar por liga si es necesario (aunque el usuario pidió "todos", a veces es mejor filtrar)
-        # El usuario dijo "todos", así que quizás no filtramos por liga aquí, o lo hacemos opcional.
-        # Pero mantengamos la lógica de "Home vs Home" y "Away vs Away" estricta.
-        
-        is_team_home = team_name.lower() in details.get('home', '').lower()
-        is_team_away = team_name.lower() in details.get('away', '').lower()
-        
-        # Condición: El equipo analizado debe jugar en la condición especificada (Local o Visitante)
-        if (is_home_game and is_team_home) or (not is_home_game and is_team_away):
-            matches.append(details)
-            
+    table = int(table_id[-1])
+    if not soup or not (page := H2HPage.of(soup)).has_table(table): return []
+    # Home vs Home y Away vs Away estricto: el equipo debe jugar en la condición pedida.
+    matches = _table_details(soup, table, odds_map, rows=page.by_venue(table, team_name, is_home_game))
     # Ordenar por fecha descendente
     matches.sort(key=lambda x: _parse_date_ddmmyyyy(x.get('date', '')), reverse=True)
-    
     return matches[:limit]
 
 def extract_last_match_in_league_of(soup, table_id, team_name, league_id, is_home_game, odds_map=None):
@@ -940,62 +1134,97 @@ def fetch_odds_from_bf_data(match_id):
     Fallback para obtener líneas de hándicap y goles desde bf_en-idn.js
     cuando no están disponibles en el HTML principal.
     """
-    url = f"{BASE_URL_OF}/gf/data/bf_en-idn.js"
     try:
-        session = get_requests_session_of()
-        response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
-        response.raise_for_status()
-        content = response.text
-        
-        # Buscar la entrada correspondiente al match_id
-        # Formato esperado: A[123]=[2696131,...]
-        # Buscamos el ID del partido en el contenido
-        match_pattern = re.compile(r"A\[\d+\]=\[(.*?)\];")
-        
-        for match in match_pattern.finditer(content):
-            row_str = match.group(1)
-            if str(match_id) not in row_str:
-                continue
-            
-            # Encontrado, ahora parseamos con cuidado
-            # Reemplazar comillas simples por dobles para JSON
-            row_str_clean = row_str.replace("'", '"')
-            
-            # Reemplazar valores vacíos ,, por ,null,
-            while ',,' in row_str_clean:
-                row_str_clean = row_str_clean.replace(',,', ',null,')
-            
-            # Manejar comas al inicio o final dentro de los corchetes (aunque aquí ya tenemos el contenido)
-            if row_str_clean.endswith(','):
-                row_str_clean += 'null'
-            if row_str_clean.startswith(','):
-                row_str_clean = 'null' + row_str_clean
-                
-            try:
-                # Envolver en corchetes para parsear como lista
-                data = json.loads(f"[{row_str_clean}]")
-                
-                # Verificar que sea el ID correcto (índice 0)
-                if str(data[0]) == str(match_id):
-                    # Extraer datos
-                    # Índice 21: Hándicap (ej: 0.5, -1, etc.)
-                    # Índice 25: Línea de goles (ej: 2.5, 3, etc.)
-                    
-                    ah_line = data[21] if len(data) > 21 and data[21] is not None else None
-                    goals_line = data[25] if len(data) > 25 else None
-                    
-                    return {
-                        "ah_linea_raw": str(ah_line) if ah_line is not None else "N/A",
-                        "goals_linea_raw": str(goals_line) if goals_line is not None else "N/A"
-                    }
-            except json.JSONDecodeError:
-                continue
-        
-        return None
+        return _bf_odds_fields(get_bf_odds_table().get(str(match_id)))
     except Exception as e:
         print(f"Error fetching bf_data: {e}")
         return None
 
+
+def lookup_bf_odds(match_ids):
+    """
+    Consulta en lote sobre la tabla de bf_en-idn.js (una descarga/parseo por
+    refresco del feed): {match_id: {ah_linea_raw, goals_linea_raw, ...}} solo
+    con los IDs presentes en el feed.
+    """
+    table = get_bf_odds_table()
+    found = {}
+    for match_id in match_ids:
+        row = table.get(str(match_id))
+        if row is not None:
+            found[str(match_id)] = dict(row)
+    return found
+
+
+def get_bf_odds_table():
+    """
+    Tabla {match_id: fila} de bf_en-idn.js, parseada una sola vez por refresco
+    (BF_ODDS_TTL_SECONDS). Llamadas simultáneas comparten la descarga; si falla
+    y hay una tabla anterior, se sigue sirviendo esa.
+    """
+    with _bf_odds_lock:
+        if _bf_odds_table['rows'] is not None and time.time() - _bf_odds_table['ts'] < BF_ODDS_TTL_SECONDS:
+            return _bf_odds_table['rows']
+    rows, _ = _bf_odds_flight.do('bf', _refresh_bf_odds_table)
+    return rows
+
+
+def _refresh_bf_odds_table():
+    try:
+        content = _fetch_text(_bf_data_url())
+    except Exception:
+        with _bf_odds_lock:
+            if _bf_odds_table['rows'] is not None:
+                return _bf_odds_table['rows']
+        raise
+    return _store_bf_odds_table(_parse_bf_data_table(content))
+
+
+def _store_bf_odds_table(rows):
+    with _bf_odds_lock:
+        _bf_odds_table['rows'] = rows
+        _bf_odds_table['ts'] = time.time()
+    return rows
+
+
+def _bf_data_url():
+    return f"{BASE_URL_OF}/gf/data/bf_en-idn.js"
+
+
+def _parse_bf_data_table(content):
+    """
+    Parsea bf_en-idn.js completo: filas A[n]=[...] (partidos) y B[n]=[...]
+    (ligas, referenciadas por el índice 1 de cada partido).
+    Índice 21: hándicap asiático; índice 25: línea de goles.
+    """
+    leagues = {key: values for key, values in js_literals.parse_assignments(content, r"^B\[(\d+)\]", raw=True) if values}
+    rows = {}
+    for _, data in js_literals.parse_assignments(content, r"^A\[\d+\]", raw=True):
+        if not data or data[0] is None:
+            continue
+        league = leagues.get(data[1] or '') or []
+        ah_line = data[21] if len(data) > 21 else None
+        goals_line = data[25] if len(data) > 25 else None
+        rows[data[0]] = {
+            "ah_linea_raw": ah_line if ah_line is not None else "N/A",
+            "goals_linea_raw": goals_line if goals_line is not None else "N/A",
+            "home_team": data[4] if len(data) > 4 else None,
+            "away_team": data[5] if len(data) > 5 else None,
+            "match_time": data[6] if len(data) > 6 else None,
+            "state": data[8] if len(data) > 8 else None,
+            "home_goals": data[9] if len(data) > 9 else None,
+            "away_goals": data[10] if len(data) > 10 else None,
+            "league_id": league[0] if league else None,
+            "league_name": league[2] if len(league) > 2 else None,
+        }
+    return rows
+
+
+def _bf_odds_fields(row):
+    if row is None:
+        return None
+    return {"ah_linea_raw": row["ah_linea_raw"], "goals_linea_raw": row["goals_linea_raw"]}
+
 def fetch_odds_from_ajax(match_id):
     """
     Fallback para obtener cuotas desde la API AJAX (especialmente para partidos finalizados).
@@ -1003,67 +1232,65 @@ def fetch_odds_from_ajax(match_id):
     """
     url = f"{BASE_URL_OF}/Ajax/SoccerAjax/?type=1&id={match_id}"
     try:
-        session = get_requests_session_of()
-        response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
-        if response.status_code != 200:
-            return None
-            
-        data_json = response.json()
-        if data_json.get("ErrCode") != 0 or not data_json.get("Data"):
-            return None
-            
-        raw_data = data_json["Data"]
-        # Formato: ID*Odds1;Odds2;...^ID*Odds1;...
-        companies = raw_data.split('^')
-        
-        target_odds = None
-        
-        # Prioridad de IDs: 8 (Bet365), 281 (Bet365), 31 (Sbobet), o el que tenga "*" si no hay ID
-        priority_ids = ["8", "281", "31", ""] 
-        
-        for pid in priority_ids:
-            for company_data in companies:
-                if "*" not in company_data: continue
-                
-                comp_id, odds_str = company_data.split('*', 1)
-                # Limpiar ID (puede ser "1;" o "8;36" -> tomamos el primero)
-                comp_id_clean = comp_id.split(';')[0]
-                
-                # print(f"Checking company ID: '{comp_id}' (Clean: '{comp_id_clean}') against priority '{pid}'")
-                
-                # Si pid es "", buscamos el que no tenga ID (ej: "*...") -> comp_id será ""
-                if comp_id_clean == pid:
-                    # Parsear odds
-                    parts = odds_str.split(';')
-                    # Buscamos la parte que tenga suficientes datos (al menos 14 campos para AH y OU)
-                    # Estructura típica: 1x2(3), AH_Init(3), ?, AH_Live(3), ?, OU_Init(3), ...
-                    # Indices aproximados:
-                    # 3: AH Home, 4: AH Line, 5: AH Away
-                    # 11: OU Over, 12: OU Line, 13: OU Under
-                    
-                    for part in parts:
-                        vals = part.split(',')
-                        if len(vals) >= 14:
-                            # Verificar que tenga datos válidos (no vacíos)
-                            # Priorizar índice 8 (Main AH) sobre índice 4 (Secondary AH)
-                            ah_val = vals[8] if vals[8] else vals[4]
-                            
-                            if ah_val and vals[12]:
-                                target_odds = {
-                                    "ah_linea_raw": ah_val,
-                                    "goals_linea_raw": vals[12]
-                                }
-                                # print(f"Found odds for ID '{pid}': {target_odds}")
-                                break
-                    if target_odds: break
-            if target_odds: break
-            
-        return target_odds
-
+        return _parse_ajax_odds(json.loads(_fetch_text(url)))
+    except requests.HTTPError:
+        return None
     except Exception as e:
         print(f"Error fetching AJAX odds: {e}")
         return None
 
+def _parse_ajax_odds(data_json):
+    if data_json.get("ErrCode") != 0 or not data_json.get("Data"):
+        return None
+        
+    raw_data = data_json["Data"]
+    # Formato: ID*Odds1;Odds2;...^ID*Odds1;...
+    companies = raw_data.split('^')
+    
+    target_odds = None
+    
+    # Prioridad de IDs: 8 (Bet365), 281 (Bet365), 31 (Sbobet), o el que tenga "*" si no hay ID
+    priority_ids = ["8", "281", "31", ""] 
+    
+    for pid in priority_ids:
+        for company_data in companies:
+            if "*" not in company_data: continue
+            
+            comp_id, odds_str = company_data.split('*', 1)
+            # Limpiar ID (puede ser "1;" o "8;36" -> tomamos el primero)
+            comp_id_clean = comp_id.split(';')[0]
+            
+            # print(f"Checking company ID: '{comp_id}' (Clean: '{comp_id_clean}') against priority '{pid}'")
+            
+            # Si pid es "", buscamos el que no tenga ID (ej: "*...") -> comp_id será ""
+            if comp_id_clean == pid:
+                # Parsear odds
+                parts = odds_str.split(';')
+                # Buscamos la parte que tenga suficientes datos (al menos 14 campos para AH y OU)
+                # Estructura típica: 1x2(3), AH_Init(3), ?, AH_Live(3), ?, OU_Init(3), ...
+                # Indices aproximados:
+                # 3: AH Home, 4: AH Line, 5: AH Away
+                # 11: OU Over, 12: OU Line, 13: OU Under
+                
+                for part in parts:
+                    vals = part.split(',')
+                    if len(vals) >= 14:
+                        # Verificar que tenga datos válidos (no vacíos)
+                        # Priorizar índice 8 (Main AH) sobre índice 4 (Secondary AH)
+                        ah_val = vals[8] if vals[8] else vals[4]
+                        
+                        if ah_val and vals[12]:
+                            target_odds = {
+                                "ah_linea_raw": ah_val,
+                                "goals_linea_raw": vals[12]
+                            }
+                            # print(f"Found odds for ID '{pid}': {target_odds}")
+                            break
+                if target_odds: break
+        if target_odds: break
+        
+    return target_odds
+
 def extract_bet365_initial_odds_of(soup, match_id=None):
     odds_info = {
         "ah_home_cuota": "N/A", "ah_linea_raw": "N/A", "ah_away_cuota": "N/A",
@@ -1099,25 +1326,26 @@ def extract_bet365_initial_odds_of(soup, match_id=None):
                 odds_info["goals_under_cuota"] = tds[10].get("data-o", tds[10].text).strip()
 
     # Fallback 1: AJAX (para partidos finalizados donde HTML está vacío)
-    if (odds_info["ah_linea_raw"] in ["N/A", "-", ""] or odds_info["goals_linea_raw"] in ["N/A", "-", ""]) and match_id:
-        ajax_odds = fetch_odds_from_ajax(match_id)
-        if ajax_odds:
-            if odds_info["ah_linea_raw"] in ["N/A", "-", ""]:
-                odds_info["ah_linea_raw"] = ajax_odds.get("ah_linea_raw", "N/A")
-            if odds_info["goals_linea_raw"] in ["N/A", "-", ""]:
-                odds_info["goals_linea_raw"] = ajax_odds.get("goals_linea_raw", "N/A")
+    if _odds_lines_missing(odds_info) and match_id:
+        _merge_fallback_odds(odds_info, fetch_odds_from_ajax(match_id))
 
     # Fallback 2: BF Data (para partidos en vivo/futuros si AJAX falla)
-    if (odds_info["ah_linea_raw"] in ["N/A", "-", ""] or odds_info["goals_linea_raw"] in ["N/A", "-", ""]) and match_id:
-        fallback_data = fetch_odds_from_bf_data(match_id)
-        if fallback_data:
-            if odds_info["ah_linea_raw"] in ["N/A", "-", ""]:
-                odds_info["ah_linea_raw"] = fallback_data.get("ah_linea_raw", "N/A")
-            if odds_info["goals_linea_raw"] in ["N/A", "-", ""]:
-                odds_info["goals_linea_raw"] = fallback_data.get("goals_linea_raw", "N/A")
+    if _odds_lines_missing(odds_info) and match_id:
+        _merge_fallback_odds(odds_info, fetch_odds_from_bf_data(match_id))
                 
     return odds_info
 
+def _odds_lines_missing(odds_info):
+    return odds_info["ah_linea_raw"] in ["N/A", "-", ""] or odds_info["goals_linea_raw"] in ["N/A", "-", ""]
+
+def _merge_fallback_odds(odds_info, fallback_data):
+    if not fallback_data:
+        return
+    if odds_info["ah_linea_raw"] in ["N/A", "-", ""]:
+        odds_info["ah_linea_raw"] = fallback_data.get("ah_linea_raw", "N/A")
+    if odds_info["goals_linea_raw"] in ["N/A", "-", ""]:
+        odds_info["goals_linea_raw"] = fallback_data.get("goals_linea_raw", "N/A")
+
 def extract_standings_data_from_h2h_page_of(soup, team_name):
     data = {
         "name": team_name, "ranking": "N/A", "total_pj": "N/A", "total_v": "N/A",
@@ -1206,6 +1434,90 @@ def extract_final_score_of(soup):
     except Exception: pass
     return '?:?', '?-?'
 
+def _parse_final_score_header(html):
+    """'h:a' de la cabecera #mScore de /match/h2h-{id} si el partido terminó; si no, None."""
+    if not _page_is_final(html):
+        return None
+    header = _SCORE_HEADER_RE.search(html)
+    if header is None:
+        return None
+    scores = _HEADER_SCORE_VALUE_RE.findall(html, header.end(), header.end() + 800)
+    return f"{scores[0]}:{scores[1]}" if len(scores) >= 2 else None
+
+def _fetch_score_header(url):
+    """
+    Principio de /match/h2h-{id} hasta la cabecera #mScore. Una copia completa y
+    reciente (o inmutable) de http_cache sirve; si no, se descarga en streaming y
+    se corta al llegar a la cabecera (~1/3 de la página). El trozo no se guarda.
+    """
+    cached = http_cache.get(url, max_age=RESOLVE_HEADER_MAX_AGE_SECONDS)
+    if cached is not None:
+        return cached
+    if http_cache.is_replay_only():
+        raise http_cache.CacheMiss(f"Sin copia en caché (modo replay): {url}")
+    path = _live_mirrors.path_of(url)
+    return _get_score_header_direct(url) if path is None else _live_mirrors.fetch(path, _get_score_header_direct)
+
+def _get_score_header_direct(url: str, clock=None) -> str:
+    with rate_limiter.limited(url) as probe:
+        if clock is not None:
+            clock.sent()
+        response = get_requests_session_of().get(url, timeout=REQUEST_TIMEOUT_SECONDS, stream=True)
+        probe['status'] = response.status_code
+        with response:
+            response.raise_for_status()
+            head = bytearray()
+            for chunk in response.iter_content(chunk_size=16 * 1024):
+                head += chunk
+                header = _SCORE_HEADER_BYTES_RE.search(head)
+                if header is not None and len(head) >= header.end() + RESOLVE_HEADER_WINDOW_BYTES:
+                    break
+    return bytes(head).decode(response.encoding or 'utf-8', errors='replace')
+
+def _normalize_final_score(score):
+    m = re.match(r'^\s*(\d+)\s*[-:]\s*(\d+)\s*$', str(score or ''))
+    return f"{m.group(1)}:{m.group(2)}" if m else None
+
+def resolve_final_scores(match_ids, known_scores=None):
+    """
+    Resultado final ('h:a') de muchos partidos sin re-analizarlos. Fuentes, en
+    orden: known_scores (p. ej. filas finalizadas de la página principal), la
+    tabla de bf_data (estado -1) y, para el resto, solo la cabecera de
+    /match/h2h-{id}. Devuelve {match_id: score} con los partidos ya terminados.
+    """
+    ids = list(dict.fromkeys(str(mid) for mid in match_ids))
+    scores = {}
+    for mid, score in (known_scores or {}).items():
+        score = _normalize_final_score(score)
+        if score and str(mid) in ids:
+            scores[str(mid)] = score
+
+    remaining = [mid for mid in ids if mid not in scores]
+    if remaining:
+        try:
+            bf_rows = lookup_bf_odds(remaining)
+        except Exception as e:
+            print(f"Error fetching bf_data: {e}")
+            bf_rows = {}
+        for mid, row in bf_rows.items():
+            if row.get('state') == BF_STATE_FINISHED:
+                score = _normalize_final_score(f"{row.get('home_goals')}-{row.get('away_goals')}")
+                if score:
+                    scores[mid] = score
+
+    def header_score(mid):
+        try:
+            return mid, _parse_final_score_header(_fetch_score_header(f"{BASE_URL_OF}/match/h2h-{mid}"))
+        except Exception as e:
+            print(f"Error fetching h2h header {mid}: {e}")
+            return mid, None
+
+    remaining = [mid for mid in ids if mid not in scores]
+    for mid, score in _get_resolve_executor().map(header_score, remaining):
+        if score:
+            scores[mid] = score
+    return scores
+
 def extract_match_time_of(soup):
     """Extrae la hora del partido del HTML."""
     if not soup: return "N/A"
@@ -1244,12 +1556,11 @@ def extract_match_time_of(soup):
 
 def extract_h2h_data_of(soup, home_name, away_name, league_id=None, odds_map=None):
     results = {'ah1': '-', 'res1': '?:?', 'res1_raw': '?-?', 'match1_id': None, 'ah6': '-', 'res6': '?:?', 'res6_raw': '?-?', 'match6_id': None, 'h2h_gen_home': "Local (H2H Gen)", 'h2h_gen_away': "Visitante (H2H Gen)"}
-    if not soup or not home_name or not away_name or not (h2h_table := soup.find("table", id="table_v3")): return results
-    all_matches = []
-    for r in h2h_table.find_all("tr", id=re.compile(r"tr3_\d+")):
-        if (d := get_match_details_from_row_of(r, score_class_selector='fscore_3', source_table_type='h2h', odds_map=odds_map)):
-            if not league_id or (d.get('league_id_hist') and d.get('league_id_hist') == str(league_id)):
-                all_matches.append(d)
+    if not soup or not home_name or not away_name or not H2HPage.of(soup).has_table(H2H_TABLE): return results
+    all_matches = [
+        d for d in _table_details(soup, H2H_TABLE, odds_map)
+        if not league_id or (d.get('league_id_hist') and d.get('league_id_hist') == str(league_id))
+    ]
     if not all_matches: return results
     all_matches.sort(key=lambda x: _parse_date_ddmmyyyy(x.get('date', '')), reverse=True)
     most_recent = all_matches[0]
@@ -1268,10 +1579,9 @@ def extract_h2h_data_of(soup, home_name, away_name, league_id=None, odds_map=Non
     return results
 
 def extract_comparative_match_of(soup, table_id, main_team, opponent, league_id, is_home_table, odds_map=None):
-    if not opponent or opponent == "N/A" or not main_team or not (table := soup.find("table", id=table_id)): return None
-    score_selector = 'fscore_1' if is_home_table else 'fscore_2'
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist', odds_map=odds_map)): continue
+    table = int(table_id[-1])
+    if not opponent or opponent == "N/A" or not main_team or not H2HPage.of(soup).has_table(table): return None
+    for details in _table_details(soup, table, odds_map, rows=H2HPage.of(soup).by_team(main_team, table)):
         if league_id and details.get('league_id_hist') and details.get('league_id_hist') != str(league_id): continue
         h, a = details.get('home','').lower(), details.get('away','').lower()
         main, opp = main_team.lower(), opponent.lower()
@@ -1284,18 +1594,21 @@ def extract_comparative_match_of(soup, table_id, main_team, opponent, league_id,
     return None
 
 
-def _load_main_match_soup(main_match_id: str):
+def _load_main_match_soup(main_match_id: str, max_age=None):
     main_page_url = f"{BASE_URL_OF}/match/h2h-{main_match_id}"
-    session = get_requests_session_of()
-    response = session.get(main_page_url, timeout=REQUEST_TIMEOUT_SECONDS)
-    response.raise_for_status()
-    return BeautifulSoup(response.text, "lxml")
+    return parse_h2h_html(_fetch_text(main_page_url, max_age=max_age))
 
 from pathlib import Path
 from modules.backtesting import BettingSimulator
 
+_finished_matches_cache = {'key': None, 'matches': []}
+_finished_matches_lock = threading.Lock()
+
 def load_cached_finished_matches():
-    """Carga los partidos finalizados desde data.json."""
+    """
+    Partidos finalizados de data.json. El parseo se reutiliza mientras el
+    archivo no cambie (mtime y tamaño); la lista es compartida: solo lectura.
+    """
     # Intentar localizar data.json en directorios padres
     candidates = [
         Path(__file__).resolve().parent.parent.parent / 'data.json', # src/modules/../.. -> root
@@ -1311,187 +1624,208 @@ def load_cached_finished_matches():
     if not data_file:
         return []
 
-    try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get('finished_matches', [])
-    except Exception as e:
-        print(f"Error loading data.json: {e}")
-        return []
+    with _finished_matches_lock:
+        try:
+            stat = data_file.stat()
+            key = (str(data_file), stat.st_mtime_ns, stat.st_size)
+            if _finished_matches_cache['key'] == key:
+                return _finished_matches_cache['matches']
+            with open(data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            matches = data.get('finished_matches', [])
+        except Exception as e:
+            print(f"Error loading data.json: {e}")
+            return []
+        _finished_matches_cache['key'] = key
+        _finished_matches_cache['matches'] = matches
+        return matches
 
-def analizar_partido_completo(match_id: str, force_refresh: bool = False):
-    main_match_id = "".join(filter(str.isdigit, str(match_id)))
-    if not main_match_id:
-        return {"error": "ID de partido inválido."}
+def _extract_analysis_context(soup_completo, main_match_id: str, schedule, odds_match_id=None):
+    """
+    Todo lo que sale de la página principal del partido. schedule(key, *args) lanza
+    cada sub-petición en cuanto se conoce su ID ("h2h_col3" con los datos del rival,
+    el resto con el match_id de la página de estadísticas). Con odds_match_id se piden
+    aquí (bloqueante) los fallbacks de cuotas AJAX/bf_data.
+    """
+    home_id, away_id, league_id, home_name, away_name, league_name = get_team_league_info_from_script_of(soup_completo)
+    home_standings = extract_standings_data_from_h2h_page_of(soup_completo, home_name)
+    away_standings = extract_standings_data_from_h2h_page_of(soup_completo, away_name)
+    home_ou_stats = extract_over_under_stats_from_div_of(soup_completo, 'home')
+    away_ou_stats = extract_over_under_stats_from_div_of(soup_completo, 'away')
+    key_match_id_rival_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup_completo, league_id)
+    _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup_completo, league_id)
+    # La página H2H col3 se pide ya; corre en paralelo con el resto de la extracción.
+    schedule("h2h_col3", key_match_id_rival_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+    
+    # Extraer mapa de cuotas históricas
+    odds_map = extract_vs_odds(soup_completo)
+    
+    last_home_match = extract_last_match_in_league_of(soup_completo, "table_v1", home_name, league_id, True, odds_map)
+    last_away_match = extract_last_match_in_league_of(soup_completo, "table_v2", away_name, league_id, False, odds_map)
+    schedule("last_home", (last_home_match or {}).get('match_id'))
+    schedule("last_away", (last_away_match or {}).get('match_id'))
+    
+    # Extraer listas de partidos recientes (Home vs Home, Away vs Away)
+    recent_home_matches = extract_recent_matches(soup_completo, "table_v1", home_name, None, True, odds_map, limit=10)
+    recent_away_matches = extract_recent_matches(soup_completo, "table_v2", away_name, None, False, odds_map, limit=10)
+    
+    h2h_data = extract_h2h_data_of(soup_completo, home_name, away_name, None, odds_map)
+    comp_L_vs_UV_A = extract_comparative_match_of(soup_completo, "table_v1", home_name, (last_away_match or {}).get('home_team'), league_id, True, odds_map)
+    comp_V_vs_UL_H = extract_comparative_match_of(soup_completo, "table_v2", away_name, (last_home_match or {}).get('away_team'), league_id, False, odds_map)
+    schedule("comp_left", (comp_L_vs_UV_A or {}).get('match_id'))
+    schedule("comp_right", (comp_V_vs_UL_H or {}).get('match_id'))
+    schedule("h2h_stadium", h2h_data.get('match1_id'))
+    schedule("h2h_general", h2h_data.get('match6_id'))
+    main_match_odds_data = extract_bet365_initial_odds_of(soup_completo, odds_match_id)
+    final_score, _ = extract_final_score_of(soup_completo)
+    match_time = extract_match_time_of(soup_completo)
+    # --- Determinar Rivales Intencionados (para CSV aunque no haya match) ---
+    rival_name_for_home_to_find = "N/A"
+    if last_away_match:
+        # El rival del Home Team para la comparativa es el equipo contra el que jugó el Away Team recientemente
+        lat_home = last_away_match.get('home_team', '')
+        lat_away = last_away_match.get('away_team', '')
+        # Asumimos que away_name jugó ahí. Si away_name es home, rival es away.
+        if away_name.lower() in lat_home.lower(): rival_name_for_home_to_find = lat_away
+        else: rival_name_for_home_to_find = lat_home
+
+    rival_name_for_away_to_find = "N/A"
+    if last_home_match:
+        lhm_home = last_home_match.get('home_team', '')
+        lhm_away = last_home_match.get('away_team', '')
+        if home_name.lower() in lhm_home.lower(): rival_name_for_away_to_find = lhm_away
+        else: rival_name_for_away_to_find = lhm_home
+    # ---------------------------------------------------------------------
+
+    # --- Determinar Rivales para Comparativas Indirectas (si existen) ---
+    if comp_L_vs_UV_A:
+        # Home Team vs Rival. Find Rival.
+        h_team = comp_L_vs_UV_A.get('home_team', '')
+        a_team = comp_L_vs_UV_A.get('away_team', '')
+        # Simple heuristic: The one that is NOT the home_name is the rival
+        # Normalize for comparison
+        hn_norm = home_name.lower().strip()
+        if h_team.lower().strip() == hn_norm:
+            comp_L_vs_UV_A['rival_name'] = a_team
+        elif a_team.lower().strip() == hn_norm:
+            comp_L_vs_UV_A['rival_name'] = h_team
+        else:
+            # Fallback: try partial match
+            if hn_norm in h_team.lower(): comp_L_vs_UV_A['rival_name'] = a_team
+            elif hn_norm in a_team.lower(): comp_L_vs_UV_A['rival_name'] = h_team
+            else: comp_L_vs_UV_A['rival_name'] = "Rival Desconocido"
+
+    if comp_V_vs_UL_H:
+        # Away Team vs Rival.
+        h_team = comp_V_vs_UL_H.get('home_team', '')
+        a_team = comp_V_vs_UL_H.get('away_team', '')
+        an_norm = away_name.lower().strip()
+        if h_team.lower().strip() == an_norm:
+            comp_V_vs_UL_H['rival_name'] = a_team
+        elif a_team.lower().strip() == an_norm:
+            comp_V_vs_UL_H['rival_name'] = h_team
+        else:
+            if an_norm in h_team.lower(): comp_V_vs_UL_H['rival_name'] = a_team
+            elif an_norm in a_team.lower(): comp_V_vs_UL_H['rival_name'] = h_team
+            else: comp_V_vs_UL_H['rival_name'] = "Rival Desconocido"
+    # -----------------------------------------------------
 
-    if not force_refresh:
-        cached_payload = _get_cached_analysis(main_match_id)
-        if cached_payload:
-            return cached_payload
+    return {
+        "home_name": home_name, "away_name": away_name, "league_name": league_name,
+        "home_standings": home_standings, "away_standings": away_standings,
+        "home_ou_stats": home_ou_stats, "away_ou_stats": away_ou_stats,
+        "last_home_match": last_home_match, "last_away_match": last_away_match,
+        "recent_home_matches": recent_home_matches, "recent_away_matches": recent_away_matches,
+        "h2h_data": h2h_data, "comp_L_vs_UV_A": comp_L_vs_UV_A, "comp_V_vs_UL_H": comp_V_vs_UL_H,
+        "main_match_odds_data": main_match_odds_data, "final_score": final_score, "match_time": match_time,
+        "rival_name_for_home_to_find": rival_name_for_home_to_find,
+        "rival_name_for_away_to_find": rival_name_for_away_to_find,
+    }
 
-    start_time = time.time()
-    try:
-        soup_completo = _load_main_match_soup(main_match_id)
-        home_id, away_id, league_id, home_name, away_name, league_name = get_team_league_info_from_script_of(soup_completo)
-        home_standings = extract_standings_data_from_h2h_page_of(soup_completo, home_name)
-        away_standings = extract_standings_data_from_h2h_page_of(soup_completo, away_name)
-        home_ou_stats = extract_over_under_stats_from_div_of(soup_completo, 'home')
-        away_ou_stats = extract_over_under_stats_from_div_of(soup_completo, 'away')
-        key_match_id_rival_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup_completo, league_id)
-        _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup_completo, league_id)
-        
-        # Extraer mapa de cuotas históricas
-        odds_map = extract_vs_odds(soup_completo)
-        
-        last_home_match = extract_last_match_in_league_of(soup_completo, "table_v1", home_name, league_id, True, odds_map)
-        last_away_match = extract_last_match_in_league_of(soup_completo, "table_v2", away_name, league_id, False, odds_map)
-        
-        # Extraer listas de partidos recientes (Home vs Home, Away vs Away)
-        recent_home_matches = extract_recent_matches(soup_completo, "table_v1", home_name, None, True, odds_map, limit=10)
-        recent_away_matches = extract_recent_matches(soup_completo, "table_v2", away_name, None, False, odds_map, limit=10)
-        
-        h2h_data = extract_h2h_data_of(soup_completo, home_name, away_name, None, odds_map)
-        comp_L_vs_UV_A = extract_comparative_match_of(soup_completo, "table_v1", home_name, (last_away_match or {}).get('home_team'), league_id, True, odds_map)
-        comp_V_vs_UL_H = extract_comparative_match_of(soup_completo, "table_v2", away_name, (last_home_match or {}).get('away_team'), league_id, False, odds_map)
-        main_match_odds_data = extract_bet365_initial_odds_of(soup_completo, main_match_id)
-        final_score, _ = extract_final_score_of(soup_completo)
-        match_time = extract_match_time_of(soup_completo)
-        details_h2h_col3 = get_h2h_details_for_original_logic_of(
-            key_match_id_rival_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name
-        )
-        # --- Determinar Rivales Intencionados (para CSV aunque no haya match) ---
-        rival_name_for_home_to_find = "N/A"
-        if last_away_match:
-            # El rival del Home Team para la comparativa es el equipo contra el que jugó el Away Team recientemente
-            lat_home = last_away_match.get('home_team', '')
-            lat_away = last_away_match.get('away_team', '')
-            # Asumimos que away_name jugó ahí. Si away_name es home, rival es away.
-            if away_name.lower() in lat_home.lower(): rival_name_for_home_to_find = lat_away
-            else: rival_name_for_home_to_find = lat_home
-
-        rival_name_for_away_to_find = "N/A"
-        if last_home_match:
-            lhm_home = last_home_match.get('home_team', '')
-            lhm_away = last_home_match.get('away_team', '')
-            if home_name.lower() in lhm_home.lower(): rival_name_for_away_to_find = lhm_away
-            else: rival_name_for_away_to_find = lhm_home
-        # ---------------------------------------------------------------------
-
-        # --- Determinar Rivales para Comparativas Indirectas (si existen) ---
-        if comp_L_vs_UV_A:
-            # Home Team vs Rival. Find Rival.
-            h_team = comp_L_vs_UV_A.get('home_team', '')
-            a_team = comp_L_vs_UV_A.get('away_team', '')
-            # Simple heuristic: The one that is NOT the home_name is the rival
-            # Normalize for comparison
-            hn_norm = home_name.lower().strip()
-            if h_team.lower().strip() == hn_norm:
-                comp_L_vs_UV_A['rival_name'] = a_team
-            elif a_team.lower().strip() == hn_norm:
-                comp_L_vs_UV_A['rival_name'] = h_team
-            else:
-                # Fallback: try partial match
-                if hn_norm in h_team.lower(): comp_L_vs_UV_A['rival_name'] = a_team
-                elif hn_norm in a_team.lower(): comp_L_vs_UV_A['rival_name'] = h_team
-                else: comp_L_vs_UV_A['rival_name'] = "Rival Desconocido"
-
-        if comp_V_vs_UL_H:
-            # Away Team vs Rival.
-            h_team = comp_V_vs_UL_H.get('home_team', '')
-            a_team = comp_V_vs_UL_H.get('away_team', '')
-            an_norm = away_name.lower().strip()
-            if h_team.lower().strip() == an_norm:
-                comp_V_vs_UL_H['rival_name'] = a_team
-            elif a_team.lower().strip() == an_norm:
-                comp_V_vs_UL_H['rival_name'] = h_team
-            else:
-                if an_norm in h_team.lower(): comp_V_vs_UL_H['rival_name'] = a_team
-                elif an_norm in a_team.lower(): comp_V_vs_UL_H['rival_name'] = h_team
-                else: comp_V_vs_UL_H['rival_name'] = "Rival Desconocido"
-        # -----------------------------------------------------
 
+def _run_global_backtest(main_match_odds_data):
+    # --- GLOBAL BACKTESTING LOGIC ---
+    simulator = BettingSimulator()
+    
+    # Parse current lines
+    ah_actual_str = format_ah_as_decimal_string_of(main_match_odds_data.get('ah_linea_raw', '-'))
+    ah_actual_num = parse_ah_to_number_of(ah_actual_str)
+    
+    goles_actual_str = format_ah_as_decimal_string_of(main_match_odds_data.get('goals_linea_raw', '-'))
+    goles_actual_num = parse_ah_to_number_of(goles_actual_str)
+    
+    backtest_global = {"validez": False, "mensaje": "No hay línea AH/OU actual para simular."}
 
-        # --- GLOBAL BACKTESTING LOGIC ---
-        simulator = BettingSimulator()
-        
-        # Parse current lines
-        ah_actual_str = format_ah_as_decimal_string_of(main_match_odds_data.get('ah_linea_raw', '-'))
-        ah_actual_num = parse_ah_to_number_of(ah_actual_str)
+    if ah_actual_num is not None and goles_actual_num is not None:
+        # 1. Cargar clones globales
+        all_finished = load_cached_finished_matches()
+        global_clones = []
         
-        goles_actual_str = format_ah_as_decimal_string_of(main_match_odds_data.get('goals_linea_raw', '-'))
-        goles_actual_num = parse_ah_to_number_of(goles_actual_str)
+        # Normalizar AH y OU actual para comparación
+        target_ah_str = ah_actual_str
+        target_ou_str = goles_actual_str
         
-        backtest_global = {"validez": False, "mensaje": "No hay línea AH/OU actual para simular."}
-
-        if ah_actual_num is not None and goles_actual_num is not None:
-            # 1. Cargar clones globales
-            all_finished = load_cached_finished_matches()
-            global_clones = []
+        for m in all_finished:
+            # Normalizar handicap y goal_line del partido cacheado
+            m_ah_raw = m.get('handicap')
+            m_ou_raw = m.get('goal_line')
             
-            # Normalizar AH y OU actual para comparación
-            target_ah_str = ah_actual_str
-            target_ou_str = goles_actual_str
+            if not m_ah_raw or not m_ou_raw: continue
             
-            for m in all_finished:
-                # Normalizar handicap y goal_line del partido cacheado
-                m_ah_raw = m.get('handicap')
-                m_ou_raw = m.get('goal_line')
-                
-                if not m_ah_raw or not m_ou_raw: continue
-                
-                # Usamos la misma función de formateo para asegurar consistencia
-                m_ah_str = format_ah_as_decimal_string_of(m_ah_raw)
-                m_ou_str = format_ah_as_decimal_string_of(m_ou_raw)
-                
-                # CRITERIO DE PATRÓN ESTRICTO: AH + O/U deben coincidir
-                if m_ah_str == target_ah_str and m_ou_str == target_ou_str:
-                    # Es un clon!
-                    clone_data = {
-                        'score_raw': m.get('score'),
-                        'match_id': m.get('id')
-                    }
-                    global_clones.append(clone_data)
+            # Usamos la misma función de formateo para asegurar consistencia
+            m_ah_str = format_ah_as_decimal_string_of(m_ah_raw)
+            m_ou_str = format_ah_as_decimal_string_of(m_ou_raw)
             
-            # 2. Simular
-            if global_clones:
-                backtest_global = simulator.simular_escenario_actual(
-                    global_clones, ah_actual_num, goles_actual_num
-                )
-            else:
-                backtest_global = {"validez": False, "mensaje": f"No se encontraron clones con Patrón AH {target_ah_str} + O/U {target_ou_str}."}
-        # -------------------------
+            # CRITERIO DE PATRÓN ESTRICTO: AH + O/U deben coincidir
+            if m_ah_str == target_ah_str and m_ou_str == target_ou_str:
+                # Es un clon!
+                clone_data = {
+                    'score_raw': m.get('score'),
+                    'match_id': m.get('id')
+                }
+                global_clones.append(clone_data)
+        
+        # 2. Simular
+        if global_clones:
+            backtest_global = simulator.simular_escenario_actual(
+                global_clones, ah_actual_num, goles_actual_num
+            )
+        else:
+            backtest_global = {"validez": False, "mensaje": f"No se encontraron clones con Patrón AH {target_ah_str} + O/U {target_ou_str}."}
+    # -------------------------
+    return backtest_global
 
-    except Exception as exc:
-        return {"error": f"Error durante el análisis: {exc}"}
+
+def _build_analysis_results(main_match_id, ctx, backtest_global, details_h2h_col3, stats_by_key, timings, timed_out):
+    home_name, away_name = ctx["home_name"], ctx["away_name"]
+    h2h_data = ctx["h2h_data"]
+    main_match_odds_data = ctx["main_match_odds_data"]
+    last_home_match, last_away_match = ctx["last_home_match"], ctx["last_away_match"]
+    comp_L_vs_UV_A, comp_V_vs_UL_H = ctx["comp_L_vs_UV_A"], ctx["comp_V_vs_UL_H"]
+    recent_home_matches, recent_away_matches = ctx["recent_home_matches"], ctx["recent_away_matches"]
 
     market_analysis_html, market_analysis_data = generar_analisis_completo_mercado(main_match_odds_data, h2h_data, home_name, away_name)
     historical_matches_html = _build_historical_matches_list_html(recent_home_matches, recent_away_matches, home_name, away_name)
 
-    def get_stats_rows(match_id_value):
-        if not match_id_value:
-            return []
-        df = get_match_progression_stats_data(str(match_id_value))
-        return _df_to_rows(df)
-
-    last_home_match_stats = get_stats_rows((last_home_match or {}).get('match_id'))
-    last_away_match_stats = get_stats_rows((last_away_match or {}).get('match_id'))
-    h2h_col3_stats = get_stats_rows((details_h2h_col3 or {}).get('match_id'))
-    comp_L_vs_UV_A_stats = get_stats_rows((comp_L_vs_UV_A or {}).get('match_id'))
-    comp_V_vs_UL_H_stats = get_stats_rows((comp_V_vs_UL_H or {}).get('match_id'))
-    h2h_stadium_stats = get_stats_rows(h2h_data.get('match1_id'))
-    h2h_general_stats = get_stats_rows(h2h_data.get('match6_id'))
-
-    results = {
+    last_home_match_stats = stats_by_key.get("last_home", [])
+    last_away_match_stats = stats_by_key.get("last_away", [])
+    h2h_col3_stats = stats_by_key.get("h2h_col3", [])
+    comp_L_vs_UV_A_stats = stats_by_key.get("comp_left", [])
+    comp_V_vs_UL_H_stats = stats_by_key.get("comp_right", [])
+    h2h_stadium_stats = stats_by_key.get("h2h_stadium", [])
+    h2h_general_stats = stats_by_key.get("h2h_general", [])
+
+    return {
         "match_id": main_match_id,
         "home_name": home_name,
         "away_name": away_name,
-        "league_name": league_name,
-        "final_score": final_score,
-        "time": match_time,
-        "home_standings": home_standings,
-        "away_standings": away_standings,
-        "home_ou_stats": home_ou_stats,
-        "away_ou_stats": away_ou_stats,
+        "league_name": ctx["league_name"],
+        "final_score": ctx["final_score"],
+        "time": ctx["match_time"],
+        "home_standings": ctx["home_standings"],
+        "away_standings": ctx["away_standings"],
+        "home_ou_stats": ctx["home_ou_stats"],
+        "away_ou_stats": ctx["away_ou_stats"],
         "main_match_odds": {
             "ah_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('ah_linea_raw', '?')),
             "goals_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('goals_linea_raw', '?'))
@@ -1499,6 +1833,8 @@ def analizar_partido_completo(match_id: str, force_refresh: bool = False):
         "market_analysis_html": market_analysis_html,
         "market_analysis_data": market_analysis_data,
         "historical_matches_html": historical_matches_html,
+        "recent_home_matches": _slim_recent_matches(recent_home_matches),
+        "recent_away_matches": _slim_recent_matches(recent_away_matches),
         "last_home_match": {**last_home_match, "stats_rows": last_home_match_stats} if last_home_match else None,
         "last_away_match": {**last_away_match, "stats_rows": last_away_match_stats} if last_away_match else None,
         "h2h_col3": {
@@ -1512,22 +1848,388 @@ def analizar_partido_completo(match_id: str, force_refresh: bool = False):
                 "stats_rows": comp_L_vs_UV_A_stats if comp_L_vs_UV_A else None,
                 "title_home_name": home_name,
                 "title_away_name": away_name,
-                "rival_name": comp_L_vs_UV_A.get('rival_name') if comp_L_vs_UV_A else rival_name_for_home_to_find
+                "rival_name": comp_L_vs_UV_A.get('rival_name') if comp_L_vs_UV_A else ctx["rival_name_for_home_to_find"]
             },
             "right": {
                 **(comp_V_vs_UL_H if comp_V_vs_UL_H else {}),
                 "stats_rows": comp_V_vs_UL_H_stats if comp_V_vs_UL_H else None,
                 "title_home_name": home_name,
                 "title_away_name": away_name,
-                "rival_name": comp_V_vs_UL_H.get('rival_name') if comp_V_vs_UL_H else rival_name_for_away_to_find
+                "rival_name": comp_V_vs_UL_H.get('rival_name') if comp_V_vs_UL_H else ctx["rival_name_for_away_to_find"]
             }
         },
 
         "h2h_stadium": {**h2h_data, "stats_rows": h2h_stadium_stats},
         "h2h_general": {**h2h_data, "stats_rows": h2h_general_stats},
         "backtest_global": backtest_global,
-        "execution_time_seconds": round(time.time() - start_time, 2),
+        "execution_time_seconds": dict(timings),
+        "partial": bool(timed_out),
+        "timed_out": timed_out,
     }
 
-    _set_cached_analysis(main_match_id, results)
+
+_H2H_COL3_TIMEOUT_RESULT = {"status": "error", "resultado": "N/A (Timeout en H2H Col3)"}
+
+
+def analizar_partido_completo(match_id: str, force_refresh: bool = False):
+    main_match_id = "".join(filter(str.isdigit, str(match_id)))
+    if not main_match_id:
+        return {"error": "ID de partido inválido."}
+
+    if not force_refresh:
+        cached_payload = _get_cached_analysis(main_match_id)
+        if cached_payload:
+            return cached_payload
+
+    # Si otro hilo ya está analizando este partido, se espera su resultado. Un
+    # force_refresh solo se une a otro force_refresh: los demás pueden estar usando
+    # una página H2H cacheada más antigua.
+    page_max_age = FORCE_REFRESH_MAX_AGE_SECONDS if force_refresh else None
+    results, _ = _analysis_flight.do((main_match_id, force_refresh), _run_analysis, main_match_id, page_max_age)
     return copy.deepcopy(results)
+
+
+def _run_analysis(main_match_id: str, page_max_age=None):
+    start_time = time.time()
+    deadline = start_time + ANALYSIS_DEADLINE_SECONDS
+    timings = {}
+    executor = _get_fanout_executor()
+    h2h_col3_futures = {}
+    stats_futures = {}
+
+    def timed_h2h_col3(*args):
+        fetch_start = time.time()
+        try:
+            return get_h2h_details_for_original_logic_of(*args)
+        finally:
+            timings["h2h_col3"] = round(time.time() - fetch_start, 2)
+
+    def schedule(key, *args):
+        if key == "h2h_col3":
+            h2h_col3_futures[key] = executor.submit(timed_h2h_col3, *args)
+        elif args[0]:
+            stats_futures[key] = executor.submit(get_stats_rows, args[0])
+
+    try:
+        soup_completo = _load_main_match_soup(main_match_id, page_max_age)
+        timings["main_page"] = round(time.time() - start_time, 2)
+        extract_start = time.time()
+        ctx = _extract_analysis_context(soup_completo, main_match_id, schedule, odds_match_id=main_match_id)
+        backtest_global = _run_global_backtest(ctx["main_match_odds_data"])
+    except Exception as exc:
+        return {"error": f"Error durante el análisis: {exc}"}
+    timings["extract"] = round(time.time() - extract_start, 2)
+
+    # --- Esperar el fan-out con el deadline del análisis; lo que venza queda vacío ---
+    timed_out = []
+    details_h2h_col3, col3_done = _result_before(h2h_col3_futures.get("h2h_col3"), deadline, dict(_H2H_COL3_TIMEOUT_RESULT))
+    if not col3_done:
+        timed_out.append("h2h_col3")
+    schedule("h2h_col3_stats", (details_h2h_col3 or {}).get('match_id'))
+
+    stats_wait_start = time.time()
+    stats_by_key = {}
+    for key, future in stats_futures.items():
+        key = "h2h_col3" if key == "h2h_col3_stats" else key
+        rows, done = _result_before(future, deadline, [])
+        stats_by_key[key] = rows
+        if not done:
+            timed_out.append(f"stats:{key}")
+    timings["stats_wait"] = round(time.time() - stats_wait_start, 2)
+    timings["total"] = round(time.time() - start_time, 2)
+
+    results = _build_analysis_results(main_match_id, ctx, backtest_global, details_h2h_col3, stats_by_key, timings, timed_out)
+
+    # Un resultado parcial no se cachea: el siguiente intento aprovecha las
+    # estadísticas que terminaron en segundo plano (_stats_cache).
+    if not timed_out:
+        _set_cached_analysis(main_match_id, results)
+    return results
+
+
+# --- MOTOR ASÍNCRONO (aiohttp) ---
+async def _fetch_text_async(session, url, max_age=None):
+    """GET con single-flight por URL compartido con los hilos (ver _fetch_text)."""
+    text, _ = await _http_flight.do_async((url, max_age), _get_text_uncoalesced_async, session, url, max_age)
+    return text
+
+
+async def _get_text_uncoalesced_async(session, url, max_age=None):
+    cached = await asyncio.to_thread(http_cache.get, url, max_age)
+    if cached is not None:
+        return cached
+    if http_cache.is_replay_only():
+        raise aiohttp.ClientConnectionError(f"Sin copia en caché (modo replay): {url}")
+    path = _live_mirrors.path_of(url)
+    if path is None:
+        text = await _get_text_with_retries_async(session, url)
+    else:
+        text = await _live_mirrors.fetch_async(path, lambda mirror_url, clock: _get_text_with_retries_async(session, mirror_url, clock))
+    await asyncio.to_thread(http_cache.put, url, text, _page_is_immutable(url, text))
+    return text
+
+
+async def _get_text_with_retries_async(session, url, clock=None):
+    """
+    GET con los mismos reintentos que la sesión requests (5xx y errores de red).
+    clock (MirrorPool) arranca con el token concedido y se ajusta a la obtención
+    de conexión, como la latencia que se le pasa a rate_limiter.
+    """
+    host = rate_limiter.host_of(url)
+    for attempt in range(AIOHTTP_RETRIES + 1):
+        # Plaza en vuelo del host (límite aprendido por rate_limiter) y luego token.
+        await rate_limiter.enter_async(host)
+        status = None
+        timing = {'start': time.perf_counter()}
+        try:
+            await rate_limiter.acquire_async(host)
+            # 'start' se mueve al obtener conexión si hubo que esperar al conector.
+            timing['start'] = time.perf_counter()
+            if clock is not None:
+                clock.sent()
+            async with session.get(url, trace_request_ctx=timing) as response:
+                status = response.status
+                if clock is not None:
+                    clock.start = timing['start']
+                rate_limiter.record(host, time.perf_counter() - timing['start'], status)
+                if response.status in (500, 502, 503, 504) and attempt < AIOHTTP_RETRIES:
+                    raise aiohttp.ClientResponseError(response.request_info, response.history, status=response.status)
+                response.raise_for_status()
+                return await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if status is None:
+                rate_limiter.record(host, time.perf_counter() - timing['start'], None, True)
+            if attempt >= AIOHTTP_RETRIES:
+                raise
+        finally:
+            rate_limiter.leave(host)
+        await asyncio.sleep(0.4 * (2 ** attempt))
+
+
+async def get_stats_rows_async(session, match_id_value):
+    if not match_id_value or not str(match_id_value).isdigit():
+        return []
+    match_id_value = str(match_id_value)
+    hit, stats = _get_cached_match_progression_stats(match_id_value)
+    if hit:
+        return stats_to_rows(stats)
+    stored = await asyncio.to_thread(_load_stored_match_stats, match_id_value)
+    if stored is not None:
+        stats = _stats_table(stored[0])
+        final = stored[1]
+    else:
+        try:
+            html = await _fetch_text_async(session, f"{BASE_URL_OF}/match/live-{match_id_value}", max_age=MATCH_STATS_LIVE_TTL_SECONDS)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            _cache_match_progression_stats(match_id_value, None)
+            return []
+        stat_values, final = _parse_match_progression_stats(html)
+        await asyncio.to_thread(_store_match_stats, match_id_value, stat_values, final)
+        stats = _stats_table(stat_values)
+    _cache_match_progression_stats(match_id_value, stats, final)
+    return stats_to_rows(stats)
+
+
+async def get_h2h_details_for_original_logic_async(session, key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
+    if not all([key_match_id, rival_a_id, rival_b_id]):
+        return {"status": "error", "resultado": "N/A (Datos incompletos para H2H)"}
+    try:
+        html = await _fetch_text_async(session, f"{BASE_URL_OF}/match/h2h-{key_match_id}")
+        soup = await asyncio.to_thread(parse_h2h_html, html)
+    except Exception as e:
+        return {"status": "error", "resultado": f"N/A (Error Requests en H2H Col3: {type(e).__name__})"}
+    return await asyncio.to_thread(
+        _parse_h2h_details_for_original_logic_of, soup, rival_a_id, rival_b_id, rival_a_name, rival_b_name
+    )
+
+
+async def _apply_odds_fallbacks_async(session, odds_info, match_id):
+    """Mismos fallbacks que extract_bet365_initial_odds_of (AJAX y luego bf_data), sin bloquear el loop."""
+    if _odds_lines_missing(odds_info):
+        try:
+            text = await _fetch_text_async(session, f"{BASE_URL_OF}/Ajax/SoccerAjax/?type=1&id={match_id}")
+            _merge_fallback_odds(odds_info, _parse_ajax_odds(json.loads(text)))
+        except Exception as e:
+            print(f"Error fetching AJAX odds: {e}")
+    if _odds_lines_missing(odds_info):
+        try:
+            table = await _get_bf_odds_table_async(session)
+            _merge_fallback_odds(odds_info, _bf_odds_fields(table.get(str(match_id))))
+        except Exception as e:
+            print(f"Error fetching bf_data: {e}")
+
+
+async def _get_bf_odds_table_async(session):
+    """Versión async de get_bf_odds_table: misma tabla compartida, parseo fuera del loop."""
+    with _bf_odds_lock:
+        if _bf_odds_table['rows'] is not None and time.time() - _bf_odds_table['ts'] < BF_ODDS_TTL_SECONDS:
+            return _bf_odds_table['rows']
+    rows, _ = await _bf_odds_flight.do_async('bf', _refresh_bf_odds_table_async, session)
+    return rows
+
+
+async def _refresh_bf_odds_table_async(session):
+    try:
+        content = await _fetch_text_async(session, _bf_data_url())
+    except Exception:
+        with _bf_odds_lock:
+            if _bf_odds_table['rows'] is not None:
+                return _bf_odds_table['rows']
+        raise
+    return _store_bf_odds_table(await asyncio.to_thread(_parse_bf_data_table, content))
+
+
+async def _result_before_async(task, deadline, default):
+    if task is None:
+        return default, True
+    try:
+        # shield: la tarea sigue y deja su resultado en _stats_cache aunque venza el deadline.
+        return await asyncio.wait_for(asyncio.shield(task), max(0.0, deadline - time.time())), True
+    except asyncio.TimeoutError:
+        return default, False
+    except Exception:
+        return default, True
+
+
+async def analizar_partido_completo_async(match_id: str, force_refresh: bool = False):
+    """
+    Versión asyncio de analizar_partido_completo: mismo payload. La red va por la
+    sesión aiohttp compartida; el parseo de las páginas grandes se hace con
+    asyncio.to_thread para no bloquear el loop (y no disparar timeouts de otros
+    análisis en vuelo). Usar dentro de analizar_partidos_async o cerrar la sesión
+    con close_aiohttp_session_of() antes de terminar el loop.
+    """
+    main_match_id = "".join(filter(str.isdigit, str(match_id)))
+    if not main_match_id:
+        return {"error": "ID de partido inválido."}
+
+    if not force_refresh:
+        cached_payload = _get_cached_analysis(main_match_id)
+        if cached_payload:
+            return cached_payload
+
+    page_max_age = FORCE_REFRESH_MAX_AGE_SECONDS if force_refresh else None
+    results, _ = await _analysis_flight.do_async((main_match_id, force_refresh), _run_analysis_async, main_match_id, page_max_age)
+    return copy.deepcopy(results)
+
+
+async def _run_analysis_async(main_match_id: str, page_max_age=None):
+    session = await get_aiohttp_session_of()
+    start_time = time.time()
+    deadline = start_time + ANALYSIS_DEADLINE_SECONDS
+    timings = {}
+    h2h_col3_tasks = {}
+    stats_tasks = {}
+
+    async def timed_h2h_col3(*args):
+        fetch_start = time.time()
+        try:
+            return await get_h2h_details_for_original_logic_async(session, *args)
+        finally:
+            timings["h2h_col3"] = round(time.time() - fetch_start, 2)
+
+    def schedule(key, *args):
+        if key == "h2h_col3":
+            h2h_col3_tasks[key] = asyncio.ensure_future(timed_h2h_col3(*args))
+        elif args[0]:
+            stats_tasks[key] = asyncio.ensure_future(get_stats_rows_async(session, args[0]))
+
+    loop = asyncio.get_running_loop()
+
+    def schedule_from_thread(key, *args):
+        # La extracción corre en un hilo; las tareas se crean en el loop.
+        loop.call_soon_threadsafe(schedule, key, *args)
+
+    try:
+        html = await _fetch_text_async(session, f"{BASE_URL_OF}/match/h2h-{main_match_id}", max_age=page_max_age)
+        soup_completo = await asyncio.to_thread(parse_h2h_html, html)
+        timings["main_page"] = round(time.time() - start_time, 2)
+        extract_start = time.time()
+        ctx = await asyncio.to_thread(_extract_analysis_context, soup_completo, main_match_id, schedule_from_thread)
+        await _apply_odds_fallbacks_async(session, ctx["main_match_odds_data"], main_match_id)
+        # En un hilo: recorre todos los finalizados de data.json (y los carga si cambió).
+        backtest_global = await asyncio.to_thread(_run_global_backtest, ctx["main_match_odds_data"])
+    except Exception as exc:
+        for task in [*h2h_col3_tasks.values(), *stats_tasks.values()]:
+            task.cancel()
+        return {"error": f"Error durante el análisis: {exc}"}
+    timings["extract"] = round(time.time() - extract_start, 2)
+
+    timed_out = []
+    details_h2h_col3, col3_done = await _result_before_async(h2h_col3_tasks.get("h2h_col3"), deadline, dict(_H2H_COL3_TIMEOUT_RESULT))
+    if not col3_done:
+        timed_out.append("h2h_col3")
+    schedule("h2h_col3_stats", (details_h2h_col3 or {}).get('match_id'))
+
+    stats_wait_start = time.time()
+    stats_by_key = {}
+    for key, task in stats_tasks.items():
+        key = "h2h_col3" if key == "h2h_col3_stats" else key
+        rows, done = await _result_before_async(task, deadline, [])
+        stats_by_key[key] = rows
+        if not done:
+            timed_out.append(f"stats:{key}")
+    timings["stats_wait"] = round(time.time() - stats_wait_start, 2)
+    timings["total"] = round(time.time() - start_time, 2)
+
+    results = _build_analysis_results(main_match_id, ctx, backtest_global, details_h2h_col3, stats_by_key, timings, timed_out)
+    if not timed_out:
+        _set_cached_analysis(main_match_id, results)
+    return results
+
+
+async def analizar_partidos_async(match_ids, on_result=None, concurrency=ANALYSIS_ASYNC_CONCURRENCY, force_refresh=False, stop_event=None):
+    """
+    Analiza muchos partidos en un solo hilo con hasta `concurrency` análisis en vuelo
+    (las conexiones reales las limita el conector compartido por host).
+    on_result(match_id, payload) se llama según van terminando; sin on_result se
+    devuelve la lista de payloads en el orden de match_ids. Los IDs aún no iniciados
+    se saltan si stop_event se activa. Cierra la sesión aiohttp al acabar.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(mid):
+        async with semaphore:
+            if stop_event is not None and stop_event.is_set():
+                return None
+            try:
+                payload = await analizar_partido_completo_async(mid, force_refresh=force_refresh)
+            except Exception as exc:
+                payload = {"error": f"Error durante el análisis: {exc}"}
+        if on_result is None:
+            return payload
+        on_result(mid, payload)
+        return None
+
+    own_tasks = asyncio.all_tasks() - {asyncio.current_task()}
+    try:
+        return await asyncio.gather(*(run_one(mid) for mid in match_ids))
+    finally:
+        await _drain_background_tasks(own_tasks)
+        await close_aiohttp_session_of()
+
+
+async def _drain_background_tasks(existing, grace_seconds=REQUEST_TIMEOUT_SECONDS):
+    """
+    Espera (hasta grace_seconds) a las tareas que quedaron en segundo plano: las
+    protegidas con shield que vencieron el deadline y las de single-flight. Las que
+    no acaban se cancelan; así ninguna usa la sesión ya cerrada ni deja
+    "Task exception was never retrieved".
+    """
+    deadline = time.time() + grace_seconds
+    while True:
+        outstanding = asyncio.all_tasks() - existing - {asyncio.current_task()}
+        if not outstanding:
+            return
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            for task in outstanding:
+                task.cancel()
+            await asyncio.gather(*outstanding, return_exceptions=True)
+            return
+        await asyncio.wait(outstanding, timeout=remaining)
+        # Recoge resultados/excepciones de las que ya terminaron; las que hayan
+        # lanzado otras tareas se revisan en la siguiente vuelta.
+        done = {task for task in outstanding if task.done()}
+        await asyncio.gather(*done, return_exceptions=True)
+        existing = existing | done
@@ -1,6 +1,5 @@
 # modules/funciones_resumen.py
-import re
-from bs4 import BeautifulSoup
+from modules.h2h_page import H2HPage, HOME_TABLE, AWAY_TABLE
 from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of, check_handicap_cover
 
 def generar_resumen_rendimiento_reciente(soup, home_name, away_name, current_ah_line):
@@ -51,45 +50,21 @@ def generar_resumen_rendimiento_reciente(soup, home_name, away_name, current_ah_
 
 def _obtener_partidos_recientes(soup, table_id, team_name, is_home_team=True):
     """Obtiene los partidos recientes de un equipo."""
-    table = soup.find("table", id=table_id)
-    if not table:
+    page = H2HPage.of(soup)
+    table = int(table_id[-1])
+    if not page.has_table(table):
         return []
     
     partidos = []
-    score_selector = 'fscore_1' if is_home_team else 'fscore_2'
-    
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
+    for row in page.by_team(team_name, table):
         if len(partidos) >= 5:  # Limitar a 5 partidos recientes
             break
-            
-        cells = row.find_all('td')
-        if len(cells) < 12:
+        if not row.complete or row.score_text is None or '-' not in row.score_text:
             continue
-            
-        # Obtener nombres de equipos
-        home_team = cells[2].get_text(strip=True)
-        away_team = cells[4].get_text(strip=True)
-        
-        # Verificar si el equipo está en este partido
-        if team_name.lower() not in [home_team.lower(), away_team.lower()]:
-            continue
-            
-        # Obtener resultado
-        score_cell = cells[3]
-        score_span = score_cell.find('span', class_=score_selector)
-        if not score_span:
-            continue
-            
-        score_raw = score_span.get_text(strip=True)
-        if '-' not in score_raw:
-            continue
-            
-        # Obtener handicap
-        ah_cell = cells[11]
-        ah_line_raw = (ah_cell.get('data-o') or ah_cell.text).strip()
+        home_team, away_team = row.home, row.away
         
         # Determinar si el equipo era favorito
-        ah_line_num = parse_ah_to_number_of(ah_line_raw)
+        ah_line_num = parse_ah_to_number_of(row.ah_raw)
         favorito = None
         if ah_line_num is not None:
             if ah_line_num > 0:
@@ -100,8 +75,8 @@ def _obtener_partidos_recientes(soup, table_id, team_name, is_home_team=True):
         partidos.append({
             'home_team': home_team,
             'away_team': away_team,
-            'score': score_raw,
-            'ah_line_raw': ah_line_raw,
+            'score': row.score_text,
+            'ah_line_raw': row.ah_raw,
             'ah_line_num': ah_line_num,
             'favorito': favorito,
             'equipo_es_favorito': team_name.lower() == favorito.lower() if favorito else False
@@ -167,66 +142,21 @@ def _obtener_comparativas_indirectas(soup):
     comparativas = []
     
     # Buscar en las tablas de partidos rivales
-    table_v1 = soup.find("table", id="table_v1")  # Partidos del equipo local
-    table_v2 = soup.find("table", id="table_v2")  # Partidos del equipo visitante
+    page = H2HPage.of(soup)
     
-    if table_v1 and table_v2:
-        # Obtener rivales del equipo local
-        rivales_local = set()
-        for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-            cells = row.find_all('td')
-            if len(cells) >= 5:
-                rival = cells[4].get_text(strip=True)  # Equipo visitante
-                if rival and rival != '?':
-                    rivales_local.add(rival.lower())
-        
-        # Obtener rivales del equipo visitante
-        rivales_visitante = set()
-        for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-            cells = row.find_all('td')
-            if len(cells) >= 5:
-                rival = cells[2].get_text(strip=True)  # Equipo local
-                if rival and rival != '?':
-                    rivales_visitante.add(rival.lower())
+    if page.has_table(HOME_TABLE) and page.has_table(AWAY_TABLE):
+        # Rivales del equipo local (visitantes en table_v1) y del visitante (locales en table_v2)
+        rivales_local = {row.away.lower() for row in page.rows(HOME_TABLE) if row.away and row.away != '?'}
+        rivales_visitante = {row.home.lower() for row in page.rows(AWAY_TABLE) if row.home and row.home != '?'}
         
         # Encontrar rivales comunes
         rivales_comunes = rivales_local.intersection(rivales_visitante)
         
         # Para cada rival común, obtener información de partidos
         for rival in list(rivales_comunes)[:3]:  # Limitar a 3 rivales comunes
-            # Buscar partido del equipo local contra este rival
-            partido_local = None
-            for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-                cells = row.find_all('td')
-                if len(cells) >= 5 and cells[4].get_text(strip=True).lower() == rival:
-                    score = cells[3].get_text(strip=True)
-                    ah_cell = cells[11] if len(cells) > 11 else None
-                    handicap = ah_cell.get('data-o') or ah_cell.get_text(strip=True) if ah_cell else "-"
-                    
-                    partido_local = {
-                        'equipo': 'local',
-                        'rival': rival,
-                        'resultado': score,
-                        'handicap': handicap
-                    }
-                    break
-            
-            # Buscar partido del equipo visitante contra este rival
-            partido_visitante = None
-            for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-                cells = row.find_all('td')
-                if len(cells) >= 5 and cells[2].get_text(strip=True).lower() == rival:
-                    score = cells[3].get_text(strip=True)
-                    ah_cell = cells[11] if len(cells) > 11 else None
-                    handicap = ah_cell.get('data-o') or ah_cell.get_text(strip=True) if ah_cell else "-"
-                    
-                    partido_visitante = {
-                        'equipo': 'visitante',
-                        'rival': rival,
-                        'resultado': score,
-                        'handicap': handicap
-                    }
-                    break
+            # Primer partido del equipo local contra este rival, y del visitante
+            partido_local = _partido_contra_rival(page.by_venue(HOME_TABLE, rival, False), rival, 'local', home=False)
+            partido_visitante = _partido_contra_rival(page.by_venue(AWAY_TABLE, rival, True), rival, 'visitante', home=True)
             
             if partido_local and partido_visitante:
                 comparativas.append({
@@ -237,6 +167,18 @@ def _obtener_comparativas_indirectas(soup):
     
     return comparativas
 
+def _partido_contra_rival(rows, rival, equipo, home):
+    """Primer partido (en orden de la tabla) donde el rival juega en la condición indicada."""
+    for row in rows:
+        if (row.home if home else row.away).lower() == rival:
+            return {
+                'equipo': equipo,
+                'rival': rival,
+                'resultado': row.score_cell_text,
+                'handicap': row.ah_raw if row.complete else "-"
+            }
+    return None
+
 def _generar_analisis_comparativo(analisis_local, analisis_visitante, current_ah_line):
     """Genera un análisis comparativo entre ambos equipos."""
     analisis = {
@@ -0,0 +1,205 @@
+# modules/h2h_page.py
+import re
+
+from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
+
+# Tablas de la página /match/h2h-{id}: table_v1 (últimos del local), table_v2
+# (últimos del visitante) y table_v3 (H2H directo). Sus filas son tr{n}_*.
+HOME_TABLE, AWAY_TABLE, H2H_TABLE = 1, 2, 3
+
+_ROW_ID_RES = {n: re.compile(rf"tr{n}_\d+") for n in (HOME_TABLE, AWAY_TABLE, H2H_TABLE)}
+_TEAM_ID_RE = re.compile(r"team\((\d+)\)")
+_SCORE_RE = re.compile(r'(\d+)\s*-\s*(\d+)')
+_AH_CELL, _HOME_CELL, _SCORE_CELL, _AWAY_CELL = 11, 2, 3, 4
+
+
+# Parseo parcial: de la página (~250 KB) solo se construye el árbol de lo que leen
+# los extractores. Cabecera (#fbheader: marcador #mScore y primer timeData),
+# tablas de historial, clasificación (porletP4), scripts (_matchInfo, Vs_hOdds) y
+# las tablas de cuotas por casa de apuestas.
+_KEPT_IDS = frozenset({'table_v1', 'table_v2', 'table_v3', 'porletP4', 'fbheader', 'mScore', 'match_time', 'oddsCompTable'})
+_ODDS_ROW_PREFIX = 'tr_o_'
+
+
+class _H2HStrainer(ElementFilter):
+    """Crea solo los elementos de nivel superior que interesan (con todo su contenido)."""
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        attrs = attrs or {}
+        if name == 'script':
+            # Los <script src=...> no traen contenido.
+            return not attrs.get('src')
+        element_id = attrs.get('id')
+        return element_id in _KEPT_IDS or (name == 'tr' and bool(element_id) and element_id.startswith(_ODDS_ROW_PREFIX))
+
+    def allow_string_creation(self, string):
+        # Texto suelto fuera de los elementos conservados.
+        return False
+
+
+_H2H_STRAINER = _H2HStrainer()
+
+
+def parse_h2h_html(html):
+    """
+    Soup de /match/h2h-{id} con solo los elementos que usan los extractores.
+    Las búsquedas (find/select) sobre ella dan lo mismo que sobre la página
+    completa; ver scripts/benchmark_h2h_parse.py para tiempo y memoria.
+    """
+    return BeautifulSoup(html, 'lxml', parse_only=_H2H_STRAINER)
+
+
+def _is_red_card_class(c):
+    return c and ('rcard' in c or 'red-card' in c)
+
+
+class H2HRow:
+    """
+    Una fila de table_v1/v2/v3 leída una sola vez. Los campos son el texto tal
+    cual (sin formatear la línea AH); complete=False si la fila no llega a la
+    columna de hándicap (las extracciones la descartan).
+    """
+
+    __slots__ = ('table', 'position', 'index', 'vs', 'league_id', 'league', 'date',
+                 'home', 'away', 'home_red', 'away_red', 'score_text', 'score_cell_text',
+                 'score_raw', 'score', 'ah_raw', 'teams', 'complete')
+
+    def __init__(self, tr, table, position, score_class=None):
+        self.table = table
+        self.position = position
+        self.index = tr.get('index')
+        self.vs = tr.get('vs')
+        self.league_id = tr.get('name')
+        # El título de la fila (si existe) es el nombre de la liga; si no, su ID.
+        self.league = tr.get('title') or tr.get('name')
+        # (team_id o None, nombre) de cada enlace onclick de la fila, en orden.
+        self.teams = [
+            ((m.group(1) if (m := _TEAM_ID_RE.search(a.get('onclick', ''))) else None), a.text.strip())
+            for a in tr.find_all('a', onclick=True)
+        ]
+        cells = tr.find_all('td')
+        self.complete = len(cells) > _AH_CELL
+        self.date = self._date(cells)
+        self.home = self._cell_text(cells, _HOME_CELL)
+        self.away = self._cell_text(cells, _AWAY_CELL)
+        self.home_red = self._red_card(cells, _HOME_CELL)
+        self.away_red = self._red_card(cells, _AWAY_CELL)
+
+        score_class = score_class or f'fscore_{table}'
+        self.score_text = None
+        self.score_cell_text = ''
+        if len(cells) > _SCORE_CELL:
+            score_cell = cells[_SCORE_CELL]
+            self.score_cell_text = score_cell.get_text(strip=True)
+            score_span = score_cell.find('span', class_=lambda c: isinstance(c, str) and score_class in c)
+            if score_span is not None:
+                self.score_text = score_span.get_text(strip=True)
+        m = _SCORE_RE.search((self.score_text if self.score_text is not None else self.score_cell_text) or '')
+        self.score_raw, self.score = (f"{m.group(1)}-{m.group(2)}", f"{m.group(1)}:{m.group(2)}") if m else ('?-?', '?:?')
+
+        self.ah_raw = None
+        if self.complete:
+            ah_cell = cells[_AH_CELL]
+            self.ah_raw = (ah_cell.get('data-o') or ah_cell.text).strip()
+
+    @staticmethod
+    def _date(cells):
+        if len(cells) < 2:
+            return None
+        date_span = cells[1].find('span', attrs={'name': 'timeData'})
+        # Priorizar data-t si existe (formato YYYY-MM-DD HH:MM:SS)
+        if date_span and date_span.get('data-t'):
+            return date_span.get('data-t', '').split(' ')[0]
+        if cells[1].get('data-t'):
+            return cells[1].get('data-t', '').split(' ')[0]
+        return date_span.get_text(strip=True) if date_span else ''
+
+    @staticmethod
+    def _cell_text(cells, idx):
+        if len(cells) <= idx:
+            return ''
+        a = cells[idx].find('a')
+        return a.get_text(strip=True) if a else cells[idx].get_text(strip=True)
+
+    @staticmethod
+    def _red_card(cells, idx):
+        if len(cells) <= idx:
+            return None
+        rc = cells[idx].find('span', class_=_is_red_card_class)
+        return rc.get_text(strip=True) if rc else None
+
+    def has_score(self):
+        """True si la celda de marcador trae un resultado h-a."""
+        return self.score_raw != '?-?'
+
+
+class H2HPage:
+    """
+    Modelo de la página H2H: cada tabla se recorre una vez (al primer uso) y
+    sus filas quedan como H2HRow, con índices por equipo, condición (local /
+    visitante) y liga. H2HPage.of(soup) devuelve siempre el mismo modelo para
+    la misma soup, así que todos los extractores comparten el parseo.
+    """
+
+    def __init__(self, soup):
+        self.soup = soup
+        self._rows = {}
+        self._by_team = {}
+        self._by_venue = {}
+        self._by_league = {}
+
+    @classmethod
+    def of(cls, source):
+        if source is None or isinstance(source, cls):
+            return source
+        # Directo en __dict__: getattr en una soup buscaría una etiqueta con ese nombre.
+        page = source.__dict__.get('_h2h_page')
+        if page is None:
+            page = cls(source)
+            source.__dict__['_h2h_page'] = page
+        return page
+
+    def has_table(self, table):
+        self.rows(table)
+        return self._rows[table] is not None
+
+    def rows(self, table):
+        """Filas de table_v{table} en orden de la página ([] si la tabla no existe)."""
+        if table not in self._rows:
+            tag = self.soup.find('table', id=f'table_v{table}')
+            self._rows[table] = None if tag is None else [
+                H2HRow(tr, table, position) for position, tr in enumerate(tag.find_all('tr', id=_ROW_ID_RES[table]))
+            ]
+        return self._rows[table] or []
+
+    def _index(self, cache, key, table, row_keys):
+        index = cache.get(key)
+        if index is None:
+            index = {}
+            for row in self.rows(table):
+                for row_key in row_keys(row):
+                    index.setdefault(row_key, []).append(row)
+            cache[key] = index
+        return index
+
+    def by_team(self, team_name, table):
+        """Filas donde team_name (sin distinguir mayúsculas) juega de local o visitante."""
+        index = self._index(self._by_team, table, table, lambda r: {r.home.lower(), r.away.lower()} - {''})
+        return index.get((team_name or '').lower(), [])
+
+    def by_venue(self, table, team_name, home):
+        """
+        Filas donde el nombre del local (home=True) o del visitante contiene
+        team_name, en orden de la página.
+        """
+        index = self._index(self._by_venue, (table, home), table, lambda r: [(r.home if home else r.away).lower()])
+        needle = (team_name or '').lower()
+        matched = [row for name, rows in index.items() if needle in name for row in rows]
+        matched.sort(key=lambda r: r.position)
+        return matched
+
+    def by_league(self, league_id, table):
+        """Filas de la liga league_id (atributo name de la fila)."""
+        index = self._index(self._by_league, table, table, lambda r: [r.league_id])
+        return index.get(str(league_id), [])
@@ -1,7 +1,9 @@
 import json
-import os
 import sys
 import time
+import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 import logging
 
@@ -20,20 +22,15 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 HISTORY_DIR = BASE_DIR / 'studied_matches'
 HISTORY_FILE = HISTORY_DIR / 'history.json'
 
-def _ensure_history_file():
-    """Ensures the history file and directory exist with the correct structure."""
-    if not HISTORY_DIR.exists():
-        HISTORY_DIR.mkdir(parents=True)
-    
-    if not HISTORY_FILE.exists():
-        initial_structure = {
-            "pending": {},
-            "cached": {}
-        }
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(initial_structure, f, indent=2)
-        return initial_structure
-    return None
+# Pending/cached state lives in SQLite (WAL): each pending -> cached transition is
+# a row update instead of a full history.json rewrite, and readers never wait on
+# writers. The legacy history.json is imported once on first use.
+HISTORY_DB_FILE = HISTORY_DIR / 'history.db'
+DB_BUSY_TIMEOUT_SECONDS = 30
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_for = None
 
 class FileLock:
     """Cross-platform context manager for file locking."""
@@ -65,130 +62,169 @@ class FileLock:
             pass
         self.file_handle.close()
 
-def load_history():
-    """Loads the history data. Not thread-safe on its own, use with care or for read-only."""
-    _ensure_history_file()
+# --- SQLite plumbing ---
+def _get_conn():
+    """One connection per thread; the schema (and history.json import) is set up once per process."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'db_file', None) != HISTORY_DB_FILE:
+        HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(HISTORY_DB_FILE), timeout=DB_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_SECONDS * 1000}")
+        _local.conn = conn
+        _local.db_file = HISTORY_DB_FILE
+    _ensure_schema(conn)
+    return conn
+
+@contextmanager
+def _write_tx(conn):
+    # BEGIN IMMEDIATE queues writers on busy_timeout (no busy-poll, no lock upgrade failures).
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return {"pending": {}, "cached": {}}
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def _ensure_schema(conn):
+    global _schema_ready_for
+    if _schema_ready_for == HISTORY_DB_FILE:
+        return
+    with _schema_lock:
+        if _schema_ready_for == HISTORY_DB_FILE:
+            return
+        with _write_tx(conn):
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                " season TEXT NOT NULL,"
+                " league_id TEXT NOT NULL,"
+                " match_id TEXT NOT NULL,"
+                " state TEXT NOT NULL,"
+                " item TEXT,"
+                " PRIMARY KEY (season, league_id, match_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_state ON history (state)")
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone() is None:
+                _import_history_json(conn)
+        _schema_ready_for = HISTORY_DB_FILE
+
+def _import_history_json(conn):
+    """One-shot import of the legacy history.json (runs inside the schema transaction)."""
+    data = {"pending": {}, "cached": {}}
+    if HISTORY_FILE.exists():
+        try:
+            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Could not read {HISTORY_FILE} for import: {e}")
+    _replace_all(conn, data)
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)", (time.strftime('%Y-%m-%d %H:%M:%S'),))
+
+def _item_id(item):
+    return str(item['id']) if isinstance(item, dict) else str(item)
+
+def _pending_item(item):
+    return item if isinstance(item, dict) else {'id': str(item), 'ah': 'N/A'}
+
+def _replace_all(conn, data):
+    conn.execute("DELETE FROM history")
+    for season, leagues in (data.get("pending") or {}).items():
+        for league_id, items in leagues.items():
+            conn.executemany(
+                "INSERT OR IGNORE INTO history (season, league_id, match_id, state, item) VALUES (?, ?, ?, 'pending', ?)",
+                [(str(season), str(league_id), _item_id(i), json.dumps(_pending_item(i))) for i in items],
+            )
+    for season, leagues in (data.get("cached") or {}).items():
+        for league_id, ids in leagues.items():
+            conn.executemany(
+                "INSERT INTO history (season, league_id, match_id, state) VALUES (?, ?, ?, 'cached')"
+                " ON CONFLICT(season, league_id, match_id) DO UPDATE SET state = 'cached'",
+                [(str(season), str(league_id), str(mid)) for mid in ids],
+            )
+
+def _build_structure(rows):
+    structure = {}
+    for season, league_id, value in rows:
+        structure.setdefault(season, {}).setdefault(league_id, []).append(value)
+    return structure
+
+# --- Public API ---
+def load_history():
+    """Loads the history data in the legacy {"pending": ..., "cached": ...} shape."""
+    return {"pending": get_pending_matches(), "cached": get_cached_matches()}
 
 def save_history(data):
-    """Saves the history data. Not thread-safe on its own."""
-    _ensure_history_file()
-    with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
+    """Replaces the whole history with `data` (legacy shape)."""
+    conn = _get_conn()
+    with _write_tx(conn):
+        _replace_all(conn, data)
 
 def add_pending_matches(season, league_id, match_data_list):
     """
     Adds match IDs (and optional AH data) to the pending list.
-    Thread-safe / Process-safe using file locking.
+    IDs already pending or cached are skipped. Thread-safe / Process-safe.
     """
-    _ensure_history_file()
-    
     season = str(season)
     league_id = str(league_id)
-    
-    # Use lock for read-modify-write
-    with FileLock(HISTORY_FILE) as f:
-        try:
-            f.seek(0)
-            data = json.load(f)
-        except json.JSONDecodeError:
-            data = {"pending": {}, "cached": {}}
-        
-        if season not in data["pending"]:
-            data["pending"][season] = {}
-        
-        if league_id not in data["pending"][season]:
-            data["pending"][season][league_id] = []
-        
-        current_list = data["pending"][season][league_id]
-        
-        # Helper to get ID from item
-        def get_id(item):
-            return item['id'] if isinstance(item, dict) else str(item)
-        
-        # Get existing IDs for quick lookup
-        existing_ids = set()
-        for item in current_list:
-            existing_ids.add(get_id(item))
-            
-        # Add only new IDs
-        added_count = 0
-        for item in match_data_list:
-            mid_str = get_id(item)
-            
-            # Check if it's already in pending OR cached
-            is_cached = False
-            if season in data["cached"] and league_id in data["cached"][season]:
-                if mid_str in data["cached"][season][league_id]:
-                    is_cached = True
-            
-            if mid_str not in existing_ids and not is_cached:
-                if isinstance(item, dict):
-                    current_list.append(item)
-                else:
-                    current_list.append({'id': mid_str, 'ah': 'N/A'})
-                
-                existing_ids.add(mid_str)
-                added_count += 1
-        
-        # Write back
-        f.seek(0)
-        f.truncate()
-        json.dump(data, f, indent=2)
-        
+    conn = _get_conn()
+    with _write_tx(conn):
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO history (season, league_id, match_id, state, item) VALUES (?, ?, ?, 'pending', ?)",
+            [(season, league_id, _item_id(i), json.dumps(_pending_item(i))) for i in match_data_list],
+        )
+        added_count = conn.total_changes - before
     return added_count
 
+def move_many_to_cached(entries):
+    """
+    Moves many match IDs from pending to cached in one transaction.
+    entries: iterable of (season, league_id, match_id). Returns the number of entries.
+    """
+    rows = [(str(season), str(league_id), str(match_id)) for season, league_id, match_id in entries]
+    if not rows:
+        return 0
+    conn = _get_conn()
+    with _write_tx(conn):
+        conn.executemany(
+            "INSERT INTO history (season, league_id, match_id, state) VALUES (?, ?, ?, 'cached')"
+            " ON CONFLICT(season, league_id, match_id) DO UPDATE SET state = 'cached', item = NULL",
+            rows,
+        )
+    return len(rows)
+
 def move_to_cached(season, league_id, match_id):
     """
     Moves a match ID from pending to cached.
-    Thread-safe / Process-safe using file locking.
+    Thread-safe / Process-safe.
     """
-    _ensure_history_file()
-    season = str(season)
-    league_id = str(league_id)
-    match_id = str(match_id)
-    
-    with FileLock(HISTORY_FILE) as f:
-        try:
-            f.seek(0)
-            data = json.load(f)
-        except json.JSONDecodeError:
-            data = {"pending": {}, "cached": {}}
-            
-        # Remove from pending
-        # Need to handle both string IDs and objects in pending list
-        if season in data["pending"] and league_id in data["pending"][season]:
-            pending_list = data["pending"][season][league_id]
-            # Filter out the match_id
-            new_list = [m for m in pending_list if (m['id'] if isinstance(m, dict) else m) != match_id]
-            
-            if len(new_list) != len(pending_list):
-                data["pending"][season][league_id] = new_list
-                
-                # Clean up empty lists
-                if not data["pending"][season][league_id]:
-                    del data["pending"][season][league_id]
-                if not data["pending"][season]:
-                    del data["pending"][season]
-        
-        # Add to cached
-        if season not in data["cached"]:
-            data["cached"][season] = {}
-        if league_id not in data["cached"][season]:
-            data["cached"][season][league_id] = []
-            
-        if match_id not in data["cached"][season][league_id]:
-            data["cached"][season][league_id].append(match_id)
-            
-        # Write back
-        f.seek(0)
-        f.truncate()
-        json.dump(data, f, indent=2)
+    move_many_to_cached([(season, league_id, match_id)])
+
+def is_cached(season, league_id, match_id):
+    """Primary-key lookup; does not load other seasons/leagues."""
+    row = _get_conn().execute(
+        "SELECT 1 FROM history WHERE season = ? AND league_id = ? AND match_id = ? AND state = 'cached'",
+        (str(season), str(league_id), str(match_id)),
+    ).fetchone()
+    return row is not None
+
+def get_cached_ids(season, league_id):
+    """Set of cached match IDs for one season/league."""
+    rows = _get_conn().execute(
+        "SELECT match_id FROM history WHERE season = ? AND league_id = ? AND state = 'cached'",
+        (str(season), str(league_id)),
+    )
+    return {row[0] for row in rows}
 
 def get_pending_matches():
-    """Returns the pending matches structure. Read-only, no lock needed for simple read."""
-    return load_history().get("pending", {})
+    """Returns the pending matches structure {season: {league_id: [{id, ah}, ...]}}."""
+    rows = _get_conn().execute("SELECT season, league_id, item FROM history WHERE state = 'pending' ORDER BY rowid")
+    return _build_structure((season, league_id, json.loads(item)) for season, league_id, item in rows)
+
+def get_cached_matches():
+    """Returns the cached matches structure {season: {league_id: [match_id, ...]}}."""
+    rows = _get_conn().execute("SELECT season, league_id, match_id FROM history WHERE state = 'cached' ORDER BY rowid")
+    return _build_structure(rows)
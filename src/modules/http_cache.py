@@ -0,0 +1,250 @@
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+
+# Disk cache of raw upstream responses (h2h pages, live stats, odds feeds).
+# Index in SQLite (url -> body hash, fetch time, last access); bodies are gzip
+# files named by the SHA-256 of their content, so identical pages share one file.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+HTTP_CACHE_DIR = BASE_DIR / 'data' / 'http_cache'
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_DISABLED', '') not in ('1', 'true', 'yes')
+DB_BUSY_TIMEOUT_SECONDS = 30
+# Last access is only rewritten when older than this (reads stay read-only).
+TOUCH_INTERVAL_SECONDS = 60
+EVICT_TO_RATIO = 0.9
+
+# (class, pattern, TTL seconds; None = never expires). First match wins.
+# Match pages of upcoming/live matches change minute to minute (odds, lineups,
+# score), so they only live briefly; pages of finished matches are stored with
+# immutable=True and keep no expiry regardless of these TTLs.
+URL_CLASS_TTLS = [
+    ('h2h', re.compile(r'/match/h2h-\d+'), 60),
+    ('live_stats', re.compile(r'/match/live-\d+'), 60),
+    ('ajax_odds', re.compile(r'/Ajax/SoccerAjax/'), 10 * 60),
+    ('bf_data', re.compile(r'/gf/data/bf_'), 60),
+    ('default', re.compile(r''), 5 * 60),
+]
+
+_replay_only = os.environ.get('HTTP_CACHE_REPLAY_ONLY', '') in ('1', 'true', 'yes')
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_for = None
+
+
+class CacheMiss(requests.ConnectionError):
+    """Raised in replay-only mode for a URL that is not cached (treated like a network error)."""
+
+
+def set_replay_only(enabled=True):
+    """Replay-only: serve every cached response regardless of TTL and never touch the network."""
+    global _replay_only
+    _replay_only = bool(enabled)
+
+
+def is_replay_only():
+    return _replay_only
+
+
+def url_class(url):
+    """(class name, TTL seconds) for url."""
+    for name, pattern, ttl in URL_CLASS_TTLS:
+        if pattern.search(url):
+            return name, ttl
+    return 'default', None
+
+
+# --- SQLite plumbing ---
+def _db_file():
+    return HTTP_CACHE_DIR / 'index.db'
+
+
+def _get_conn():
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'db_file', None) != _db_file():
+        HTTP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(_db_file()), timeout=DB_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_SECONDS * 1000}")
+        _local.conn = conn
+        _local.db_file = _db_file()
+    _ensure_schema(conn)
+    return conn
+
+
+@contextmanager
+def _write_tx(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _ensure_schema(conn):
+    global _schema_ready_for
+    if _schema_ready_for == _db_file():
+        return
+    with _schema_lock:
+        if _schema_ready_for == _db_file():
+            return
+        with _write_tx(conn):
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " url TEXT PRIMARY KEY,"
+                " url_class TEXT NOT NULL,"
+                " body_hash TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " immutable INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(responses)")}
+            if 'immutable' not in columns:
+                conn.execute("ALTER TABLE responses ADD COLUMN immutable INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_hash ON responses (body_hash)")
+            conn.execute("CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+        _schema_ready_for = _db_file()
+
+
+def _body_path(body_hash):
+    return HTTP_CACHE_DIR / body_hash[:2] / f"{body_hash}.gz"
+
+
+# --- Public API ---
+def get(url, max_age=None):
+    """
+    Cached body for url, or None if missing/expired. max_age overrides the URL
+    class TTL; immutable responses and replay-only mode ignore expiry altogether.
+    """
+    if not HTTP_CACHE_ENABLED:
+        return None
+    conn = _get_conn()
+    row = conn.execute(
+        "SELECT body_hash, fetched_at, last_access, immutable FROM responses WHERE url = ?", (url,)
+    ).fetchone()
+    if row is None:
+        return None
+    body_hash, fetched_at, last_access, immutable = row
+    ttl = max_age if max_age is not None else url_class(url)[1]
+    now = time.time()
+    if not _replay_only and not immutable and ttl is not None and (now - fetched_at) > ttl:
+        return None
+    try:
+        with open(_body_path(body_hash), 'rb') as f:
+            text = gzip.decompress(f.read()).decode('utf-8')
+    except (OSError, EOFError):
+        return None
+    if (now - last_access) > TOUCH_INTERVAL_SECONDS:
+        with _write_tx(conn):
+            conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (now, url))
+    return text
+
+
+def put(url, text, immutable=False):
+    """
+    Stores the body for url (replacing any previous one) and evicts LRU entries
+    over the cap. immutable=True (e.g. pages of finished matches) disables expiry;
+    the entry can still be evicted by size.
+    """
+    if not HTTP_CACHE_ENABLED or text is None:
+        return
+    raw = text.encode('utf-8')
+    body_hash = hashlib.sha256(raw).hexdigest()
+    gz_bytes = gzip.compress(raw, compresslevel=6)
+    now = time.time()
+    conn = _get_conn()
+    with _write_tx(conn):
+        # Body files are only created and unlinked while holding the write lock,
+        # so another process cannot drop this one between writing and indexing it.
+        _write_body(body_hash, gz_bytes)
+        previous = conn.execute("SELECT body_hash FROM responses WHERE url = ?", (url,)).fetchone()
+        conn.execute("INSERT OR IGNORE INTO bodies (hash, size) VALUES (?, ?)", (body_hash, len(gz_bytes)))
+        conn.execute(
+            "INSERT INTO responses (url, url_class, body_hash, fetched_at, last_access, immutable) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(url) DO UPDATE SET body_hash = excluded.body_hash,"
+            " fetched_at = excluded.fetched_at, last_access = excluded.last_access, immutable = excluded.immutable",
+            (url, url_class(url)[0], body_hash, now, now, 1 if immutable else 0),
+        )
+        _drop_orphans(conn, [previous[0]] if previous and previous[0] != body_hash else [])
+    evict()
+
+
+def _write_body(body_hash, gz_bytes):
+    # Called inside a write transaction.
+    path = _body_path(body_hash)
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(gz_bytes)
+    os.replace(tmp_path, path)
+
+
+def _drop_orphans(conn, hashes):
+    """
+    Called inside a write transaction: forgets and unlinks the bodies no response
+    points at any more. Returns the bytes freed.
+    """
+    freed = 0
+    for body_hash in hashes:
+        if conn.execute("SELECT 1 FROM responses WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone() is None:
+            row = conn.execute("SELECT size FROM bodies WHERE hash = ?", (body_hash,)).fetchone()
+            conn.execute("DELETE FROM bodies WHERE hash = ?", (body_hash,))
+            try:
+                _body_path(body_hash).unlink()
+            except FileNotFoundError:
+                pass
+            freed += row[0] if row else 0
+    return freed
+
+
+def evict(max_bytes=None):
+    """Drops least-recently-used responses until the bodies fit in EVICT_TO_RATIO of the cap."""
+    max_bytes = HTTP_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    conn = _get_conn()
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+    if total <= max_bytes:
+        return 0
+    target = int(max_bytes * EVICT_TO_RATIO)
+    evicted = 0
+    with _write_tx(conn):
+        rows = conn.execute("SELECT url, body_hash FROM responses ORDER BY last_access").fetchall()
+        for url, body_hash in rows:
+            if total <= target:
+                break
+            conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            evicted += 1
+            total -= _drop_orphans(conn, [body_hash])
+    return evicted
+
+
+def cached_urls(url_class_name=None):
+    """URLs in the cache, optionally only one URL class (e.g. 'h2h')."""
+    conn = _get_conn()
+    if url_class_name:
+        rows = conn.execute("SELECT url FROM responses WHERE url_class = ?", (url_class_name,))
+    else:
+        rows = conn.execute("SELECT url FROM responses")
+    return [row[0] for row in rows]
+
+
+def stats():
+    conn = _get_conn()
+    responses = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    bodies, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM bodies").fetchone()
+    per_class = dict(conn.execute("SELECT url_class, COUNT(*) FROM responses GROUP BY url_class").fetchall())
+    return {'responses': responses, 'bodies': bodies, 'bytes': size, 'max_bytes': HTTP_CACHE_MAX_BYTES,
+            'per_class': per_class, 'replay_only': _replay_only}
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+LOG_SUFFIX = '.log'
+SNAPSHOT_EVERY = 1000
+
+
+class ProcessedIdCheckpoint:
+    """
+    Set of processed match IDs persisted as a JSON snapshot ({'processed_ids': [...]},
+    the old cache_state.json format) plus an append-only log with one ID per line.
+    Membership and add are O(1); the snapshot is rewritten every SNAPSHOT_EVERY
+    appends (and the log truncated), not on every finished match.
+    """
+
+    def __init__(self, snapshot_file, snapshot_every=SNAPSHOT_EVERY):
+        self.snapshot_file = Path(snapshot_file)
+        self.log_file = self.snapshot_file.with_name(self.snapshot_file.name + LOG_SUFFIX)
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._ids = None
+        self._log_lines = 0
+
+    def _load(self):
+        # Called with the lock held.
+        if self._ids is not None:
+            return
+        ids = set()
+        if self.snapshot_file.exists():
+            try:
+                with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                    ids.update(str(mid) for mid in json.load(f).get('processed_ids', []))
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Error loading checkpoint {self.snapshot_file}: {e}")
+        self._log_lines = 0
+        if self.log_file.exists():
+            valid_bytes = 0
+            with open(self.log_file, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    valid_bytes += len(line)
+                    if line.strip():
+                        ids.add(line.strip().decode('utf-8'))
+                        self._log_lines += 1
+            if valid_bytes != self.log_file.stat().st_size:
+                # Torn last line (crash mid-write): drop it so the next append starts clean.
+                with open(self.log_file, 'r+b') as f:
+                    f.truncate(valid_bytes)
+        self._ids = ids
+
+    def __contains__(self, match_id):
+        with self._lock:
+            self._load()
+            return str(match_id) in self._ids
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._ids)
+
+    def ids(self):
+        """Snapshot copy of the processed IDs as a set."""
+        with self._lock:
+            self._load()
+            return set(self._ids)
+
+    def add(self, match_id):
+        """Records match_id. Returns False if it was already processed."""
+        match_id = str(match_id)
+        with self._lock:
+            self._load()
+            if match_id in self._ids:
+                return False
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(match_id + '\n')
+            self._ids.add(match_id)
+            self._log_lines += 1
+            if self._log_lines >= self.snapshot_every:
+                self._write_snapshot()
+        return True
+
+    def replace(self, match_ids):
+        """Replaces the whole set (and compacts to a fresh snapshot)."""
+        with self._lock:
+            self._ids = set(str(mid) for mid in match_ids)
+            self._write_snapshot()
+
+    def snapshot(self):
+        """Folds the log into the snapshot file now."""
+        with self._lock:
+            self._load()
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        # Snapshot first (atomic replace), then drop the log it now contains.
+        tmp_file = self.snapshot_file.with_name(self.snapshot_file.name + '.tmp')
+        ordered = sorted(self._ids, key=lambda mid: (not mid.isdigit(), int(mid) if mid.isdigit() else 0, mid))
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'processed_ids': ordered}, f, ensure_ascii=False)
+        os.replace(tmp_file, self.snapshot_file)
+        with open(self.log_file, 'w', encoding='utf-8'):
+            pass
+        self._log_lines = 0
@@ -0,0 +1,234 @@
+# modules/js_literals.py
+import json
+import re
+
+# Literales de array que sirve NowGoal dentro de JS: Vs_hOdds de la página H2H,
+# filas A[n]=[...] / B[n]=[...] de bf_en-idn.js y jh["R_n"]=[[...]] de los
+# resultados de liga. Cadenas con comillas simples o dobles, huecos (,,),
+# coma final y arrays anidados. Se traducen a JSON y json.loads construye las
+# listas. La traducción es lineal y casi toda en C: el literal se divide una
+# vez en cadenas y código, y el código se trata unido con str.replace; solo los
+# tokens raros (escapes, identificadores, números no JSON) pasan por Python.
+# Camino rápido de parse_assignments (Vs_hOdds, filas de liga): el fin de cada
+# literal sale de str.find y, si ya es JSON salvo las comillas, basta un replace.
+_STRING_SPLIT_RE = re.compile(r"""('[^'\\]*(?:\\.[^'\\]*)*'|"[^"\\]*(?:\\.[^"\\]*)*")""")
+_SEP = '\x00'
+# Todo lo que no es corchete, saltando cadenas completas (en JS no cruzan líneas):
+# el fin de un literal se busca casi entero en C, solo los corchetes pasan por Python.
+_BODY_RE = re.compile(r"""(?:[^\[\]'"]+|'[^'\\\n]*(?:\\.[^'\\\n]*)*'|"[^"\\\n]*(?:\\.[^"\\\n]*)*")*""")
+_BARE_RE = re.compile(r"[^\s,\[\]\x00]+")
+_JSON_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?\Z")
+# Lo que queda del código al quitar números, separadores y espacios: si no es
+# vacío hay identificadores (true, undefined...) que traducir token a token.
+_PLAIN_CODE_CHARS = str.maketrans('', '', '0123456789-.,[] \t\r\n\x00')
+_DROP_WHITESPACE = str.maketrans('', '', ' \t\r\n')
+_JS_CONSTANTS = {'true': 'true', 'false': 'false', 'null': 'null', 'undefined': 'null'}
+_ESCAPE_RE = re.compile(r"\\(.)", re.S)
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '0': '\0'}
+
+
+def _unescape(text):
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def _json_string(literal):
+    """'cadena' o "cadena" JS -> cadena JSON."""
+    body = literal[1:-1]
+    if '\\' in body:
+        body = _unescape(body)
+    elif '"' not in body:
+        return f'"{body}"'
+    return json.dumps(body, ensure_ascii=False)
+
+
+def _typed_bare(m):
+    bare = m.group(0)
+    if _JSON_NUMBER_RE.match(bare):
+        return bare
+    return _JS_CONSTANTS.get(bare) or json.dumps(bare, ensure_ascii=False)
+
+
+def _raw_bare(m):
+    # Los números JSON se dejan: json.loads los devuelve como texto (parse_int/parse_float=str).
+    bare = m.group(0)
+    return bare if _JSON_NUMBER_RE.match(bare) else json.dumps(bare, ensure_ascii=False)
+
+
+def _translate_code(code, raw, careful):
+    joined = _SEP.join(code)
+    if careful or joined.translate(_PLAIN_CODE_CHARS):
+        joined = _BARE_RE.sub(_raw_bare if raw else _typed_bare, joined)
+    # Fuera de las cadenas los espacios no significan nada; sin ellos, los huecos
+    # son siempre [, o ,, (dos pasadas cubren cualquier racha de comas).
+    joined = joined.translate(_DROP_WHITESPACE)
+    joined = joined.replace('[,', '[null,').replace(',,', ',null,').replace(',,', ',null,').replace(',]', ']')
+    return joined.split(_SEP)
+
+
+def to_json(literal, raw=False, careful=False):
+    """
+    Texto JSON equivalente al literal JS. careful=True traduce cada token sin
+    comillas por separado (números no JSON como 05 o .5 pasan a ser texto).
+    """
+    if '\\' not in literal and '"' not in literal:
+        # Caso común: solo cadenas '...' sin escapes; cada ' delimita una cadena.
+        parts = literal.split("'")
+        parts[0::2] = _translate_code(parts[0::2], raw, careful)
+        return '"'.join(parts)
+    parts = _STRING_SPLIT_RE.split(literal)
+    parts[1::2] = [_json_string(string) for string in parts[1::2]]
+    parts[0::2] = _translate_code(parts[0::2], raw, careful)
+    return ''.join(parts)
+
+
+def parse(literal, raw=False):
+    """
+    Valor Python de un literal de array JS. Con raw=False los números son
+    int/float y true/false/null/undefined sus equivalentes; con raw=True todo
+    valor no vacío queda como texto tal cual ('1.50' sigue siendo '1.50').
+    Los huecos son None. ValueError si el literal no es válido.
+    """
+    return _load([literal], raw)[0]
+
+
+def _load(literals, raw):
+    hooks = {'parse_int': str, 'parse_float': str} if raw else {}
+    try:
+        return json.loads(f"[{','.join(to_json(literal, raw) for literal in literals)}]", strict=False, **hooks)
+    except ValueError:
+        # Números que JSON no admite (05, .5, 1.): se repite token a token.
+        return json.loads(f"[{','.join(to_json(literal, raw, True) for literal in literals)}]", strict=False, **hooks)
+
+
+_INVALID = object()
+
+
+def _load_all(literals, raw):
+    # Cada literal se traduce por separado (uno con escapes no frena al resto)
+    # y todos se cargan con un único json.loads. Si alguno no es válido se
+    # cargan de uno en uno y los inválidos quedan como _INVALID.
+    try:
+        return _load(literals, raw)
+    except ValueError:
+        pass
+    values = []
+    for literal in literals:
+        try:
+            values.append(_load([literal], raw)[0])
+        except ValueError:
+            values.append(_INVALID)
+    return values
+
+
+def _literal_end(content, pos):
+    """Índice tras el ] que cierra el [ de content[pos], o -1 si no cierra."""
+    depth = 0
+    while True:
+        pos = _BODY_RE.match(content, pos).end()
+        char = content[pos:pos + 1]
+        if char == '[':
+            depth += 1
+        elif char == ']':
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        else:
+            # Fin del texto o comilla sin cerrar en su línea.
+            return -1
+        pos += 1
+
+
+def _quick_end(content, pos):
+    """
+    Índice tras el primer ]; desde content[pos] si el tramo no tiene escapes ni
+    comillas dobles y sus comillas simples y corchetes cuadran; si no, -1. En JS
+    válido un ]; fuera de cadenas solo puede cerrar el literal; json.loads
+    confirma después que cada tramo es un único array completo.
+    """
+    end = content.find('];', pos)
+    if end < 0:
+        return -1
+    end += 1
+    if (content.find('"', pos, end) >= 0 or content.find('\\', pos, end) >= 0 or content.count("'", pos, end) % 2
+            or content.count('[', pos, end) != content.count(']', pos, end)):
+        return -1
+    return end
+
+
+def _split_assignments(content, start_re, quick, limit=None):
+    """
+    (claves, literales, cortes_rápidos) de cada asignación, hasta limit. Con
+    quick, cada fin se busca primero con _quick_end y, si no vale, con el
+    recorrido exacto; los literales que no cierran se omiten.
+    """
+    keys, literals = [], []
+    quick_cuts = 0
+    pos = 0
+    while (limit is None or len(literals) < limit) and (m := start_re.search(content, pos)):
+        end = _quick_end(content, m.end()) if quick else -1
+        if end >= 0:
+            quick_cuts += 1
+        else:
+            end = _literal_end(content, m.end())
+        if end < 0:
+            pos = m.end()
+            continue
+        keys.append(m.group(1) if start_re.groups else None)
+        literals.append(content[m.end():end])
+        pos = end
+    return keys, literals, quick_cuts
+
+
+def _load_quick(literals, raw, all_quick):
+    """
+    Valores de literales cortados (en parte) con _quick_end, o None si alguno no
+    resulta ser un único array completo. Sin huecos, escapes ni comillas dobles el
+    texto ya es JSON salvo por las comillas simples: un replace y json.loads.
+    all_quick: todos pasaron por _quick_end (ya se sabe que no hay escapes ni ").
+    """
+    text = f"[{','.join(literals)}]"
+    values = None
+    if all_quick or (text.find('"') < 0 and text.find('\\') < 0):
+        # ',,' es el hueco habitual: sin él basta el replace (los raros, [, y ,],
+        # hacen fallar json.loads y se traducen); con él, una sola traducción
+        # del array que los reúne a todos.
+        json_text = text.replace("'", '"') if text.find(',,') < 0 else to_json(text, raw)
+        hooks = {'parse_int': str, 'parse_float': str} if raw else {}
+        try:
+            values = json.loads(json_text, strict=False, **hooks)
+        except ValueError:
+            pass
+    if values is None:
+        try:
+            values = _load(literals, raw)
+        except ValueError:
+            return None
+    return values if len(values) == len(literals) else None
+
+
+def parse_assignments(content, target, raw=False, limit=None):
+    """
+    [(clave, valor)] de cada `target = [...];` del script, en orden (como mucho
+    limit, si se da: con limit=1 no se busca más tras el primero). target es
+    una expresión regular para la parte izquierda; su primer grupo (si lo hay)
+    es la clave, p. ej. r"^A\\[(\\d+)\\]" o r'jh\\["([^"]+)"\\]' (^ marca inicio de
+    línea). Todos los literales se cargan de una vez; los que no cierran o no
+    son válidos se omiten sin afectar al resto.
+    """
+    start_re = re.compile(rf"{target}\s*=\s*(?=\[)", re.M)
+    keys, literals, quick_cuts = _split_assignments(content, start_re, True, limit)
+    if not literals:
+        return []
+    if quick_cuts:
+        values = _load_quick(literals, raw, quick_cuts == len(literals))
+        if values is not None:
+            return list(zip(keys, values))
+        # Algún corte rápido no era el fin real: recorrido exacto de todo.
+        keys, literals, _ = _split_assignments(content, start_re, False, limit)
+    return [(key, value) for key, value in zip(keys, _load_all(literals, raw)) if value is not _INVALID]
+
+
+def columns(rows, width=None):
+    """Filas -> columnas (listas paralelas); las filas cortas se rellenan con None."""
+    width = width if width is not None else max((len(row) for row in rows), default=0)
+    return [[row[i] if i < len(row) else None for row in rows] for i in range(width)]
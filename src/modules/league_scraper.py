@@ -2,10 +2,24 @@ import requests
 import re
 import logging
 
+from modules import js_literals
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _league_match_rows(content, league_id):
+    """
+    (match_id, AH raw) of every match row of league_id in a matchResult JS file.
+    Rows live in jh["..."] = [[...], ...] arrays; AH is index 11, as text.
+    """
+    for _, rounds in js_literals.parse_assignments(content, r'jh\["[^"]*"\]', raw=True):
+        for row in rounds:
+            if not isinstance(row, list) or len(row) <= 11 or row[1] != str(league_id):
+                continue
+            yield row[0], row[11] if row[11] is not None else ''
+
+
 def extract_ids_by_params(season, league_id, ah_filter=None):
     """
     Extracts match IDs using season and league_id directly.
@@ -78,72 +92,40 @@ def extract_ids_by_params(season, league_id, ah_filter=None):
             response.raise_for_status()
             content = response.text
             
-            # Extract Match IDs and AH using regex
-            # Pattern: [MatchID, LeagueID, ..., AH(index 11), ...]
-            # The array is comma separated. We need to skip 9 items after LeagueID to get to AH.
+            # Filas de partido: jh["R_n"] = [[MatchID, LeagueID, ..., AH(index 11), ...], ...]
             # Example: [2590898,36,-1,'2024-08-17 03:00',27,29,'1-0','0-0','8','13',1,0.25,...]
-            # Items can be numbers or strings '...'.
-            # Regex strategy: Match [ID, LeagueID, then match next 9 items, then capture AH.
-            # Note: Items might be empty or null in JS (e.g. ,,), but usually not for these fields.
-            
-            # Let's try a more robust parsing approach for the array content
-            # Find all array starts
+            # Items can be numbers, '...' strings (which may contain commas) or empty slots (,,).
             matches_found = []
             
-            # Regex to find the start of a match array: [12345, 36,
-            start_pattern = r'\[' + r'(\d+),' + str(league_id) + r','
-            for match in re.finditer(start_pattern, content):
-                match_id = match.group(1)
-                start_index = match.start()
-                
-                # Find the end of this array ']'
-                end_index = content.find(']', start_index)
-                if end_index != -1:
-                    array_str = content[start_index:end_index+1]
-                    
-                    # Simple CSV parsing of the array string
-                    # Remove [ and ]
-                    inner = array_str[1:-1]
-                    
-                    # Split by comma, respecting quotes is hard with split, but let's assume simple structure for now
-                    # or use a regex to split.
-                    # Actually, the AH value is usually a number or string.
-                    # Let's try to split by comma.
-                    parts = inner.split(',')
-                    
-                    # Index 11 is AH (0-based)
-                    # 0: ID, 1: LeagueID, ... 11: AH
-                    if len(parts) > 11:
-                        ah_raw = parts[11].strip().replace("'", "")
+            for match_id, ah_raw in _league_match_rows(content, league_id):
+                # Apply Filter if set
+                if target_ahs:
+                    try:
+                        ah_val = float(ah_raw)
+                        # Check if matches any target (with tolerance)
+                        match_filter = False
+                        for target in target_ahs:
+                            if abs(ah_val - target) < 0.01:
+                                match_filter = True
+                                break
+                        
+                        # Also check bucket logic? 
+                        # User said "siguiendo siempre las reglas...".
+                        # If user asks for 0.5, they might mean the 0.5 bucket (which includes 0.25/0.75).
+                        # But usually "filter by AH" implies specific line.
+                        # However, the user said "reglas de handicaps de ,25 i 0,5 i ,75".
+                        # If they input "0.5", maybe they want EXACTLY 0.5?
+                        # Let's assume exact match for now unless they list multiple.
+                        # Or I can implement bucket matching if I import data_manager logic.
+                        # For now, exact match against the list provided by user.
+                        
+                        if not match_filter:
+                            continue
+                    except ValueError:
+                        # If AH is not a number (e.g. empty), skip if filtering is on
+                        continue
                         
-                        # Apply Filter if set
-                        if target_ahs:
-                            try:
-                                ah_val = float(ah_raw)
-                                # Check if matches any target (with tolerance)
-                                match_filter = False
-                                for target in target_ahs:
-                                    if abs(ah_val - target) < 0.01:
-                                        match_filter = True
-                                        break
-                                
-                                # Also check bucket logic? 
-                                # User said "siguiendo siempre las reglas...".
-                                # If user asks for 0.5, they might mean the 0.5 bucket (which includes 0.25/0.75).
-                                # But usually "filter by AH" implies specific line.
-                                # However, the user said "reglas de handicaps de ,25 i 0,5 i ,75".
-                                # If they input "0.5", maybe they want EXACTLY 0.5?
-                                # Let's assume exact match for now unless they list multiple.
-                                # Or I can implement bucket matching if I import data_manager logic.
-                                # For now, exact match against the list provided by user.
-                                
-                                if not match_filter:
-                                    continue
-                            except ValueError:
-                                # If AH is not a number (e.g. empty), skip if filtering is on
-                                continue
-                                
-                        matches_found.append({'id': match_id, 'ah': ah_raw})
+                matches_found.append({'id': match_id, 'ah': ah_raw})
             
             logger.info(f"Found {len(matches_found)} unique matches for league {league_id} in season {current_season}.")
             
@@ -0,0 +1,132 @@
+# modules/main_page.py
+import datetime
+import re
+
+from lxml import etree
+
+# Página principal de NowGoal (y football/results): una fila tr1_{id} por partido
+# con atributos state (estado del partido) y odds (cuotas separadas por comas:
+# [2] línea AH, [10] línea de goles); dentro, la celda timeData (data-t en UTC),
+# los enlaces team1_{id} / team2_{id} y el marcador en la celda 6.
+_ROWS_XPATH = etree.XPath("//tr[starts-with(@id, 'tr1_')]")
+_SCORE_RE = re.compile(r'^\d+\s*-\s*\d+$')
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+_FINISHED_STATE = '-1'
+_SCORE_CELL = 6
+_HANDICAP_ODD, _GOAL_LINE_ODD = 2, 10
+
+
+def _text(element):
+    # Como .text de BeautifulSoup: todo el texto descendiente, sin comentarios.
+    return ''.join(element.itertext())
+
+
+def _stripped_text(element):
+    # Como get_text(strip=True).
+    return ''.join(s.strip() for s in element.itertext())
+
+
+def _memoized(predicate):
+    # Las líneas se repiten mucho en la página: cada valor distinto se evalúa una vez.
+    if predicate is None:
+        return None
+    results = {}
+
+    def check(raw_value):
+        result = results.get(raw_value)
+        if result is None:
+            result = results[raw_value] = bool(predicate(raw_value))
+        return result
+
+    return check
+
+
+def _parse_time(data_t):
+    try:
+        return datetime.datetime.strptime(data_t, _TIME_FORMAT)
+    except (ValueError, TypeError):
+        return None
+
+
+def _load_root(html):
+    try:
+        return etree.HTML(html)
+    except ValueError:
+        # lxml no acepta str con declaración de encoding: se le pasa en bytes.
+        return etree.HTML(html.encode('utf-8'))
+
+
+def parse_main_page(html, handicap_predicate=None, goal_line_predicate=None, now_utc=None):
+    """
+    (próximos, finalizados) de la página principal en una sola pasada con lxml.
+    Cada fila tr1_* se lee una vez (celdas y enlaces en un único recorrido) y se
+    clasifica: próximo si su hora UTC no ha pasado, finalizado si state es -1
+    (o no viene) y trae marcador h-a; el resto (en juego, aplazados) se descarta.
+    Filas sin línea AH fuera. Los predicados (sobre el texto crudo de la línea AH
+    y de goles) se aplican durante el recorrido. Las listas salen en orden de la
+    página, sin paginar, con time_obj (datetime UTC) para ordenar y formatear.
+    """
+    upcoming, finished = [], []
+    if not html:
+        return upcoming, finished
+    root = _load_root(html)
+    if root is None:
+        return upcoming, finished
+    if now_utc is None:
+        now_utc = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    handicap_ok = _memoized(handicap_predicate)
+    goal_line_ok = _memoized(goal_line_predicate)
+
+    for row in _ROWS_XPATH(root):
+        match_id = row.get('id', '').replace('tr1_', '')
+        if not match_id:
+            continue
+        odds_data = row.get('odds', '').split(',')
+        if len(odds_data) <= _HANDICAP_ODD:
+            continue
+        handicap = odds_data[_HANDICAP_ODD]
+        goal_line = odds_data[_GOAL_LINE_ODD] if len(odds_data) > _GOAL_LINE_ODD else "N/A"
+        if handicap_ok and not handicap_ok(handicap):
+            continue
+        if goal_line_ok and not goal_line_ok(goal_line):
+            continue
+
+        cells, time_cell, home_tag, away_tag = [], None, None, None
+        home_id, away_id = f'team1_{match_id}', f'team2_{match_id}'
+        for element in row.iter('td', 'a'):
+            if element.tag == 'td':
+                cells.append(element)
+                if time_cell is None and element.get('name') == 'timeData':
+                    time_cell = element
+            elif home_tag is None and element.get('id') == home_id:
+                home_tag = element
+            elif away_tag is None and element.get('id') == away_id:
+                away_tag = element
+
+        data_t = time_cell.get('data-t') if time_cell is not None else None
+        match_time = _parse_time(data_t) if data_t is not None else None
+        entry = {
+            "id": match_id,
+            "time_obj": match_time,
+            "home_team": _text(home_tag).strip() if home_tag is not None else "N/A",
+            "away_team": _text(away_tag).strip() if away_tag is not None else "N/A",
+        }
+
+        if match_time is not None and match_time >= now_utc:
+            upcoming.append({**entry, "handicap": handicap, "goal_line": goal_line})
+
+        state = row.get('state')
+        if (state is None or state == _FINISHED_STATE) and len(cells) >= 8:
+            if data_t is not None and match_time is None:
+                continue
+            score_cell = cells[_SCORE_CELL]
+            b_tag = next(score_cell.iter('b'), None)
+            score_text = _text(b_tag).strip() if b_tag is not None else _stripped_text(score_cell)
+            if not _SCORE_RE.match(score_text):
+                continue
+            if match_time is None:
+                # Sin hora en la fila: como antes, cuenta como recién terminado.
+                entry["time_obj"] = datetime.datetime.now()
+            finished.append({**entry, "score": score_text, "handicap": handicap, "goal_line": goal_line})
+
+    return upcoming, finished
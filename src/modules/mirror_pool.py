@@ -0,0 +1,281 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import deque
+
+# Hedged requests over equivalent upstream mirrors: the request goes to the
+# healthiest mirror and, if it has not answered after that mirror's usual
+# latency (HEDGE_PERCENTILE of its recent samples), a duplicate goes to the
+# next one. First successful response wins. Mirrors failing repeatedly are
+# ejected and probed again after PROBE_AFTER_SECONDS. Only network errors,
+# timeouts and 429/5xx count as failures: any other HTTP error (e.g. a 404 for
+# a match that does not exist) is the answer and is raised without failover.
+HEDGE_PERCENTILE = 0.9
+HEDGE_DEFAULT_DELAY_SECONDS = 1.0
+HEDGE_MIN_DELAY_SECONDS = 0.05
+HEDGE_MIN_SAMPLES = 10
+LATENCY_SAMPLES = 50
+EJECT_AFTER_FAILURES = 3
+PROBE_AFTER_SECONDS = 30.0
+HEDGE_WORKERS = 16
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+# One slot per hedge worker: attempts only go to the pool when a worker is idle,
+# so time queued behind other fetches never counts as mirror latency.
+_hedge_slots = threading.BoundedSemaphore(HEDGE_WORKERS)
+
+
+def _is_mirror_failure(exc):
+    # requests.HTTPError carries response.status_code, aiohttp.ClientResponseError status.
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status is None:
+        status = getattr(exc, 'status', None)
+    return not isinstance(status, int) or status == 429 or status >= 500
+
+
+class RequestClock:
+    """
+    Second argument of fetch_fn. fetch_fn calls sent() right before the request
+    leaves (after rate limiting), so mirror latency and the hedge timer only
+    cover network time; it may also move `start` later (e.g. to when a pooled
+    connection was obtained). Without sent(), the attempt start counts.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+
+    def sent(self):
+        self.start = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+def _get_hedge_executor():
+    # Own pool: callers may already be running on the analysis fan-out pool.
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=HEDGE_WORKERS, thread_name_prefix="mirror-hedge"
+            )
+        return _hedge_executor
+
+
+class _Mirror:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.wins = 0
+
+    def score(self):
+        # Lower is better: typical latency, penalized by recent failures.
+        latency = sorted(self.latencies)[len(self.latencies) // 2] if self.latencies else HEDGE_DEFAULT_DELAY_SECONDS
+        return latency * (1 + self.failures)
+
+
+class MirrorPool:
+    """
+    Pool of base URLs serving the same paths. fetch(path, fetch_fn) /
+    fetch_async(path, fetch_fn) call fetch_fn(full_url, clock) with hedging
+    (clock: RequestClock) and return the first successful result; if every
+    mirror fails, the last error is raised.
+    """
+
+    def __init__(self, base_urls):
+        self._mirrors = [_Mirror(url) for url in dict.fromkeys(u.rstrip('/') for u in base_urls if u)]
+        self._lock = threading.Lock()
+
+    def path_of(self, url):
+        """Path of url if it points at one of the mirrors, else None."""
+        for mirror in self._mirrors:
+            if url.startswith(mirror.base_url + '/'):
+                return url[len(mirror.base_url):]
+        return None
+
+    def _candidates(self):
+        """Healthy mirrors by score, then at most one ejected mirror due for a probe."""
+        now = time.time()
+        with self._lock:
+            healthy = sorted((m for m in self._mirrors if m.ejected_until <= now and m.failures < EJECT_AFTER_FAILURES),
+                             key=lambda m: m.score())
+            due = [m for m in self._mirrors if m.failures >= EJECT_AFTER_FAILURES and m.ejected_until <= now]
+            if due:
+                # Half-open: this request probes it; the rest wait for the next window.
+                due[0].ejected_until = now + PROBE_AFTER_SECONDS
+                healthy.append(due[0])
+            if not healthy:
+                # Everything ejected: still try the least bad one rather than fail outright.
+                healthy = [min(self._mirrors, key=lambda m: m.ejected_until)]
+            return healthy
+
+    def hedge_delay(self, mirror):
+        with self._lock:
+            samples = sorted(mirror.latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_SECONDS
+        return max(HEDGE_MIN_DELAY_SECONDS, samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE))])
+
+    def _report(self, mirror, latency, ok):
+        with self._lock:
+            mirror.requests += 1
+            if ok:
+                mirror.latencies.append(latency)
+                mirror.failures = 0
+                mirror.ejected_until = 0.0
+            else:
+                mirror.failures += 1
+                if mirror.failures >= EJECT_AFTER_FAILURES:
+                    mirror.ejected_until = time.time() + PROBE_AFTER_SECONDS
+
+    def _hedge_wait(self, mirror, clock):
+        # Seconds left before hedging: the timer runs from the clock's start,
+        # which fetch_fn moves forward once the request is actually sent.
+        return max(0.0, clock.start + self.hedge_delay(mirror) - time.perf_counter())
+
+    def _attempt(self, mirror, path, fetch_fn, clock=None):
+        clock = clock or RequestClock()
+        clock.start = time.perf_counter()
+        try:
+            value = fetch_fn(mirror.base_url + path, clock)
+        except Exception as exc:
+            self._report(mirror, clock.elapsed(), not _is_mirror_failure(exc))
+            raise
+        self._report(mirror, clock.elapsed(), True)
+        return value
+
+    def _won(self, mirror):
+        with self._lock:
+            mirror.wins += 1
+
+    def _submit(self, mirror, path, fetch_fn):
+        """(future, clock) of the attempt on an idle hedge worker; None if all are busy."""
+        if not _hedge_slots.acquire(blocking=False):
+            return None
+        clock = RequestClock()
+
+        def run():
+            try:
+                return self._attempt(mirror, path, fetch_fn, clock)
+            finally:
+                _hedge_slots.release()
+
+        try:
+            return _get_hedge_executor().submit(run), clock
+        except Exception:
+            _hedge_slots.release()
+            raise
+
+    def fetch(self, path, fetch_fn):
+        candidates = self._candidates()
+        running = {}
+        error = None
+        while candidates or running:
+            if not running:
+                # First attempt, or failover once every running attempt has failed.
+                mirror = candidates.pop(0)
+                submitted = self._submit(mirror, path, fetch_fn)
+                if submitted is None:
+                    # Pool busy: run it in this thread; no hedge, only failover.
+                    try:
+                        value = self._attempt(mirror, path, fetch_fn)
+                    except Exception as exc:
+                        if not _is_mirror_failure(exc):
+                            raise
+                        error = exc
+                        continue
+                    self._won(mirror)
+                    return value
+                future, clock = submitted
+                running[future] = mirror
+            # The hedge timer runs from when the request was sent, not from when it
+            # was queued on the pool or on the rate limiter.
+            timeout = self._hedge_wait(mirror, clock) if candidates else None
+            done, _ = concurrent.futures.wait(running, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                if self._hedge_wait(mirror, clock) > 0:
+                    # Sent later than the timer assumed (rate limiter): keep waiting.
+                    continue
+                # Slow answer: hedge on the next mirror (the first one keeps running),
+                # but only if a hedge worker is idle; otherwise keep waiting.
+                submitted = self._submit(candidates[0], path, fetch_fn)
+                if submitted is not None:
+                    mirror = candidates.pop(0)
+                    future, clock = submitted
+                    running[future] = mirror
+                continue
+            for future in done:
+                winner = running.pop(future)
+                try:
+                    value = future.result()
+                except Exception as exc:
+                    if not _is_mirror_failure(exc):
+                        raise
+                    error = exc
+                    continue
+                self._won(winner)
+                return value
+        raise error
+
+    async def fetch_async(self, path, fetch_fn):
+        candidates = self._candidates()
+        running = {}
+        error = None
+        try:
+            while candidates or running:
+                if candidates and (not running or error is not None):
+                    mirror = candidates.pop(0)
+                    clock = RequestClock()
+                    running[asyncio.ensure_future(self._attempt_async(mirror, path, fetch_fn, clock))] = mirror
+                    error = None
+                timeout = self._hedge_wait(mirror, clock) if candidates else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if self._hedge_wait(mirror, clock) <= 0:
+                        error = asyncio.TimeoutError()
+                    continue
+                for task in done:
+                    winner = running.pop(task)
+                    try:
+                        value = task.result()
+                    except Exception as exc:
+                        if not _is_mirror_failure(exc):
+                            raise
+                        error = exc
+                        continue
+                    self._won(winner)
+                    return value
+            raise error
+        finally:
+            # Losers are cancelled (not counted as mirror failures).
+            for task in running:
+                task.cancel()
+
+    async def _attempt_async(self, mirror, path, fetch_fn, clock):
+        clock.start = time.perf_counter()
+        try:
+            value = await fetch_fn(mirror.base_url + path, clock)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self._report(mirror, clock.elapsed(), not _is_mirror_failure(exc))
+            raise
+        self._report(mirror, clock.elapsed(), True)
+        return value
+
+    def stats(self):
+        """{base_url: {healthy, failures, requests, wins, hedge_delay}}."""
+        now = time.time()
+        result = {}
+        for mirror in self._mirrors:
+            with self._lock:
+                healthy = mirror.failures < EJECT_AFTER_FAILURES or mirror.ejected_until <= now
+                entry = {'healthy': healthy, 'failures': mirror.failures, 'requests': mirror.requests, 'wins': mirror.wins}
+            entry['hedge_delay'] = round(self.hedge_delay(mirror), 3)
+            result[mirror.base_url] = entry
+        return result
@@ -0,0 +1,368 @@
+import asyncio
+import collections
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Per-host token bucket shared by every thread and process (Flask app, background
+# jobs, cli_scraper workers) through a small SQLite file. The refill rate adapts
+# AIMD-style: each fast successful response adds INCREASE_STEP req/s, a 429/5xx,
+# network error or response slower than LATENCY_TARGET_SECONDS halves it.
+# Requests in flight per host are capped in each process by the concurrency that
+# rate sustains at the observed latency, so the cap follows the same AIMD curve.
+# Responses are buffered in-process and folded into the shared row by the next
+# reserve() (or after RECORD_FLUSH_SECONDS): one SQLite transaction per request.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+RATE_LIMITER_DIR = BASE_DIR / 'data'
+RATE_LIMITER_ENABLED = os.environ.get('RATE_LIMITER_DISABLED', '') not in ('1', 'true', 'yes')
+DB_BUSY_TIMEOUT_SECONDS = 30
+
+INITIAL_RATE = 5.0
+MIN_RATE = 0.5
+MAX_RATE = 50.0
+# Bucket capacity in seconds of the current rate (how much burst is allowed after idling).
+BURST_SECONDS = 1.0
+INCREASE_STEP = 0.1
+DECREASE_FACTOR = 0.5
+# One burst of failures counts as one congestion signal, not N halvings.
+DECREASE_COOLDOWN_SECONDS = 2.0
+LATENCY_TARGET_SECONDS = 3.0
+LATENCY_EWMA_ALPHA = 0.2
+THROTTLE_STATUSES = (429, 500, 502, 503, 504)
+# In-flight cap = rate * latency * CONCURRENCY_HEADROOM (Little's law plus room
+# for jitter), never below MIN_CONCURRENCY.
+CONCURRENCY_HEADROOM = 2.0
+MIN_CONCURRENCY = 2
+# Must stay below DECREASE_COOLDOWN_SECONDS: a batch then holds at most one halving.
+RECORD_FLUSH_SECONDS = 1.0
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_for = None
+# host -> buffered record() results not yet written to SQLite.
+_pending = {}
+_pending_lock = threading.Lock()
+# host -> {'in_flight', 'limit', 'waiters'}; waiters are callables that hand over a slot.
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+# --- SQLite plumbing ---
+def _db_file():
+    return RATE_LIMITER_DIR / 'rate_limiter.db'
+
+
+def _get_conn():
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'db_file', None) != _db_file():
+        RATE_LIMITER_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(_db_file()), timeout=DB_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_SECONDS * 1000}")
+        _local.conn = conn
+        _local.db_file = _db_file()
+    _ensure_schema(conn)
+    return conn
+
+
+@contextmanager
+def _write_tx(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _ensure_schema(conn):
+    global _schema_ready_for
+    if _schema_ready_for == _db_file():
+        return
+    with _schema_lock:
+        if _schema_ready_for == _db_file():
+            return
+        with _write_tx(conn):
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hosts ("
+                " host TEXT PRIMARY KEY,"
+                " rate REAL NOT NULL,"
+                " tokens REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " last_decrease REAL NOT NULL DEFAULT 0,"
+                " latency REAL,"
+                " ok INTEGER NOT NULL DEFAULT 0,"
+                " throttled INTEGER NOT NULL DEFAULT 0,"
+                " errors INTEGER NOT NULL DEFAULT 0)"
+            )
+        _schema_ready_for = _db_file()
+
+
+def _host_row(conn, host, now):
+    # Called inside a write transaction.
+    row = conn.execute("SELECT rate, tokens, updated_at FROM hosts WHERE host = ?", (host,)).fetchone()
+    if row is None:
+        conn.execute(
+            "INSERT INTO hosts (host, rate, tokens, updated_at) VALUES (?, ?, ?, ?)",
+            (host, INITIAL_RATE, _capacity(INITIAL_RATE), now),
+        )
+        return INITIAL_RATE, _capacity(INITIAL_RATE), now
+    return row
+
+
+def _capacity(rate):
+    return max(1.0, rate * BURST_SECONDS)
+
+
+def _apply_pending(conn, host, now):
+    """
+    Called inside a write transaction: folds this process's buffered responses
+    for host into its row. Returns (rate, tokens, updated_at, latency).
+    """
+    rate, tokens, updated_at = _host_row(conn, host, now)
+    last_decrease, ewma = conn.execute("SELECT last_decrease, latency FROM hosts WHERE host = ?", (host,)).fetchone()
+    with _pending_lock:
+        batch = _pending.pop(host, None)
+    if batch is None:
+        return rate, tokens, updated_at, ewma
+    rate = min(MAX_RATE, rate + batch['ok'] * INCREASE_STEP)
+    congested_at = batch['congested_at']
+    if congested_at is not None and congested_at - last_decrease >= DECREASE_COOLDOWN_SECONDS:
+        rate = max(MIN_RATE, rate * DECREASE_FACTOR)
+        last_decrease = congested_at
+    for latency in batch['latencies']:
+        ewma = latency if ewma is None else ewma + LATENCY_EWMA_ALPHA * (latency - ewma)
+    conn.execute(
+        "UPDATE hosts SET rate = ?, last_decrease = ?, latency = ?,"
+        " ok = ok + ?, throttled = throttled + ?, errors = errors + ? WHERE host = ?",
+        (rate, last_decrease, ewma, batch['ok'], batch['throttled'], batch['errors'], host),
+    )
+    return rate, tokens, updated_at, ewma
+
+
+def _flush_pending(host):
+    conn = _get_conn()
+    with _write_tx(conn):
+        rate, _, _, latency = _apply_pending(conn, host, time.time())
+    _set_limit(host, concurrency_limit(rate, latency))
+
+
+# --- In-flight gate ---
+def _gate(host):
+    # Called with _gates_lock held.
+    gate = _gates.get(host)
+    if gate is None:
+        gate = _gates[host] = {'in_flight': 0, 'limit': MIN_CONCURRENCY, 'waiters': collections.deque()}
+    return gate
+
+
+def _wake(gate):
+    # Called with _gates_lock held: hands free slots to waiters in arrival order.
+    while gate['waiters'] and gate['in_flight'] < gate['limit']:
+        waiter = gate['waiters'].popleft()
+        gate['in_flight'] += 1
+        try:
+            waiter()
+        except RuntimeError:
+            # Async waiter whose event loop is already closed.
+            gate['in_flight'] -= 1
+
+
+def _set_limit(host, limit):
+    with _gates_lock:
+        gate = _gate(host)
+        gate['limit'] = limit
+        _wake(gate)
+
+
+def enter(host):
+    """Blocks until host has an in-flight slot free in this process. Pair with leave()."""
+    if not RATE_LIMITER_ENABLED:
+        return
+    with _gates_lock:
+        gate = _gate(host)
+        if gate['in_flight'] < gate['limit'] and not gate['waiters']:
+            gate['in_flight'] += 1
+            return
+        handed_over = threading.Event()
+        gate['waiters'].append(handed_over.set)
+    handed_over.wait()
+
+
+async def enter_async(host):
+    """enter() for coroutines: waits without holding a thread."""
+    if not RATE_LIMITER_ENABLED:
+        return
+    loop = asyncio.get_running_loop()
+    with _gates_lock:
+        gate = _gate(host)
+        if gate['in_flight'] < gate['limit'] and not gate['waiters']:
+            gate['in_flight'] += 1
+            return
+        handed_over = loop.create_future()
+
+        def waiter():
+            loop.call_soon_threadsafe(lambda: handed_over.done() or handed_over.set_result(None))
+
+        gate['waiters'].append(waiter)
+    try:
+        await handed_over
+    except asyncio.CancelledError:
+        with _gates_lock:
+            try:
+                gate['waiters'].remove(waiter)
+                handed = False
+            except ValueError:
+                handed = True
+        if handed:
+            leave(host)
+        raise
+
+
+def leave(host):
+    """Frees the slot taken by enter()/enter_async()."""
+    if not RATE_LIMITER_ENABLED:
+        return
+    with _gates_lock:
+        gate = _gate(host)
+        gate['in_flight'] -= 1
+        _wake(gate)
+
+
+# --- Public API ---
+def reserve(host):
+    """
+    Takes one token for host and returns how many seconds the caller must wait
+    before sending. Tokens may go negative: each waiter is queued behind the
+    previous ones instead of polling.
+    """
+    if not RATE_LIMITER_ENABLED:
+        return 0.0
+    conn = _get_conn()
+    now = time.time()
+    with _write_tx(conn):
+        rate, tokens, updated_at, latency = _apply_pending(conn, host, now)
+        tokens = min(_capacity(rate), tokens + (now - updated_at) * rate) - 1
+        conn.execute("UPDATE hosts SET tokens = ?, updated_at = ? WHERE host = ?", (tokens, now, host))
+    _set_limit(host, concurrency_limit(rate, latency))
+    return 0.0 if tokens >= 0 else -tokens / rate
+
+
+def acquire(host):
+    """Blocks until a request to host may be sent."""
+    wait = reserve(host)
+    if wait > 0:
+        time.sleep(wait)
+
+
+async def acquire_async(host):
+    wait = await asyncio.to_thread(reserve, host)
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+def record(host, latency, status=None, error=False):
+    """
+    Feeds one response back into the AIMD controller. status is the HTTP status
+    (None if unknown); error=True for network errors and timeouts. Buffered in
+    memory; written by the next reserve() for host or once the batch is
+    RECORD_FLUSH_SECONDS old.
+    """
+    if not RATE_LIMITER_ENABLED:
+        return
+    throttled = status in THROTTLE_STATUSES
+    congested = error or throttled or latency > LATENCY_TARGET_SECONDS
+    now = time.time()
+    with _pending_lock:
+        batch = _pending.get(host)
+        if batch is None:
+            batch = _pending[host] = {'since': now, 'ok': 0, 'throttled': 0, 'errors': 0,
+                                      'congested_at': None, 'latencies': []}
+        batch['latencies'].append(latency)
+        batch['ok'] += 0 if congested else 1
+        batch['throttled'] += 1 if throttled else 0
+        batch['errors'] += 1 if error else 0
+        if congested:
+            batch['congested_at'] = now
+        due = now - batch['since'] >= RECORD_FLUSH_SECONDS
+    if due:
+        _flush_pending(host)
+
+
+@contextmanager
+def limited(url):
+    """
+    Waits for an in-flight slot and a token of url's host and reports the request
+    when the block ends. The block may set `probe['status']`; an exception counts
+    as a network error. probe['start'] is when the token was granted.
+    """
+    host = host_of(url)
+    enter(host)
+    try:
+        acquire(host)
+        probe = {'status': None, 'start': time.perf_counter()}
+        try:
+            yield probe
+        except BaseException:
+            if probe['status'] is None:
+                record(host, time.perf_counter() - probe['start'], error=True)
+            else:
+                record(host, time.perf_counter() - probe['start'], probe['status'])
+            raise
+        record(host, time.perf_counter() - probe['start'], probe['status'])
+    finally:
+        leave(host)
+
+
+def current_rate(host):
+    """Current allowed requests/second for host."""
+    row = _get_conn().execute("SELECT rate FROM hosts WHERE host = ?", (host,)).fetchone()
+    return row[0] if row else INITIAL_RATE
+
+
+def concurrency_limit(rate, latency):
+    """In-flight cap for host: what the rate sustains at this latency (Little's law) with headroom."""
+    return max(MIN_CONCURRENCY, math.ceil(rate * (latency or 0) * CONCURRENCY_HEADROOM))
+
+
+def stats():
+    """{host: {rate, latency, concurrency, in_flight, ok, throttled, errors}} for every host seen."""
+    with _pending_lock:
+        buffered = list(_pending)
+    for host in buffered:
+        _flush_pending(host)
+    rows = _get_conn().execute("SELECT host, rate, latency, ok, throttled, errors FROM hosts ORDER BY host").fetchall()
+    with _gates_lock:
+        in_flight = {host: gate['in_flight'] for host, gate in _gates.items()}
+    return {
+        host: {'rate': round(rate, 2), 'latency': round(latency, 3) if latency is not None else None,
+               'concurrency': concurrency_limit(rate, latency), 'in_flight': in_flight.get(host, 0),
+               'ok': ok, 'throttled': throttled, 'errors': errors}
+        for host, rate, latency, ok, throttled, errors in rows
+    }
+
+
+def reset(host=None):
+    """Forgets the learned state (all hosts or one)."""
+    conn = _get_conn()
+    with _pending_lock:
+        if host is None:
+            _pending.clear()
+        else:
+            _pending.pop(host, None)
+    with _write_tx(conn):
+        if host is None:
+            conn.execute("DELETE FROM hosts")
+        else:
+            conn.execute("DELETE FROM hosts WHERE host = ?", (host,))
@@ -0,0 +1,91 @@
+import asyncio
+import concurrent.futures
+import threading
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function and later callers get its result or exception. Nothing is cached
+    once the call finishes.
+
+    One registry of concurrent.futures.Future serves both engines: do() for
+    threads and do_async() for coroutines (bridged with asyncio.wrap_future), so
+    a background worker on the asyncio engine and a web request in a thread
+    join the same flight.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (future, event loop of an async leader or None)
+        self._calls = {}
+
+    def _join_or_lead(self, key, leader_loop):
+        with self._lock:
+            entry = self._calls.get(key)
+            if entry is not None:
+                return entry, False
+            future = concurrent.futures.Future()
+            # RUNNING: a follower giving up can never cancel the shared future.
+            future.set_running_or_notify_cancel()
+            entry = self._calls[key] = (future, leader_loop)
+            return entry, True
+
+    def _finish(self, key, future):
+        with self._lock:
+            if self._calls.get(key, (None,))[0] is future:
+                del self._calls[key]
+
+    def do(self, key, fn, *args, **kwargs):
+        """Returns (value, shared); shared is True when another caller did the work."""
+        (future, leader_loop), leader = self._join_or_lead(key, None)
+        if not leader:
+            if leader_loop is not None and leader_loop is _running_loop():
+                # Blocking here would stall the loop that has to finish the leader.
+                return fn(*args, **kwargs), False
+            return future.result(), True
+        try:
+            value = fn(*args, **kwargs)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(value)
+            return value, False
+        finally:
+            self._finish(key, future)
+
+    async def do_async(self, key, coro_fn, *args, **kwargs):
+        """
+        Coroutine version of do(). The leader's work runs as a task and waiters
+        are shielded, so a caller that gives up (timeout/cancel) does not cancel
+        it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        (future, _), leader = self._join_or_lead(key, loop)
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+        task = loop.create_task(coro_fn(*args, **kwargs))
+
+        def settle(done):
+            if done.cancelled():
+                future.set_exception(asyncio.CancelledError())
+            elif done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+            self._finish(key, future)
+
+        task.add_done_callback(settle)
+        return await asyncio.shield(task), False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
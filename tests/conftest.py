@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+# Scripts manuales contra un servidor en marcha, no tests de pytest.
+collect_ignore = ['test_api.py', 'test_preview_api.py', 'test_preview_real.py']
+
+
+@pytest.fixture
+def repo_fixture():
+    """Texto de un fichero de ejemplo de la raíz del repo (h2h_test.html, bf_data.js...)."""
+    def read(name):
+        return (ROOT / name).read_text(encoding='utf-8')
+    return read
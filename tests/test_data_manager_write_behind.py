@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from modules import data_manager
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_manager, 'DATA_DIR', tmp_path)
+    monkeypatch.setattr(data_manager, 'DB_FILE', tmp_path / 'matches.db')
+    monkeypatch.setattr(data_manager, '_snapshots', {})
+    # Only an explicit flush (or a read that flushes) writes the queue.
+    monkeypatch.setattr(data_manager, 'WRITE_FLUSH_INTERVAL_SECONDS', 60.0)
+    yield data_manager
+    data_manager.flush_writes(10)
+
+
+def _match(match_id, handicap='0.5', score='1-0', **extra):
+    return {'match_id': match_id, 'handicap': handicap, 'score': score,
+            'home_team': 'Home', 'away_team': 'Away', **extra}
+
+
+def test_queued_match_is_readable_before_the_flush(store):
+    store.enqueue_match(_match('101', note='queued'))
+
+    assert store.get_match('101')['note'] == 'queued'
+
+
+def test_rescraped_match_is_coalesced_and_written_once(store):
+    before = store.get_write_queue_stats()
+    store.enqueue_match(_match('102', note='first'))
+    store.enqueue_match(_match('102', note='second'))
+
+    assert store.flush_writes(10)
+    stats = store.get_write_queue_stats()
+    assert stats['coalesced'] - before['coalesced'] == 1
+    assert stats['written'] - before['written'] == 1
+    assert stats['depth'] == 0
+    assert [m['note'] for m in store.load_matches_by_bucket('0.5')] == ['second']
+
+
+def test_bulk_loads_see_queued_rows(store):
+    store.enqueue_match(_match('103', score='??'))
+    store.enqueue_match(_match('104', handicap='-1.5'))
+    store.enqueue_precacheo_match(_match('105', score=None))
+
+    assert [m['match_id'] for m in store.load_pending_matches()] == ['103']
+    assert [m['match_id'] for m in store.load_matches_by_bucket('-1.25')] == ['104']
+    assert sorted(m['match_id'] for m in store.load_all_matches()) == ['103', '104', '105']
+
+
+def test_synchronous_save_supersedes_queued_row(store):
+    store.enqueue_match(_match('106', note='queued'))
+    store.save_match(_match('106', note='saved'))
+
+    assert store.flush_writes(10)
+    assert store.get_match('106')['note'] == 'saved'
+
+
+def test_on_saved_runs_after_the_row_is_written(store):
+    saved = threading.Event()
+    store.enqueue_match(_match('107'), on_saved=saved.set)
+
+    assert not saved.is_set()
+    assert store.flush_writes(10)
+    assert saved.wait(5)
+
+
+def test_skipped_match_is_not_queued(store):
+    assert store.enqueue_match(_match('108', handicap='3')) is False
+    assert store.get_write_queue_stats()['depth'] == 0
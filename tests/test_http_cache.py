@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+from modules import http_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, 'HTTP_CACHE_DIR', tmp_path / 'http_cache')
+    monkeypatch.setattr(http_cache, 'HTTP_CACHE_ENABLED', True)
+    yield http_cache
+    http_cache.set_replay_only(False)
+
+
+def _age(url, seconds, column='fetched_at'):
+    http_cache._get_conn().execute(f"UPDATE responses SET {column} = ? WHERE url = ?", (time.time() - seconds, url))
+
+
+def _body_files(cache):
+    return sorted(p.name for p in cache.HTTP_CACHE_DIR.glob('*/*.gz'))
+
+
+H2H_URL = 'https://live.example.com/match/h2h-2898709'
+
+
+def test_roundtrip_with_fixture(cache, repo_fixture):
+    html = repo_fixture('h2h_test.html')
+    cache.put(H2H_URL, html)
+
+    assert cache.get(H2H_URL) == html
+    assert cache.url_class(H2H_URL) == ('h2h', 60)
+    assert cache.stats()['per_class'] == {'h2h': 1}
+
+
+def test_class_ttl_expires_and_max_age_overrides(cache):
+    cache.put(H2H_URL, 'page')
+    _age(H2H_URL, 120)
+
+    assert cache.get(H2H_URL) is None
+    assert cache.get(H2H_URL, max_age=600) == 'page'
+
+
+def test_immutable_entries_never_expire(cache):
+    cache.put(H2H_URL, 'final page', immutable=True)
+    _age(H2H_URL, 10 * 24 * 3600)
+
+    assert cache.get(H2H_URL) == 'final page'
+    assert cache.get(H2H_URL, max_age=0) == 'final page'
+
+
+def test_replay_only_ignores_expiry(cache):
+    cache.put(H2H_URL, 'old page')
+    _age(H2H_URL, 3600)
+    cache.set_replay_only(True)
+
+    assert cache.is_replay_only()
+    assert cache.get(H2H_URL) == 'old page'
+
+
+def test_identical_bodies_share_a_file_and_orphans_are_unlinked(cache):
+    cache.put('https://a.example.com/x', 'same body')
+    cache.put('https://b.example.com/x', 'same body')
+    assert cache.stats()['bodies'] == 1
+    assert len(_body_files(cache)) == 1
+
+    cache.put('https://a.example.com/x', 'new body')
+    cache.put('https://b.example.com/x', 'new body')
+    stats = cache.stats()
+    assert (stats['responses'], stats['bodies']) == (2, 1)
+    assert len(_body_files(cache)) == 1
+    assert cache.get('https://a.example.com/x') == 'new body'
+
+
+def test_evict_drops_least_recently_used(cache):
+    urls = [f'https://example.com/page{i}' for i in range(4)]
+    for i, url in enumerate(urls):
+        # Incompressible bodies so each one weighs about the same on disk.
+        cache.put(url, os.urandom(4096).hex())
+        _age(url, 1000 - i, column='last_access')
+    # page0 is the oldest write but was read recently.
+    _age(urls[0], 0, column='last_access')
+
+    body_size = cache.stats()['bytes'] // len(urls)
+    evicted = cache.evict(max_bytes=body_size * 3)
+
+    assert evicted == 2
+    assert sorted(cache.cached_urls()) == [urls[0], urls[3]]
+    assert len(_body_files(cache)) == 2
@@ -0,0 +1,65 @@
+import json
+
+from modules.id_checkpoint import ProcessedIdCheckpoint
+
+
+def test_add_is_persisted_in_the_log(tmp_path):
+    checkpoint = ProcessedIdCheckpoint(tmp_path / 'cache_state.json')
+    assert checkpoint.add(10)
+    assert not checkpoint.add('10')
+
+    reloaded = ProcessedIdCheckpoint(tmp_path / 'cache_state.json')
+    assert '10' in reloaded and 10 in reloaded
+    assert len(reloaded) == 1
+
+
+def test_loads_snapshot_and_log_together(tmp_path):
+    snapshot = tmp_path / 'cache_state.json'
+    snapshot.write_text(json.dumps({'processed_ids': [1, 2]}), encoding='utf-8')
+    (tmp_path / 'cache_state.json.log').write_text('3\n\n4\n', encoding='utf-8')
+
+    assert ProcessedIdCheckpoint(snapshot).ids() == {'1', '2', '3', '4'}
+
+
+def test_torn_last_line_is_dropped_and_truncated(tmp_path):
+    snapshot = tmp_path / 'cache_state.json'
+    log = tmp_path / 'cache_state.json.log'
+    log.write_bytes(b'5\n6\n12')
+
+    checkpoint = ProcessedIdCheckpoint(snapshot)
+    assert checkpoint.ids() == {'5', '6'}
+    assert log.read_bytes() == b'5\n6\n'
+
+    # The next append starts on its own line instead of gluing onto '12'.
+    checkpoint.add(7)
+    assert log.read_bytes() == b'5\n6\n7\n'
+    assert ProcessedIdCheckpoint(snapshot).ids() == {'5', '6', '7'}
+
+
+def test_snapshot_every_folds_the_log(tmp_path):
+    snapshot = tmp_path / 'cache_state.json'
+    checkpoint = ProcessedIdCheckpoint(snapshot, snapshot_every=3)
+    for match_id in (30, 4, 200):
+        checkpoint.add(match_id)
+
+    assert json.loads(snapshot.read_text(encoding='utf-8')) == {'processed_ids': ['4', '30', '200']}
+    assert (tmp_path / 'cache_state.json.log').read_bytes() == b''
+    assert ProcessedIdCheckpoint(snapshot).ids() == {'4', '30', '200'}
+
+
+def test_unreadable_snapshot_keeps_the_log(tmp_path):
+    snapshot = tmp_path / 'cache_state.json'
+    snapshot.write_text('{not json', encoding='utf-8')
+    (tmp_path / 'cache_state.json.log').write_text('8\n', encoding='utf-8')
+
+    assert ProcessedIdCheckpoint(snapshot).ids() == {'8'}
+
+
+def test_replace_compacts_to_a_fresh_snapshot(tmp_path):
+    snapshot = tmp_path / 'cache_state.json'
+    checkpoint = ProcessedIdCheckpoint(snapshot)
+    checkpoint.add(1)
+    checkpoint.replace(['2', 'abc'])
+
+    assert ProcessedIdCheckpoint(snapshot).ids() == {'2', 'abc'}
+    assert (tmp_path / 'cache_state.json.log').read_bytes() == b''
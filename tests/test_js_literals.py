@@ -0,0 +1,84 @@
+import re
+
+import pytest
+
+from modules import js_literals
+from modules.league_scraper import _league_match_rows
+
+
+def _exact(content, target, raw=False):
+    """parse_assignments sin el camino rápido: recorrido exacto de cada literal."""
+    start_re = re.compile(rf"{target}\s*=\s*(?=\[)", re.M)
+    keys, literals, _ = js_literals._split_assignments(content, start_re, False)
+    values = js_literals._load_all(literals, raw)
+    return [(k, v) for k, v in zip(keys, values) if v is not js_literals._INVALID]
+
+
+@pytest.mark.parametrize('literal, expected', [
+    ("[1,,'a',]", [1, None, 'a']),
+    ("[,1]", [None, 1]),
+    ("[true,false,null,undefined]", [True, False, None, None]),
+    ("[[1,2],[3,[4]]]", [[1, 2], [3, [4]]]),
+    ("['a]b','c];d',\"e[f\"]", ['a]b', 'c];d', 'e[f']),
+    ("['it\\'s','tab\\tx']", ["it's", 'tab\tx']),
+    # Números que JSON no admite y tokens sueltos quedan como texto.
+    ("[.5, 05, -1., abc]", ['.5', '05', '-1.', 'abc']),
+])
+def test_parse(literal, expected):
+    assert js_literals.parse(literal) == expected
+
+
+def test_parse_raw_keeps_text():
+    assert js_literals.parse("[1.50,'x',,true]", raw=True) == ['1.50', 'x', None, 'true']
+
+
+def test_quoted_close_inside_strings_does_not_cut_the_literal():
+    content = "A[1]=['x];y',1];\nA[2]=['[',2];\nA[3]=[\"];\",3];\n"
+    assert js_literals.parse_assignments(content, r"^A\[(\d+)\]") == [
+        ('1', ['x];y', 1]), ('2', ['[', 2]), ('3', ['];', 3])]
+
+
+def test_unclosed_or_invalid_literals_are_skipped():
+    content = "A[1]=[1,2];\nA[2]=['a' 'b'];\nA[3]=[3];\nA[4]=['never closed"
+    assert js_literals.parse_assignments(content, r"^A\[(\d+)\]") == [('1', [1, 2]), ('3', [3])]
+
+
+def test_limit_stops_after_the_first():
+    content = "var x = [1];\nvar x = [2];"
+    assert js_literals.parse_assignments(content, r"var x", limit=1) == [(None, [1])]
+
+
+def test_bf_data_rows_match_the_exact_scanner(repo_fixture):
+    content = repo_fixture('bf_data.js')
+    rows = js_literals.parse_assignments(content, r"^A\[\d+\]", raw=True)
+
+    assert len(rows) == len(re.findall(r"(?m)^A\[\d+\]=", content))
+    assert rows == _exact(content, r"^A\[\d+\]", raw=True)
+    first = rows[0][1]
+    assert first[:6] == ['2898709', '5', '73015', '5528', 'San Diego FC', 'Minnesota United FC']
+    # Empty slots (',,') are None, empty strings stay ''.
+    assert first[-2:] == [None, '']
+
+
+def test_league_rounds_match_the_exact_scanner(repo_fixture):
+    content = repo_fixture('league_36_data.js')
+    rounds = js_literals.parse_assignments(content, r'jh\["([^"]*)"\]', raw=True)
+
+    assert rounds == _exact(content, r'jh\["([^"]*)"\]', raw=True)
+    assert rounds[0][0] == 'R_1'
+    assert rounds[0][1][0][:2] == ['2789129', '36']
+    matches = list(_league_match_rows(content, 36))
+    assert matches and all(isinstance(ah, str) for _, ah in matches)
+
+
+def test_h2h_vs_hodds(repo_fixture):
+    content = repo_fixture('h2h_test.html')
+    (key, rows), = js_literals.parse_assignments(content, r"var Vs_hOdds", limit=1)
+
+    assert key is None
+    assert rows == _exact(content, r"var Vs_hOdds")[0][1]
+    assert rows[0][:4] == [1213915, 3, '0.90', '1.25']
+
+
+def test_columns_pads_short_rows():
+    assert js_literals.columns([[1, 2], [3]]) == [[1, 3], [2, None]]
@@ -0,0 +1,81 @@
+import datetime
+
+from modules import main_page
+
+NOW = datetime.datetime(2025, 11, 25, 12, 0, 0)
+
+
+def _row(match_id, data_t, state='0', score='', handicap='0.5', goal_line='2.5', time_attr=True):
+    odds = ['x'] * 11
+    odds[2], odds[10] = handicap, goal_line
+    time_cell = f'<td name="timeData" data-t="{data_t}"></td>' if time_attr else '<td></td>'
+    return (
+        f'<tr id="tr1_{match_id}" state="{state}" odds="{",".join(odds)}">'
+        f'<td></td><td></td>{time_cell}'
+        f'<td><a id="team1_{match_id}">Home {match_id}</a></td><td></td><td></td>'
+        f'<td class="score">{score}</td>'
+        f'<td><a id="team2_{match_id}">Away {match_id}</a></td></tr>'
+    )
+
+
+PAGE = '<html><body><table>' + ''.join([
+    _row(1, '2025-11-25 15:00:00'),                                  # próximo
+    _row(2, '2025-11-25 09:00:00', state='-1', score='<b>2-1</b>'),  # finalizado
+    _row(3, '2025-11-25 11:00:00', state='1', score='1-0'),          # en juego
+    _row(4, '2025-11-25 08:00:00', state='-14', score=''),           # aplazado
+    _row(5, '2025-11-25 16:00:00', handicap='-1.25', goal_line='3'),
+    _row(6, '2025-11-25 07:00:00', state='-1', score='0 - 0', time_attr=False),
+    '<tr id="tr1_7" odds="x,y"><td></td></tr>',                        # sin línea AH
+]) + '</table></body></html>'
+
+
+def test_rows_are_classified():
+    upcoming, finished = main_page.parse_main_page(PAGE, now_utc=NOW)
+
+    assert [m['id'] for m in upcoming] == ['1', '5']
+    assert [(m['id'], m['score']) for m in finished] == [('2', '2-1'), ('6', '0 - 0')]
+    assert upcoming[0] == {
+        'id': '1', 'time_obj': datetime.datetime(2025, 11, 25, 15, 0), 'home_team': 'Home 1',
+        'away_team': 'Away 1', 'handicap': '0.5', 'goal_line': '2.5',
+    }
+
+
+def test_finished_row_without_time_counts_as_just_finished():
+    _, finished = main_page.parse_main_page(PAGE, now_utc=NOW)
+    row = next(m for m in finished if m['id'] == '6')
+    assert datetime.datetime.now() - row['time_obj'] < datetime.timedelta(minutes=1)
+
+
+def test_predicates_filter_both_lists_and_run_once_per_value():
+    seen = []
+
+    def handicap_ok(raw):
+        seen.append(raw)
+        return raw == '0.5'
+
+    upcoming, finished = main_page.parse_main_page(PAGE, handicap_predicate=handicap_ok,
+                                                   goal_line_predicate=lambda raw: raw == '2.5', now_utc=NOW)
+
+    assert [m['id'] for m in upcoming] == ['1']
+    assert [m['id'] for m in finished] == ['2', '6']
+    assert sorted(seen) == ['-1.25', '0.5']
+
+
+def test_empty_or_missing_html():
+    assert main_page.parse_main_page('') == ([], [])
+    assert main_page.parse_main_page(None) == ([], [])
+
+
+def test_app_lists_share_one_parse():
+    import app
+
+    page = PAGE.replace('2025-11-25 15:00:00', '2099-01-01 15:00:00').replace('2025-11-25 16:00:00', '2099-01-01 16:00:00')
+    upcoming, finished = app.parse_main_page_lists(page, upcoming_limit=None, finished_limit=1)
+
+    assert [m['id'] for m in upcoming] == ['1', '5']
+    assert upcoming[0]['time'] == '16:00' and upcoming[0]['start_time'] == '2099-01-01T16:00:00'
+    assert 'time_obj' not in upcoming[0]
+    # Finalizados: del más reciente al más antiguo, paginados.
+    assert [m['id'] for m in finished] == ['6']
+    assert upcoming == app.parse_main_page_matches(page, limit=None)
+    assert [m['id'] for m in app.parse_main_page_finished_matches(page, limit=None)] == ['6', '2']
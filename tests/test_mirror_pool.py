@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from modules import mirror_pool
+from modules.mirror_pool import MirrorPool
+
+A, B = 'https://a.example.com', 'https://b.example.com'
+
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f'{status}', response=response)
+
+
+class _Mirrors:
+    """fetch_fn with a per-mirror behaviour: a delay, or an exception to raise."""
+
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour
+        self.hits = []
+
+    def _lookup(self, url):
+        base = A if url.startswith(A) else B
+        self.hits.append(base)
+        return base, self.behaviour.get('a' if base == A else 'b', 0.0)
+
+    def fetch(self, url, clock=None):
+        base, action = self._lookup(url)
+        if isinstance(action, Exception):
+            raise action
+        time.sleep(action)
+        return base
+
+    async def fetch_async(self, url, clock=None):
+        base, action = self._lookup(url)
+        if isinstance(action, Exception):
+            raise action
+        await asyncio.sleep(action)
+        return base
+
+
+@pytest.fixture
+def fast_hedge(monkeypatch):
+    monkeypatch.setattr(mirror_pool, 'HEDGE_DEFAULT_DELAY_SECONDS', 0.05)
+
+
+def test_path_of():
+    pool = MirrorPool([A, B + '/'])
+    assert pool.path_of(B + '/match/h2h-1') == '/match/h2h-1'
+    assert pool.path_of('https://other.example.com/x') is None
+
+
+def test_server_errors_fail_over(fast_hedge):
+    mirrors = _Mirrors(a=_http_error(503))
+    pool = MirrorPool([A, B])
+    for _ in range(mirror_pool.EJECT_AFTER_FAILURES + 2):
+        assert pool.fetch('/p', mirrors.fetch) == B
+
+    # Once ranked behind the healthy mirror it stops receiving requests.
+    assert mirrors.hits.count(A) == 1
+    assert pool.stats()[A]['failures'] == 1
+
+
+def test_repeated_failures_eject_until_the_probe_window():
+    mirrors = _Mirrors(a=requests.ConnectionError('a down'), b=requests.ConnectionError('b down'))
+    pool = MirrorPool([A, B])
+    for _ in range(mirror_pool.EJECT_AFTER_FAILURES):
+        with pytest.raises(requests.ConnectionError):
+            pool.fetch('/p', mirrors.fetch)
+
+    stats = pool.stats()
+    assert not stats[A]['healthy'] and not stats[B]['healthy']
+    # Every mirror ejected: the least bad one is still tried instead of failing outright.
+    mirrors.hits.clear()
+    with pytest.raises(requests.ConnectionError):
+        pool.fetch('/p', mirrors.fetch)
+    assert len(mirrors.hits) == 1
+
+
+def test_client_errors_are_the_answer_not_a_mirror_failure():
+    mirrors = _Mirrors(a=_http_error(404), b=_http_error(404))
+    pool = MirrorPool([A, B])
+    for _ in range(mirror_pool.EJECT_AFTER_FAILURES + 1):
+        with pytest.raises(requests.HTTPError):
+            pool.fetch('/missing', mirrors.fetch)
+
+    assert mirrors.hits == [A] * (mirror_pool.EJECT_AFTER_FAILURES + 1)
+    assert pool.stats()[A]['healthy'] and pool.stats()[A]['failures'] == 0
+
+
+def test_network_errors_raise_the_last_one_when_every_mirror_fails():
+    mirrors = _Mirrors(a=requests.ConnectionError('a down'), b=requests.ConnectionError('b down'))
+    with pytest.raises(requests.ConnectionError):
+        MirrorPool([A, B]).fetch('/p', mirrors.fetch)
+
+
+def test_slow_mirror_is_hedged(fast_hedge):
+    mirrors = _Mirrors(a=1.0, b=0.0)
+    start = time.perf_counter()
+    assert MirrorPool([A, B]).fetch('/p', mirrors.fetch) == B
+    assert time.perf_counter() - start < 0.5
+
+
+def test_time_before_sent_is_not_latency(monkeypatch):
+    monkeypatch.setattr(mirror_pool, 'HEDGE_DEFAULT_DELAY_SECONDS', 0.1)
+    pool = MirrorPool([A, B])
+
+    def fetch(url, clock):
+        time.sleep(0.3)  # rate limiter wait
+        clock.sent()
+        time.sleep(0.01)
+        return url
+
+    assert pool.fetch('/p', fetch) == A + '/p'
+    stats = pool.stats()
+    assert stats[B]['requests'] == 0
+    assert max(pool._mirrors[0].latencies) < 0.1
+
+
+def test_async_slow_mirror_is_hedged(fast_hedge):
+    mirrors = _Mirrors(a=1.0, b=0.0)
+
+    async def main():
+        start = time.perf_counter()
+        value = await MirrorPool([A, B]).fetch_async('/p', mirrors.fetch_async)
+        return value, time.perf_counter() - start
+
+    value, elapsed = asyncio.run(main())
+    assert value == B
+    assert elapsed < 0.5
+
+
+def test_async_client_error_is_raised_without_failover():
+    mirrors = _Mirrors(a=_http_error(404))
+    with pytest.raises(requests.HTTPError):
+        asyncio.run(MirrorPool([A, B]).fetch_async('/missing', mirrors.fetch_async))
+    assert mirrors.hits == [A]
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from modules import rate_limiter
+
+HOST = 'live.example.com'
+
+
+@pytest.fixture
+def limiter(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMITER_DIR', tmp_path)
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMITER_ENABLED', True)
+    monkeypatch.setattr(rate_limiter, '_pending', {})
+    monkeypatch.setattr(rate_limiter, '_gates', {})
+    return rate_limiter
+
+
+def test_fast_responses_raise_the_rate_additively(limiter):
+    limiter.reserve(HOST)
+    for _ in range(10):
+        limiter.record(HOST, 0.1, 200)
+    limiter.reserve(HOST)
+
+    assert limiter.current_rate(HOST) == pytest.approx(limiter.INITIAL_RATE + 10 * limiter.INCREASE_STEP)
+
+
+def test_a_burst_of_throttles_halves_the_rate_once(limiter):
+    limiter.reserve(HOST)
+    for _ in range(5):
+        limiter.record(HOST, 0.1, 429)
+    limiter.record(HOST, 0.1, error=True)
+    limiter.reserve(HOST)
+
+    assert limiter.current_rate(HOST) == pytest.approx(limiter.INITIAL_RATE * limiter.DECREASE_FACTOR)
+    assert limiter.stats()[HOST]['throttled'] == 5
+    assert limiter.stats()[HOST]['errors'] == 1
+
+
+def test_slow_response_counts_as_congestion(limiter):
+    limiter.reserve(HOST)
+    limiter.record(HOST, limiter.LATENCY_TARGET_SECONDS + 1, 200)
+    limiter.reserve(HOST)
+
+    assert limiter.current_rate(HOST) == pytest.approx(limiter.INITIAL_RATE * limiter.DECREASE_FACTOR)
+
+
+def test_rate_never_drops_below_the_floor(limiter, monkeypatch):
+    monkeypatch.setattr(limiter, 'DECREASE_COOLDOWN_SECONDS', 0.0)
+    limiter.reserve(HOST)
+    for _ in range(20):
+        limiter.record(HOST, 0.1, 503)
+        time.sleep(0.001)
+        limiter.reserve(HOST)
+
+    assert limiter.current_rate(HOST) == limiter.MIN_RATE
+
+
+def test_records_are_buffered_until_the_next_reserve(limiter):
+    limiter.reserve(HOST)
+    for _ in range(50):
+        limiter.record(HOST, 0.1, 200)
+
+    assert limiter.current_rate(HOST) == limiter.INITIAL_RATE
+    limiter.reserve(HOST)
+    assert limiter.stats()[HOST]['ok'] == 50
+
+
+def test_token_bucket_queues_waiters_behind_the_burst(limiter):
+    burst = int(limiter.INITIAL_RATE * limiter.BURST_SECONDS)
+    waits = [limiter.reserve(HOST) for _ in range(burst + 2)]
+
+    assert waits[:burst] == [0.0] * burst
+    assert waits[burst] == pytest.approx(1 / limiter.INITIAL_RATE, abs=0.05)
+    assert waits[burst + 1] == pytest.approx(2 / limiter.INITIAL_RATE, abs=0.05)
+
+
+def test_concurrency_limit_follows_rate_and_latency(limiter):
+    assert limiter.concurrency_limit(10.0, None) == limiter.MIN_CONCURRENCY
+    assert limiter.concurrency_limit(10.0, 0.5) == 10
+
+
+def test_gate_caps_threads_in_flight(limiter):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def request():
+        limiter.enter(HOST)
+        try:
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+        finally:
+            limiter.leave(HOST)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    assert peak[0] == limiter.MIN_CONCURRENCY
+    assert limiter._gates[HOST]['in_flight'] == 0
+
+
+def test_cancelled_async_waiter_does_not_leak_a_slot(limiter):
+    async def main():
+        for _ in range(limiter.MIN_CONCURRENCY):
+            await limiter.enter_async(HOST)
+        waiter = asyncio.ensure_future(limiter.enter_async(HOST))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        for _ in range(limiter.MIN_CONCURRENCY):
+            limiter.leave(HOST)
+
+    asyncio.run(main())
+    gate = limiter._gates[HOST]
+    assert (gate['in_flight'], len(gate['waiters'])) == (0, 0)
+
+
+def test_limited_reports_exceptions_as_errors(limiter):
+    with pytest.raises(ConnectionError):
+        with limiter.limited(f'https://{HOST}/match/h2h-1'):
+            raise ConnectionError()
+    with limiter.limited(f'https://{HOST}/match/h2h-1') as probe:
+        probe['status'] = 200
+
+    stats = limiter.stats()[HOST]
+    assert (stats['errors'], stats['ok'], stats['in_flight']) == (1, 1, 0)
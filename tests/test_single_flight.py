@@ -0,0 +1,129 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from modules.single_flight import SingleFlight
+
+
+def test_concurrent_calls_run_once():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flight.do, 'key', work)]
+        started.wait(5)
+        futures += [pool.submit(flight.do, 'key', work) for _ in range(3)]
+        time.sleep(0.1)  # let the followers reach the shared future
+        release.set()
+        results = [f.result(5) for f in futures]
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert {value for value, _ in results} == {'value'}
+    assert flight.in_flight() == 0
+
+
+def test_exception_reaches_every_caller_and_is_not_cached():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError('boom')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 'key', fail)
+        started.wait(5)
+        follower = pool.submit(flight.do, 'key', fail)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result(5)
+
+    assert flight.do('key', lambda: 'fresh') == ('fresh', False)
+
+
+def test_async_callers_share_one_task():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'value'
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async('key', work) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True]
+
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return 'value'
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async('key', work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async('key', work))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == ('value', False)
+
+
+def test_thread_joins_async_leader():
+    flight = SingleFlight()
+    leader_started = threading.Event()
+    calls = []
+
+    async def work():
+        calls.append('async')
+        leader_started.set()
+        await asyncio.sleep(0.1)
+        return 'from-loop'
+
+    loop_thread = threading.Thread(target=lambda: asyncio.run(flight.do_async('key', work)))
+    loop_thread.start()
+    leader_started.wait(5)
+    result = flight.do('key', lambda: calls.append('thread') or 'from-thread')
+    loop_thread.join(5)
+
+    assert result == ('from-loop', True)
+    assert calls == ['async']
+
+
+def test_do_on_the_leaders_loop_does_not_block_it():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return 'async'
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async('key', work))
+        await asyncio.sleep(0)
+        # A blocking join here would deadlock: the leader needs this loop.
+        inline = flight.do('key', lambda: 'inline')
+        return inline, await leader
+
+    assert asyncio.run(main()) == (('inline', False), ('async', False))